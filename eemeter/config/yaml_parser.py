@@ -84,11 +84,15 @@ def initialize():
     """
     from eemeter.meter.base import MeterBase
     from eemeter.models.temperature_sensitivity import Model
+    from eemeter.models.warm_start import WarmStartStore
+    from eemeter.models.fit_report import FitReportAggregator
 
     yaml.add_multi_constructor('!obj:', multi_constructor_obj)
     yaml.add_constructor('!setting', constructor_setting)
     yaml.add_multi_representer(MeterBase, multi_representer_obj)
     yaml.add_multi_representer(Model, multi_representer_obj)
+    yaml.add_multi_representer(WarmStartStore, multi_representer_obj)
+    yaml.add_multi_representer(FitReportAggregator, multi_representer_obj)
 
     is_initialized = True
 
@@ -6,6 +6,7 @@ from eemeter.project import Project
 from eemeter.meter import AnnualizedUsageMeter
 from eemeter.weather import GSODWeatherSource
 from eemeter.weather import TMY3WeatherSource
+from eemeter.weather import get_weather_source
 
 import random
 import numpy as np
@@ -47,7 +48,7 @@ class MonthlyBillingConsumptionGenerator:
                 self.consumption_unit_name, record_type="arbitrary")
 
         periods = cd.periods()
-        period_daily_temps = weather_source.daily_temperatures(periods,
+        period_daily_temps = weather_source.ragged_daily_temperatures(periods,
                 self.temperature_unit_name)
 
         period_average_daily_usages = self.model.transform(period_daily_temps,self.params)
@@ -110,9 +111,10 @@ class ProjectGenerator:
             if period.end is not None and late_date < period.end:
                 late_date = period.end
 
-        weather_source = GSODWeatherSource(location.station,early_date.year,
-                late_date.year)
-        weather_normal_source = TMY3WeatherSource(location.station)
+        weather_source = get_weather_source(GSODWeatherSource, location.station)
+        weather_source.add_year_range(early_date.year, late_date.year)
+        weather_normal_source = get_weather_source(TMY3WeatherSource,
+                location.station)
 
         cd_elec, est_savings_elec, elec_bl_params, elec_rp_params = \
                 self._generate_fuel_consumptions(
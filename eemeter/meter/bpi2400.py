@@ -1,4 +1,5 @@
 from eemeter.meter.base import YamlDefinedMeter
+from eemeter.models.temperature_sensitivity import Model
 from datetime import datetime
 import pytz
 
@@ -126,6 +127,10 @@ bpi_meter_yaml = """
                             heating_balance_temperature: [!setting heating_balance_temp_low, !setting heating_balance_temp_high],
                             cooling_balance_temperature: [!setting cooling_balance_temp_low, !setting cooling_balance_temp_high],
                         },
+                        fit_method: !setting fit_method,
+                        n_starts: !setting n_starts,
+                        n_workers: !setting n_workers,
+                        max_cpu_time: !setting max_cpu_time,
                     },
                     input_mapping: {
                         consumption_data: { name: consumption_data_no_estimated, },
@@ -153,6 +158,10 @@ bpi_meter_yaml = """
                             heating_slope: [!setting natural_gas_heating_slope_low, !setting natural_gas_heating_slope_high],
                             heating_balance_temperature: [!setting heating_balance_temp_low, !setting heating_balance_temp_high],
                         },
+                        fit_method: !setting fit_method,
+                        n_starts: !setting n_starts,
+                        n_workers: !setting n_workers,
+                        max_cpu_time: !setting max_cpu_time,
                     },
                     input_mapping: {
                         consumption_data: { name: consumption_data_no_estimated, },
@@ -418,6 +427,21 @@ class BPI_2400_S_2012_ModelCalibrationUtilityBillCriteria(YamlDefinedMeter):
         - cdd_base (float):
           Base for Cooling Degree Day calculations.
           defaults to 65 degF
+
+        - fit_method (str):
+          Method of parameter optimization, one of "minimize", "grid" or
+          "multistart"; defaults to "minimize"
+        - n_starts (int):
+          Number of starting points of "multistart" parameter optimization;
+          defaults to 8
+        - n_workers (int):
+          Number of threads running the starts of "multistart" parameter
+          optimization, in a pool shared by all fits; defaults to 1, which
+          runs them one after the other
+        - max_cpu_time (float):
+          Limit on the CPU time (in seconds) used by the starts of each
+          "multistart" parameter optimization, not counting other fits
+          running at the same time; defaults to None, no limit
     """
 
     def __init__(self, temperature_unit_str, **kwargs):
@@ -474,6 +498,11 @@ class BPI_2400_S_2012_ModelCalibrationUtilityBillCriteria(YamlDefinedMeter):
 
                 "hdd_base": convert_temp_degF_to_target(65),
                 "cdd_base": convert_temp_degF_to_target(65),
+
+                "fit_method": "minimize",
+                "n_starts": 8,
+                "n_workers": 1,
+                "max_cpu_time": None,
         }
         return settings
 
@@ -537,6 +566,14 @@ class BPI_2400_S_2012_ModelCalibrationUtilityBillCriteria(YamlDefinedMeter):
                             settings["cooling_balance_temp_x0"],
                             settings["cooling_balance_temp_high"])
             raise ValueError(message)
+        if settings["fit_method"] not in Model.fit_methods:
+            message = "Fit method must be one of {}, but found {}" \
+                    .format(Model.fit_methods, settings["fit_method"])
+            raise ValueError(message)
+        if not settings["n_starts"] >= 1:
+            message = "Number of starts must be at least 1, but found {}" \
+                    .format(settings["n_starts"])
+            raise ValueError(message)
 
     @property
     def yaml(self):
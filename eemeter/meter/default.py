@@ -1,4 +1,5 @@
 from eemeter.meter.base import YamlDefinedMeter
+from eemeter.models.temperature_sensitivity import Model
 
 default_residential_meter_yaml = """
 !obj:eemeter.meter.Sequence {
@@ -51,6 +52,10 @@ default_residential_meter_yaml = """
                             cooling_balance_temp_high: !setting cooling_balance_temp_high,
                             hdd_base: !setting hdd_base,
                             cdd_base: !setting cdd_base,
+                            fit_method: !setting fit_method,
+                            n_starts: !setting n_starts,
+                            n_workers: !setting n_workers,
+                            max_cpu_time: !setting max_cpu_time,
                         },
                         tagspace: ["bpi2400"],
                     },
@@ -66,6 +71,8 @@ default_residential_meter_yaml = """
                                         sequence: [
                                             !obj:eemeter.meter.TemperatureSensitivityParameterOptimizationMeter {
                                                 temperature_unit_str: !setting temperature_unit_str,
+                                                fit_report_aggregator: !setting fit_report_aggregator,
+                                                warm_start_store: !setting warm_start_store,
                                                 model: !obj:eemeter.models.AverageDailyTemperatureSensitivityModel &electricity_model {
                                                     cooling: True,
                                                     heating: True,
@@ -83,6 +90,10 @@ default_residential_meter_yaml = """
                                                         heating_balance_temperature: [!setting heating_balance_temp_low, !setting heating_balance_temp_high],
                                                         cooling_balance_temperature: [!setting cooling_balance_temp_low, !setting cooling_balance_temp_high],
                                                     },
+                                                    fit_method: !setting fit_method,
+                                                    n_starts: !setting n_starts,
+                                                    n_workers: !setting n_workers,
+                                                    max_cpu_time: !setting max_cpu_time,
                                                 },
                                                 input_mapping: {
                                                     consumption_data: {},
@@ -93,6 +104,7 @@ default_residential_meter_yaml = """
                                                     temp_sensitivity_params: { name: model_params },
                                                     average_daily_usages: {},
                                                     estimated_average_daily_usages: {},
+                                                    fit_report: {},
                                                 },
                                             },
                                             !obj:eemeter.meter.AnnualizedUsageMeter {
@@ -112,6 +124,8 @@ default_residential_meter_yaml = """
                                         sequence: [
                                             !obj:eemeter.meter.TemperatureSensitivityParameterOptimizationMeter {
                                                 temperature_unit_str: !setting temperature_unit_str,
+                                                fit_report_aggregator: !setting fit_report_aggregator,
+                                                warm_start_store: !setting warm_start_store,
                                                 model: !obj:eemeter.models.AverageDailyTemperatureSensitivityModel &natural_gas_model {
                                                     cooling: False,
                                                     heating: True,
@@ -125,6 +139,10 @@ default_residential_meter_yaml = """
                                                         heating_slope: [!setting natural_gas_heating_slope_low, !setting natural_gas_heating_slope_high],
                                                         heating_balance_temperature: [!setting heating_balance_temp_low, !setting heating_balance_temp_high],
                                                     },
+                                                    fit_method: !setting fit_method,
+                                                    n_starts: !setting n_starts,
+                                                    n_workers: !setting n_workers,
+                                                    max_cpu_time: !setting max_cpu_time,
                                                 },
                                                 input_mapping: {
                                                     consumption_data: {},
@@ -135,6 +153,7 @@ default_residential_meter_yaml = """
                                                     temp_sensitivity_params: { name: model_params },
                                                     average_daily_usages: {},
                                                     estimated_average_daily_usages: {},
+                                                    fit_report: {},
                                                 },
                                             },
                                             !obj:eemeter.meter.AnnualizedUsageMeter {
@@ -319,6 +338,29 @@ class DefaultResidentialMeter(YamlDefinedMeter):
         - cooling_balance_temp_high (float):
           Highest cooling balance temperature in parameter optimization;
           defaults to 75 degF
+
+        - fit_method (str):
+          Method of parameter optimization, one of "minimize", "grid" or
+          "multistart"; defaults to "minimize"
+        - n_starts (int):
+          Number of starting points of "multistart" parameter optimization;
+          defaults to 8
+        - n_workers (int):
+          Number of threads running the starts of "multistart" parameter
+          optimization, in a pool shared by all fits; defaults to 1, which
+          runs them one after the other
+        - max_cpu_time (float):
+          Limit on the CPU time (in seconds) used by the starts of each
+          "multistart" parameter optimization, not counting other fits
+          running at the same time; defaults to None, no limit
+        - fit_report_aggregator (eemeter.models.FitReportAggregator):
+          Collects the report of each parameter optimization, e.g. to find
+          slow or non-convergent fits across a portfolio; defaults to None
+        - warm_start_store (eemeter.models.WarmStartStore):
+          Starts each parameter optimization of consumption data fitted
+          before from the parameters it converged to then, and records the
+          new fits; the store is saved after each evaluation. Defaults to
+          None, starting from the x0 settings
     """
 
     def __init__(self, temperature_unit_str="degC", **kwargs):
@@ -375,6 +417,13 @@ class DefaultResidentialMeter(YamlDefinedMeter):
 
                 "hdd_base": convert_temp_degF_to_target(65),
                 "cdd_base": convert_temp_degF_to_target(65),
+
+                "fit_method": "minimize",
+                "n_starts": 8,
+                "n_workers": 1,
+                "max_cpu_time": None,
+                "fit_report_aggregator": None,
+                "warm_start_store": None,
         }
         return settings
 
@@ -438,6 +487,14 @@ class DefaultResidentialMeter(YamlDefinedMeter):
                             settings["cooling_balance_temp_x0"],
                             settings["cooling_balance_temp_high"])
             raise ValueError(message)
+        if settings["fit_method"] not in Model.fit_methods:
+            message = "Fit method must be one of {}, but found {}" \
+                    .format(Model.fit_methods, settings["fit_method"])
+            raise ValueError(message)
+        if not settings["n_starts"] >= 1:
+            message = "Number of starts must be at least 1, but found {}" \
+                    .format(settings["n_starts"])
+            raise ValueError(message)
 
     @property
     def yaml(self):
@@ -597,6 +654,9 @@ class DefaultResidentialMeter(YamlDefinedMeter):
               estimations for all consumption periods.
             - *"r_squared"* : Coefficient of Determination (r^2) of fitted
               HDD/CDD use model estimations for all consumption periods.
+            - *"fit_report"* : Convergence and timing of the fit of the
+              temperature sensitivity model (an
+              :code:`eemeter.models.FitReport`).
             - *"model_params"* : Fitted temperature
               sensitivity parameters for HDD/CDD use model in an
               array of values with the following order:
@@ -609,4 +669,8 @@ class DefaultResidentialMeter(YamlDefinedMeter):
               heating_balance_temperature (degF or degC), heating_slope (kWh/HDD)].
 
         """
-        return super(DefaultResidentialMeter, self).evaluate(data_collection)
+        outputs = super(DefaultResidentialMeter, self).evaluate(data_collection)
+        warm_start_store = self.settings["warm_start_store"]
+        if warm_start_store is not None:
+            warm_start_store.save()
+        return outputs
@@ -19,13 +19,26 @@ class TemperatureSensitivityParameterOptimizationMeter(MeterBase):
         Unit of temperature, usually "degC" or "degF".
     model : eemeter.model.TemperatureSensitivityModel
         Model of energy usage for which to optimize parameter choices.
+    warm_start_store : eemeter.models.WarmStartStore, optional
+        If given, optimization for consumption data which has been fitted
+        before (identified by its name, start and fuel type) starts from the
+        parameters fitted then, and the result of each optimization is
+        recorded in the store. Consumption data without a name is not warm
+        started.
+    fit_report_aggregator : eemeter.models.FitReportAggregator, optional
+        If given, the report of each fit is added to it, identified by the
+        name of the consumption data, e.g. to compare fits across a
+        portfolio.
     """
 
-    def __init__(self, temperature_unit_str, model, **kwargs):
+    def __init__(self, temperature_unit_str, model, warm_start_store=None,
+            fit_report_aggregator=None, **kwargs):
         super(TemperatureSensitivityParameterOptimizationMeter,
                 self).__init__(**kwargs)
         self.temperature_unit_str = temperature_unit_str
         self.model = model
+        self.warm_start_store = warm_start_store
+        self.fit_report_aggregator = fit_report_aggregator
 
     def evaluate_raw(self, consumption_data, weather_source,
             energy_unit_str, **kwargs):
@@ -51,21 +64,46 @@ class TemperatureSensitivityParameterOptimizationMeter(MeterBase):
               as given by the model.
             - "n_days": an array of the number of days in each consumption
               period (weights)
+            - "fit_report": an eemeter.models.FitReport describing the
+              convergence and duration of the fit
         """
         average_daily_usages, n_days = \
                 consumption_data.average_daily_consumptions()
         periods = consumption_data.periods()
-        observed_daily_temps = weather_source.daily_temperatures(periods,
+        observed_daily_temps = weather_source.ragged_daily_temperatures(periods,
                 self.temperature_unit_str)
 
-        params = self.model.fit(observed_daily_temps, average_daily_usages, weights=n_days)
+        warm_start_key = self._warm_start_key(consumption_data, periods)
+        if warm_start_key is None:
+            x0 = None
+        else:
+            x0 = self.warm_start_store.get_params(warm_start_key)
+
+        params, fit_report = self.model.fit_with_report(observed_daily_temps,
+                average_daily_usages, weights=n_days, x0=x0)
+
+        if warm_start_key is not None:
+            self.warm_start_store.put(warm_start_key, fit_report.result)
+        if self.fit_report_aggregator is not None:
+            self.fit_report_aggregator.add(fit_report,
+                    meter_id=consumption_data.name)
 
         estimated_daily_usages = self.model.transform(observed_daily_temps, params)
 
         return {"temp_sensitivity_params": params,
                 "average_daily_usages": average_daily_usages,
                 "estimated_average_daily_usages": estimated_daily_usages,
-                "n_days": n_days}
+                "n_days": n_days,
+                "fit_report": fit_report}
+
+    def _warm_start_key(self, consumption_data, periods):
+        if self.warm_start_store is None or consumption_data.name is None \
+                or self.model.fit_method not in ["minimize", "multistart"]:
+            return None
+        start = periods[0].start.isoformat() if len(periods) > 0 else None
+        return self.warm_start_store.key(consumption_data.name, self.model,
+                start=start, fuel_type=consumption_data.fuel_type,
+                temperature_unit=self.temperature_unit_str)
 
 class AnnualizedUsageMeter(MeterBase):
     """Weather normalizes modeled usage for an annualized estimate of
@@ -154,7 +192,7 @@ class GrossSavingsMeter(MeterBase):
         """
         consumption_periods = consumption_data_reporting.periods()
         consumption_reporting = consumption_data_reporting.to(energy_unit_str)[:-1]
-        observed_daily_temps = weather_source.daily_temperatures(
+        observed_daily_temps = weather_source.ragged_daily_temperatures(
                 consumption_periods, self.temperature_unit_str)
         consumption_estimates_baseline = self.model.transform( observed_daily_temps, model_params_baseline)
         consumption_estimates_baseline *= np.array([p.timedelta.days for p in consumption_periods])
@@ -351,10 +389,14 @@ class NormalAnnualHDD(MeterBase):
             - "normal_annual_hdd": the total heating degree days observed
               during a typical meteorological year
         """
-        # year of this annual period will be ignored
-        annual_period = Period(datetime(2013,1,1), datetime(2014,1,1))
-        hdd = weather_normal_source.hdd(annual_period,
-                self.temperature_unit_str, self.base)
+        annual_hdd = getattr(weather_normal_source, "annual_hdd", None)
+        if annual_hdd is not None:
+            hdd = annual_hdd(self.temperature_unit_str, self.base)
+        else:
+            # year of this annual period will be ignored
+            annual_period = Period(datetime(2013,1,1), datetime(2014,1,1))
+            hdd = weather_normal_source.hdd(annual_period,
+                    self.temperature_unit_str, self.base)
         return { "normal_annual_hdd": hdd }
 
 class NormalAnnualCDD(MeterBase):
@@ -388,9 +430,13 @@ class NormalAnnualCDD(MeterBase):
               during a typical meteorological year
         """
 
-        annual_period = Period(datetime(2013,1,1), datetime(2014,1,1))
-        cdd = weather_normal_source.cdd(annual_period,
-                self.temperature_unit_str, self.base)
+        annual_cdd = getattr(weather_normal_source, "annual_cdd", None)
+        if annual_cdd is not None:
+            cdd = annual_cdd(self.temperature_unit_str, self.base)
+        else:
+            annual_period = Period(datetime(2013,1,1), datetime(2014,1,1))
+            cdd = weather_normal_source.cdd(annual_period,
+                    self.temperature_unit_str, self.base)
         return { "normal_annual_cdd": cdd }
 
 class NPeriodsMeetingHDDPerDayThreshold(MeterBase):
@@ -623,9 +669,9 @@ class EstimatedAverageDailyUsage(MeterBase):
             - "n_days": the number of days in each consumption period.
         """
         periods = consumption_data.periods()
-        observed_daily_temps = weather_source.daily_temperatures(periods,
+        observed_daily_temps = weather_source.ragged_daily_temperatures(periods,
                 self.temperature_unit_str)
-        n_days = np.array([len(temps) for temps in observed_daily_temps])
+        n_days = observed_daily_temps.lengths
         estimated_average_daily_usages = \
                 self.model.transform( observed_daily_temps, temp_sensitivity_params)
         return {"estimated_average_daily_usages": estimated_average_daily_usages,
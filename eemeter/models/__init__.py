@@ -1,2 +1,4 @@
 from .temperature_sensitivity import *
 from .parameters import *
+from .warm_start import *
+from .fit_report import *
@@ -0,0 +1,138 @@
+import threading
+
+import numpy as np
+
+
+class FitReport(object):
+    """Convergence and timing information about one model fit.
+
+    Parameters
+    ----------
+    fit_method : str
+        Fit method of the model, e.g. "minimize".
+    converged : bool
+        Whether the fit terminated successfully.
+    status : int
+        Termination status of the optimizer (0 on success); -1 if it was
+        stopped by a time limit.
+    message : str
+        Description of the termination status.
+    n_iterations : int
+        Number of iterations of the optimizer (summed over the starts of a
+        multi-start fit).
+    n_evaluations : int
+        Number of evaluations of the objective function (summed over the
+        starts of a multi-start fit), or of grid points searched.
+    objective : float
+        Final weighted sum of squared errors.
+    wall_time : float
+        Duration of the fit, in seconds.
+    n_runtime_warnings : int, default 0
+        Number of RuntimeWarnings (e.g. overflows, or means of periods
+        without temperatures) raised, and suppressed, during the fit.
+    result : scipy.optimize.OptimizeResult, optional
+        Result of the optimizer, if the fit used one.
+    """
+
+    fields = ["fit_method", "converged", "status", "message", "n_iterations",
+            "n_evaluations", "objective", "wall_time", "n_runtime_warnings"]
+
+    def __init__(self, fit_method, converged, status, message, n_iterations,
+            n_evaluations, objective, wall_time, n_runtime_warnings=0,
+            result=None):
+        self.fit_method = fit_method
+        self.converged = converged
+        self.status = status
+        self.message = message
+        self.n_iterations = n_iterations
+        self.n_evaluations = n_evaluations
+        self.objective = objective
+        self.wall_time = wall_time
+        self.n_runtime_warnings = n_runtime_warnings
+        self.result = result
+
+    @classmethod
+    def from_optimize_result(cls, fit_method, result, wall_time):
+        """Builds a report from the result of `Model.minimize`.
+        """
+        start_results = result.get("start_results")
+        if start_results is None:
+            start_results = [result]
+        start_results = [r for r in start_results if r is not None]
+        message = result.get("message", "")
+        if isinstance(message, bytes):
+            message = message.decode("utf-8")
+        return cls(fit_method,
+                converged=bool(result.get("success", False)),
+                status=int(result.get("status", 0)),
+                message=str(message),
+                n_iterations=sum(int(r.get("nit", 0)) for r in start_results),
+                n_evaluations=sum(int(r.get("nfev", 0)) for r in start_results),
+                objective=float(result.get("fun", np.nan)),
+                wall_time=wall_time,
+                n_runtime_warnings=int(result.get("n_runtime_warnings", 0)),
+                result=result)
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.fields}
+
+    def __repr__(self):
+        return "FitReport(fit_method={}, converged={}, n_iterations={}, " \
+                "n_evaluations={}, objective={:.6g}, wall_time={:.4f})" \
+                .format(self.fit_method, self.converged, self.n_iterations,
+                        self.n_evaluations, self.objective, self.wall_time)
+
+
+class FitReportAggregator(object):
+    """Collects the fit reports of many meters (e.g. from each evaluation
+    of a `TemperatureSensitivityParameterOptimizationMeter` across a
+    portfolio), to summarize them and find slow or non-convergent fits.
+
+    Only the scalar fields of each report are kept, not the result of the
+    optimizer (e.g. its inverse Hessian, or the results of each start of a
+    multi-start fit), so that collecting the reports of a large portfolio
+    takes little memory.
+    """
+
+    def __init__(self):
+        self.reports = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.reports)
+
+    def add(self, report, meter_id=None):
+        """Records the report of a fit to the meter identified by
+        `meter_id`, without its `result`.
+        """
+        report = FitReport(**report.to_dict())
+        with self._lock:
+            self.reports.append((meter_id, report))
+
+    def values(self, field):
+        """The value of a field of `FitReport` (e.g. "wall_time") in each
+        report, in the order added.
+        """
+        return np.array([getattr(report, field) for _, report in self.reports])
+
+    def histogram(self, field, bins=10):
+        """Histogram of a numeric field of the reports, as returned by
+        `np.histogram`, ignoring non-finite values.
+        """
+        values = self.values(field).astype(np.float64)
+        return np.histogram(values[np.isfinite(values)], bins=bins)
+
+    def pathological(self, max_wall_time=None, max_evaluations=None):
+        """The reports, as (meter_id, report) pairs, of fits which did not
+        converge, or which took longer than `max_wall_time` seconds or more
+        than `max_evaluations` evaluations of the objective, if given.
+        """
+        def is_pathological(report):
+            return not report.converged or \
+                    (max_wall_time is not None and report.wall_time > max_wall_time) or \
+                    (max_evaluations is not None and report.n_evaluations > max_evaluations)
+        return [(meter_id, report) for meter_id, report in self.reports
+                if is_pathological(report)]
+
+    def yaml_mapping(self):
+        return {}
@@ -1,9 +1,18 @@
 import scipy.optimize as opt
 import numpy as np
 from .parameters import ParameterType
+from .fit_report import FitReport
+from eemeter.ragged import SortedRaggedArray
+from multiprocessing.pool import ThreadPool
 import inspect
+import itertools
+import threading
+import time
 import warnings
 
+# CPU time of the calling thread; not available before python 3.7.
+_thread_time = getattr(time, "thread_time", None)
+
 class BaseloadModelParameterType(ParameterType):
     parameters = [
         "base_daily_consumption"
@@ -32,9 +41,84 @@ class BaseloadHeatingCoolingModelParameterType(ParameterType):
         "cooling_slope"
     ]
 
+class _TimeLimitReached(Exception):
+    pass
+
+class _StartsTimer(object):
+    """Measures the CPU time used by the starts of one multi-start fit. Each
+    start records the CPU time its thread has used since the start began
+    (`time.thread_time`), and the total is the sum over starts, so time used
+    by other threads (e.g. other fits running at the same time) is not
+    counted. Where per-thread CPU time is not available, the total is the
+    wall-clock time since the fit began instead.
+    """
+
+    def __init__(self):
+        self._began = {}
+        self._used = {}
+        self._wall_start = time.time()
+
+    def begin(self, i):
+        if _thread_time is not None:
+            self._began[i] = _thread_time()
+
+    def update(self, i):
+        # Called from the thread running start i.
+        if _thread_time is not None:
+            self._used[i] = _thread_time() - self._began[i]
+
+    def total(self):
+        if _thread_time is None:
+            return time.time() - self._wall_start
+        return sum(list(self._used.values()))
+
+_shared_pools = {}
+_shared_pools_lock = threading.Lock()
+
+def _shared_pool(n_workers):
+    # A pool of n_workers threads shared by every multi-start fit which uses
+    # that many, so that fits running at the same time do not each start
+    # their own threads.
+    with _shared_pools_lock:
+        if n_workers not in _shared_pools:
+            _shared_pools[n_workers] = ThreadPool(n_workers)
+        return _shared_pools[n_workers]
+
+def _latin_hypercube(n, bounds, random_state):
+    # n points within bounds (one row of [low, high] per parameter), such
+    # that each of the n equal intervals between the bounds of each
+    # parameter holds exactly one of them.
+    n_params = bounds.shape[0]
+    strata = np.array([random_state.permutation(n) for _ in range(n_params)]).T
+    unit = (strata + random_state.uniform(size=(n, n_params))) / max(n, 1)
+    return bounds[:, 0] + unit * (bounds[:, 1] - bounds[:, 0])
+
 class Model(object):
 
-    def __init__(self, initial_params=None, param_bounds=None, *args, **kwargs):
+    # Models which can compute the derivatives of their estimates with
+    # respect to their parameters override this with a method
+    # `_transform_and_jacobian(X, param_array)`.
+    _transform_and_jacobian = None
+
+    fit_methods = ["minimize", "grid", "multistart"]
+
+    def __init__(self, initial_params=None, param_bounds=None,
+            fit_method="minimize", grid_step=1., n_starts=8, n_workers=1,
+            max_cpu_time=None, random_state=0, *args, **kwargs):
+        if fit_method not in self.fit_methods:
+            message = "Fit method not supported ({}). Use one of {}." \
+                    .format(fit_method, self.fit_methods)
+            raise ValueError(message)
+        if n_starts < 1:
+            message = "n_starts must be at least 1, but got {}.".format(n_starts)
+            raise ValueError(message)
+        self.fit_method = fit_method
+        self.grid_step = grid_step
+        self.n_starts = n_starts
+        self.n_workers = n_workers
+        self.max_cpu_time = max_cpu_time
+        self.random_state = random_state
+
         if initial_params is None:
             self.initial_params = None
         else:
@@ -45,17 +129,71 @@ class Model(object):
         else:
             self.param_bounds = self.param_type(param_bounds)
 
-    def fit(self, X, y, weights=None):
+    def fit(self, X, y, weights=None, x0=None):
         """Returns parameters which, according to an optimization routine in
         `scipy.optimize`, minimize the sum of squared errors between observed
         usages and the output of the a model which takes observed_daily_temps
         and returns usage estimates.
+
+        If `fit_method` is "grid", the parameters are instead found by a grid
+        search over the parameters in which the model is nonlinear (at
+        intervals of `grid_step` within `param_bounds`), solving a bounded
+        linear least squares problem for the others at each grid point.
+
+        If `fit_method` is "multistart", the optimization is run from
+        `n_starts` points: the initial parameters (or `x0`), and a Latin
+        hypercube sample of the rest within `param_bounds`. The best solution
+        found is returned. Starts are run one after the other, or, if
+        `n_workers` is more than 1, on a pool of that many threads shared by
+        all fits. Starts are
+        stopped once they have used `max_cpu_time` seconds of CPU time
+        between them, if given (CPU time of the threads running this fit's
+        starts only, so other fits running at the same time do not use it
+        up; on python < 3.7, wall-clock time since the fit began); the
+        sample is drawn with the seed `random_state`.
+
+        Parameters
+        ----------
+        x0 : array_like, optional
+            Parameters from which to start the optimization in place of
+            `initial_params`, e.g. those fitted to the same meter before.
+            Not used by the grid search.
         """
-        if self.initial_params is None:
-            message = "must have initial_params defined for model fitting procedure."
-            raise ValueError(message)
+        if self.fit_method == "grid":
+            if weights is None:
+                weights = 1
+            return self.param_type(self._fit_grid(self._prepare_input(X), y, weights))
+
+        return self.param_type(self.minimize(X, y, weights, x0).x)
+
+    def minimize(self, X, y, weights=None, x0=None):
+        """Runs the optimization routine used by `fit` (when `fit_method` is
+        "minimize" or "multistart") and returns its result, a
+        `scipy.optimize.OptimizeResult` holding the optimal parameters as an
+        array (`x`) along with convergence information (`success`, `nit`,
+        `nfev`, `fun`, and `n_runtime_warnings`, the number of
+        RuntimeWarnings suppressed). When starts run on the shared pool,
+        warning filters, which are process-wide, are left alone, and
+        `n_runtime_warnings` is the number of floating point errors numpy
+        reported while running them.
+
+        The result of a multi-start optimization is that of the best start,
+        with diagnostics of all of them: `starts` (the starting points, one
+        per row), `start_results` (the result from each start, or None for
+        starts skipped because the CPU time limit was reached),
+        `n_starts_run`, `cpu_time` (summed over starts, as measured for
+        `max_cpu_time`) and `time_limit_reached`.
+        """
+        multistart = self.fit_method == "multistart"
+        if x0 is None:
+            if self.initial_params is None:
+                if not multistart:
+                    message = "must have initial_params defined for model fitting procedure."
+                    raise ValueError(message)
+            else:
+                x0 = self.initial_params.to_array()
         else:
-            x0 = self.initial_params.to_array()
+            x0 = np.asarray(x0, dtype=np.float64)
 
         if self.param_bounds is None:
             bounds = None
@@ -65,29 +203,236 @@ class Model(object):
         if weights is None:
             weights = 1
 
-        def objective_function(param_array):
-            y_est = self._transform(X, param_array)
-            return np.nansum(((y - y_est)**2) * weights)
+        X = self._prepare_input(X)
 
+        if self._transform_and_jacobian is None:
+            def objective_function(param_array):
+                y_est = self._transform(X, param_array)
+                return np.nansum(((y - y_est)**2) * weights)
+            jac = None
+        else:
+            def objective_function(param_array):
+                return self._objective(X, y, weights, param_array)
+            jac = True
 
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore", category=RuntimeWarning)
+        if multistart and self._n_start_workers() > 1:
+            return self._minimize_multistart(objective_function, jac, x0, bounds)
 
-            result = opt.minimize(objective_function, x0=x0, bounds=bounds)
-        params = result.x
-        return self.param_type(params)
+        # RuntimeWarnings (e.g. from periods without temperatures) are
+        # counted rather than shown.
+        with warnings.catch_warnings(record=True) as caught_warnings:
+            warnings.simplefilter("always", category=RuntimeWarning)
+
+            if multistart:
+                result = self._minimize_multistart(objective_function, jac, x0, bounds)
+            else:
+                result = opt.minimize(objective_function, x0=x0, bounds=bounds,
+                        jac=jac)
+        result.n_runtime_warnings = 0
+        for caught_warning in caught_warnings:
+            if issubclass(caught_warning.category, RuntimeWarning):
+                result.n_runtime_warnings += 1
+            else:
+                warnings.warn_explicit(caught_warning.message,
+                        caught_warning.category, caught_warning.filename,
+                        caught_warning.lineno)
+        return result
+
+    def _n_start_workers(self):
+        return min(self.n_workers or 1, self.n_starts)
+
+    def _minimize_multistart(self, objective_function, jac, x0, bounds):
+        if bounds is None or not np.all(np.isfinite(bounds)):
+            message = "must have finite param_bounds defined for multistart fitting procedure."
+            raise ValueError(message)
+
+        random_state = np.random.RandomState(self.random_state)
+        n_sampled = self.n_starts if x0 is None else self.n_starts - 1
+        starts = _latin_hypercube(n_sampled, bounds, random_state)
+        if x0 is not None:
+            starts = np.vstack([x0[np.newaxis, :], starts])
+
+        timer = _StartsTimer()
+        max_cpu_time = self.max_cpu_time
+
+        def run(i):
+            # The first start always runs, so that there is a result; the
+            # others are skipped or stopped early once past the limit.
+            if max_cpu_time is not None and i > 0 and timer.total() > max_cpu_time:
+                return None
+            timer.begin(i)
+            best = {"fun": np.inf, "x": starts[i], "nfev": 0}
+
+            def tracked_objective_function(param_array):
+                timer.update(i)
+                if max_cpu_time is not None and best["nfev"] > 0 and \
+                        timer.total() > max_cpu_time:
+                    raise _TimeLimitReached
+                value = objective_function(param_array)
+                best["nfev"] += 1
+                fun = value[0] if jac else value
+                if fun < best["fun"]:
+                    best["fun"], best["x"] = fun, np.array(param_array)
+                return value
+
+            try:
+                return opt.minimize(tracked_objective_function, x0=starts[i],
+                        bounds=bounds, jac=jac)
+            except _TimeLimitReached:
+                return opt.OptimizeResult(x=best["x"], fun=best["fun"],
+                        success=False, status=-1, nit=0, nfev=best["nfev"],
+                        message="CPU time limit reached")
+            finally:
+                timer.update(i)
+
+        n_workers = self._n_start_workers()
+        if n_workers > 1:
+            # Numpy's error handling is per thread, so each start counts the
+            # floating point errors on the thread it runs on.
+            n_errors = [0] * starts.shape[0]
+
+            def run_counting_errors(i):
+                def count(error, flag):
+                    n_errors[i] += 1
+                with np.errstate(divide='call', over='call', invalid='call',
+                        call=count):
+                    return run(i)
+
+            start_results = _shared_pool(n_workers).map(run_counting_errors,
+                    range(starts.shape[0]))
+        else:
+            start_results = [run(i) for i in range(starts.shape[0])]
+
+        completed = [r for r in start_results if r is not None]
+        funs = np.array([r.fun for r in completed], dtype=np.float64)
+        result = opt.OptimizeResult(completed[int(np.argmin(np.where(np.isnan(funs), np.inf, funs)))])
+        result.starts = starts
+        result.start_results = start_results
+        result.n_starts_run = len(completed)
+        result.cpu_time = timer.total()
+        result.time_limit_reached = any(r is None or r.status == -1
+                for r in start_results)
+        if n_workers > 1:
+            result.n_runtime_warnings = sum(n_errors)
+        return result
+
+    def fit_with_report(self, X, y, weights=None, x0=None):
+        """Fits the model as `fit` does, and reports on the fit.
+
+        Returns
+        -------
+        params : ParameterType
+            Fitted parameters, as returned by `fit`.
+        report : eemeter.models.FitReport
+            Iterations, evaluations of the objective, wall time, termination
+            status and final objective of the fit.
+        """
+        start_time = time.time()
+        if self.fit_method == "grid":
+            params = self.fit(X, y, weights)
+            wall_time = time.time() - start_time
+            y_est = self.transform(X, params)
+            if weights is None:
+                weights = 1
+            with np.errstate(invalid='ignore'):
+                objective = float(np.nansum(((y - y_est)**2) * weights))
+            bounds = self.param_bounds.to_dict()
+            n_points = int(np.prod([
+                    np.arange(bounds[name][0], bounds[name][1] + self.grid_step / 2.,
+                            self.grid_step).shape[0]
+                    for name, _, _ in self._degree_day_terms]))
+            report = FitReport(self.fit_method, converged=True, status=0,
+                    message="Grid search completed.", n_iterations=0,
+                    n_evaluations=n_points, objective=objective,
+                    wall_time=wall_time)
+            return params, report
+
+        result = self.minimize(X, y, weights, x0)
+        report = FitReport.from_optimize_result(self.fit_method, result,
+                time.time() - start_time)
+        return self.param_type(result.x), report
 
     def transform(self, X, params):
         return self._transform(X, params.to_array())
 
+    def _prepare_input(self, X):
+        """Converts input once before fitting, so that the conversion is not
+        repeated on every evaluation of `_transform`.
+        """
+        return X
+
     def _transform(self, X, param_array):
         raise NotImplementedError
 
+    def fit_many(self, X, y, weights=None):
+        """Fits the model to many sets of data at once, e.g. the usages of
+        many meters which share a weather station. Only available with the
+        "grid" fit method: degree days are computed for all sets together
+        and every set is fitted in the same vectorized grid search.
+
+        Parameters
+        ----------
+        X : list
+            Input for each set, as accepted by `fit`.
+        y : list of array_like
+            Observed usages for each set.
+        weights : list of array_like, optional
+            Weights for each set.
+
+        Returns
+        -------
+        out : np.ndarray
+            Parameters fitted to each set, as a matrix with one row per set
+            in the order of `param_type`, e.g. `self.param_type(out[i])`.
+        """
+        if self.fit_method != "grid":
+            message = "fit_many requires the grid fit method, not {}; use fit" \
+                    " for each set instead.".format(self.fit_method)
+            raise ValueError(message)
+        if weights is None:
+            weights = [1] * len(X)
+        return self._fit_grid_many(X, y, weights)
+
+    def _fit_grid(self, X, y, weights):
+        return self._fit_grid_many([X], [y], [weights])[0]
+
+    def _fit_grid_many(self, Xs, ys, weights):
+        raise NotImplementedError
+
+    def jacobian(self, X, params):
+        """The derivatives of the usage estimates for each period with
+        respect to each parameter, as an array of shape
+        `(n_periods, n_params)`.
+        """
+        if self._transform_and_jacobian is None:
+            raise NotImplementedError
+        return self._transform_and_jacobian(self._prepare_input(X),
+                params.to_array())[1]
+
+    def _objective(self, X, y, weights, param_array):
+        """The weighted sum of squared errors between observed usages and
+        usage estimates, and its gradient with respect to the parameters.
+        Periods with null errors are ignored.
+        """
+        y_est, jacobian = self._transform_and_jacobian(X, param_array)
+        residuals = np.asarray(y, dtype=np.float64) - y_est
+        weighted_residuals = residuals * weights
+        valid = ~np.isnan(weighted_residuals)
+        sse = np.sum(residuals[valid] * weighted_residuals[valid])
+        gradient = -2 * np.dot(weighted_residuals[valid], jacobian[valid])
+        return sse, gradient
+
     def yaml_mapping(self):
         args = inspect.getargspec(self.__init__).args[1:]
         mapping = { arg: getattr(self,arg) for arg in args}
         mapping["initial_params"] = self.initial_params.to_dict()
         mapping["param_bounds"] = self.param_bounds.to_dict()
+        mapping["fit_method"] = self.fit_method
+        mapping["grid_step"] = self.grid_step
+        mapping["n_starts"] = self.n_starts
+        mapping["n_workers"] = self.n_workers
+        mapping["max_cpu_time"] = self.max_cpu_time
+        mapping["random_state"] = self.random_state
         return mapping
 
 class AverageDailyTemperatureSensitivityModel(Model):
@@ -109,8 +454,225 @@ class AverageDailyTemperatureSensitivityModel(Model):
         self.initial_params = self.model.initial_params
         self.param_bounds = self.model.param_bounds
         self._transform = self.model._transform
-
-class AverageDailyBaseloadConsumptionModel(Model):
+        self._transform_and_jacobian = self.model._transform_and_jacobian
+        self._prepare_input = self.model._prepare_input
+        self._fit_grid_many = self.model._fit_grid_many
+        self._degree_day_terms = self.model._degree_day_terms
+        self.fit_method = self.model.fit_method
+        self.grid_step = self.model.grid_step
+        self.n_starts = self.model.n_starts
+        self.n_workers = self.model.n_workers
+        self.max_cpu_time = self.model.max_cpu_time
+        self.random_state = self.model.random_state
+
+class _DailyTemperatureModel(Model):
+    """Base class for models of average daily usage during each period from
+    the daily temperatures observed during it. Input may be given as a
+    RaggedArray, a 2D array, or a sequence of arrays of daily temperatures,
+    and is converted to a SortedRaggedArray, so that degree days at any
+    balance temperature are found by binary search in each period's sorted
+    temperatures rather than by a pass over all of its days. Fitting
+    converts the input once and reuses it for every evaluation.
+
+    Usage is modeled as base load plus, for each degree day term listed in
+    `_degree_day_terms` as (balance temperature, slope, heating), the slope
+    times the average degree days per day at the balance temperature.
+    """
+
+    _degree_day_terms = []
+
+    def _prepare_input(self, X):
+        return SortedRaggedArray.from_arrays(X)
+
+    # Largest number of (set, grid point, row) elements solved at once by
+    # the grid search; sets are solved in chunks below this.
+    _grid_chunk_size = 1 << 20
+
+    def _fit_grid_many(self, Xs, ys, weights):
+        if self.param_bounds is None:
+            message = "must have param_bounds defined for grid search fitting procedure."
+            raise ValueError(message)
+        bounds = self.param_bounds.to_dict()
+
+        # Periods of all sets are stacked, so that degree days are computed
+        # once at every candidate balance temperature for all of them.
+        Xs = [self._prepare_input(X) for X in Xs]
+        X = SortedRaggedArray.concatenate(Xs)
+        grids, tables = [], []
+        for balance_name, _, heating in self._degree_day_terms:
+            low, high = bounds[balance_name]
+            grid = np.arange(low, high + self.grid_step / 2., self.grid_step)
+            grids.append(grid)
+            tables.append(_mean_degree_day_table(X, grid, heating))
+
+        n_sets = len(Xs)
+        n_rows = np.array([len(X_i) for X_i in Xs], dtype=np.intp)
+        max_rows = max([1] + n_rows.tolist())
+        set_index = np.repeat(np.arange(n_sets), n_rows)
+        row_index = np.arange(len(X)) - np.repeat(np.cumsum(n_rows) - n_rows, n_rows)
+
+        y = np.concatenate([np.zeros((0,))] +
+                [np.asarray(y_i, dtype=np.float64).ravel() for y_i in ys])
+        weights = np.concatenate([np.zeros((0,))] +
+                [np.ones((n,)) * w for n, w in zip(n_rows, weights)])
+        valid = ~np.isnan(y) & ~np.isnan(weights)
+        for table in tables:
+            valid &= ~np.any(np.isnan(table), axis=1)
+        sqrt_weights = np.sqrt(np.where(valid, weights, 0))
+
+        # Weighted columns of the linear least squares problems (base load,
+        # then the degree days of each term) and targets, with the rows of
+        # each set padded to the same number. Invalid and padding rows are
+        # zero, so they do not affect the fits.
+        def pad(values):
+            padded = np.zeros((n_sets, max_rows) + values.shape[1:])
+            valid_ = valid.reshape((-1,) + (1,) * (values.ndim - 1))
+            weights_ = sqrt_weights.reshape(valid_.shape)
+            padded[set_index, row_index] = np.where(valid_, values * weights_, 0)
+            return padded
+        base_column = pad(np.ones((len(X),)))
+        degree_day_columns = [pad(table) for table in tables]
+        targets = pad(y)
+
+        shape = tuple(grid.shape[0] for grid in grids)
+        n_points = int(np.prod(shape))
+        grid_indices = np.indices(shape).reshape((len(shape), n_points))
+        linear_names = [self.param_type._parameter_names[0]] + \
+                [slope_name for _, slope_name, _ in self._degree_day_terms]
+        lower = np.array([bounds[name][0] for name in linear_names], dtype=np.float64)
+        upper = np.array([bounds[name][1] for name in linear_names], dtype=np.float64)
+
+        coefficients = np.empty((n_sets, len(linear_names)))
+        best_points = np.empty((n_sets,), dtype=np.intp)
+        chunk_size = max(1, self._grid_chunk_size // (n_points * max_rows))
+        for i in range(0, n_sets, chunk_size):
+            m = min(chunk_size, n_sets - i)
+            A = np.stack([np.broadcast_to(base_column[i:i + m, np.newaxis, :],
+                    (m, n_points, max_rows))] +
+                    [columns[i:i + m][:, :, indices].transpose((0, 2, 1))
+                    for columns, indices in zip(degree_day_columns, grid_indices)],
+                    axis=3).reshape((m * n_points, max_rows, len(linear_names)))
+            b = np.repeat(targets[i:i + m], n_points, axis=0)
+            x, sse = _bounded_least_squares(A, b, lower, upper)
+            best = np.argmin(sse.reshape((m, n_points)), axis=1)
+            best_points[i:i + m] = best
+            coefficients[i:i + m] = x.reshape((m, n_points, -1))[np.arange(m), best]
+
+        values = dict(zip(linear_names, coefficients.T))
+        for (balance_name, _, _), grid, indices in zip(self._degree_day_terms, grids, grid_indices):
+            values[balance_name] = grid[indices[best_points]]
+        return np.column_stack([values[name] for name in self.param_type._parameter_names])
+
+def _mean_degree_day_table(X, bases, heating):
+    # Average degree days per day in each period (rows) at each base
+    # (columns).
+    if heating:
+        return _mean_heating_demand(X, bases)
+    return _mean_cooling_demand(X, bases)
+
+def _solve_normal_equations(a, b):
+    # Solves a stack of small symmetric systems `a[i].dot(x) = b[i]`, through
+    # the pseudoinverse where they are (nearly) singular, e.g. when a period
+    # has no degree days at a balance temperature.
+    n = a.shape[-1]
+    scale = np.max(np.abs(a), axis=(1, 2))
+    with np.errstate(invalid='ignore', over='ignore'):
+        singular = ~(np.abs(np.linalg.det(a)) > 1e-12 * scale ** n)
+    x = np.linalg.solve(np.where(singular[:, np.newaxis, np.newaxis], np.eye(n), a),
+            b[:, :, np.newaxis])[:, :, 0]
+    if np.any(singular):
+        x[singular] = np.einsum('ijk,ik->ij', np.linalg.pinv(a[singular]), b[singular])
+    return x
+
+def _bounded_least_squares(A, b, lower, upper):
+    """Solves a stack of small linear least squares problems with bounds,
+    minimizing `||A[i].dot(x) - b||` subject to `lower <= x <= upper` for
+    each `i`.
+
+    Each problem is convex, so its minimum lies in the relative interior of
+    some face of the box of bounds, where it is the unconstrained minimum
+    with the parameters off that face fixed at their bounds. All
+    `3 ** n_params` faces are tried, and the best feasible solution kept.
+
+    `b` is either shared by all problems, with shape `(n_observations,)`,
+    or given for each, with shape `(n_problems, n_observations)`. Returns
+    the solutions, of shape `(n_problems, n_params)`, and the sum of
+    squared errors of each.
+    """
+    n_problems, _, n_params = A.shape
+
+    # Each face is solved through the normal equations, so the observations
+    # are only passed over once.
+    gram = np.einsum('inp,inq->ipq', A, A)
+    moments = np.einsum('inp,in->ip', A, b * np.ones((n_problems, 1)))
+    sum_of_squares = np.sum(b ** 2, axis=-1) * np.ones((n_problems,))
+
+    best_x = np.zeros((n_problems, n_params))
+    best_sse = np.inf * np.ones((n_problems,))
+    for face in itertools.product([None, "lower", "upper"], repeat=n_params):
+        fixed = np.array([side is not None for side in face], dtype=bool)
+        fixed_values = np.array([lower[i] if side == "lower" else upper[i]
+                for i, side in enumerate(face) if side is not None])
+        if not np.all(np.isfinite(fixed_values)):
+            continue
+
+        x = np.zeros((n_problems, n_params))
+        x[:, fixed] = fixed_values
+        if not np.all(fixed):
+            free = ~fixed
+            rhs = moments[:, free] - np.einsum('ikp,ip->ik', gram[:, free][:, :, fixed],
+                    x[:, fixed])
+            x[:, free] = _solve_normal_equations(gram[:, free][:, :, free], rhs)
+        sse = sum_of_squares - 2 * np.einsum('ip,ip->i', x, moments) + \
+                np.einsum('ip,ipq,iq->i', x, gram, x)
+
+        tolerance = 1e-9 * (1 + np.abs(x))
+        feasible = np.all((x >= lower - tolerance) & (x <= upper + tolerance), axis=1)
+        better = feasible & (sse < best_sse)
+        best_x[better] = np.clip(x[better], lower, upper)
+        best_sse[better] = sse[better]
+    return best_x, best_sse
+
+# The helpers below take daily temperatures as a SortedRaggedArray, so that
+# degree days are found from the prefix sums of each period's sorted
+# temperatures at a cost independent of the number of days. Balance
+# temperatures may be arrays, in which case each period is evaluated at each
+# of them (one column per balance temperature).
+
+def _n_days(X, ndim):
+    # Number of days with observed temperatures in each period, shaped to
+    # broadcast against per-period arrays with the given number of
+    # dimensions.
+    return X.lengths.reshape((-1,) + (1,) * (ndim - 1))
+
+def _per_day(X, values):
+    # Periods without any observed temperatures are nan.
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return values / _n_days(X, values.ndim)
+
+def _mean_heating_demand(X, heating_balance_temperature):
+    # Average heating degree days per day in each period.
+    count, total = X.count_and_sum_below(heating_balance_temperature)
+    return _per_day(X, heating_balance_temperature * count - total)
+
+def _mean_cooling_demand(X, cooling_balance_temperature):
+    # Average cooling degree days per day in each period.
+    count, total = X.count_and_sum_below(cooling_balance_temperature, inclusive=True)
+    n_days = _n_days(X, count.ndim)
+    total_above = X.segment_sum().reshape(n_days.shape) - total
+    return _per_day(X, total_above - cooling_balance_temperature * (n_days - count))
+
+def _fraction_of_days_below(X, temperature):
+    # Fraction of days in each period with observed temperatures below the
+    # given one. At the hinge of the degree day function (days exactly at
+    # the balance temperature), 0 is used as the subgradient.
+    return _per_day(X, X.count_and_sum_below(temperature)[0])
+
+def _fraction_of_days_above(X, temperature):
+    count = X.count_and_sum_below(temperature, inclusive=True)[0]
+    return _per_day(X, _n_days(X, count.ndim) - count)
+
+class AverageDailyBaseloadConsumptionModel(_DailyTemperatureModel):
 
     def __init__(self, *args, **kwargs):
         self.param_type = BaseloadModelParameterType
@@ -118,96 +680,105 @@ class AverageDailyBaseloadConsumptionModel(Model):
 
     def _transform(self, X, param_array):
         base_daily_consumption = param_array[0]
+        return np.tile(base_daily_consumption, len(self._prepare_input(X)))
 
-        if not isinstance(X, np.ndarray):
-            observed_daily_temps = np.array(X)
-        else:
-            observed_daily_temps = X
-
-        return np.tile(base_daily_consumption, observed_daily_temps.shape[0])
+    def _transform_and_jacobian(self, X, param_array):
+        y_est = self._transform(X, param_array)
+        return y_est, np.ones((y_est.shape[0], 1))
 
-class AverageDailyBaseloadHeatingConsumptionModel(Model):
+class AverageDailyBaseloadHeatingConsumptionModel(_DailyTemperatureModel):
 
     def __init__(self, *args, **kwargs):
         self.param_type = BaseloadHeatingModelParameterType
+        self._degree_day_terms = [
+            ("heating_balance_temperature", "heating_slope", True),
+        ]
         super(AverageDailyBaseloadHeatingConsumptionModel, self).__init__(*args, **kwargs)
 
     def _transform(self, X, param_array):
         base_daily_consumption, heating_balance_temperature, heating_slope = \
                 param_array
 
-        if not isinstance(X, np.ndarray):
-            observed_daily_temps = np.array(X)
-        else:
-            observed_daily_temps = X
-
-        avg_daily_consumption_estimates = []
-        for period_daily_temps in observed_daily_temps:
-            if not isinstance(period_daily_temps, np.ndarray):
-                period_daily_temps = np.array(period_daily_temps)
+        X = self._prepare_input(X)
+        avg_daily_heating_demand = _mean_heating_demand(X, heating_balance_temperature)
+        return heating_slope * avg_daily_heating_demand + base_daily_consumption
 
-            daily_heating_demand = np.maximum(heating_balance_temperature - period_daily_temps, 0)
-            avg_daily_heating_consumption = np.nanmean(daily_heating_demand * heating_slope)
-
-            avg_daily_consumption_estimate = avg_daily_heating_consumption + base_daily_consumption
-            avg_daily_consumption_estimates.append(avg_daily_consumption_estimate)
+    def _transform_and_jacobian(self, X, param_array):
+        base_daily_consumption, heating_balance_temperature, heating_slope = \
+                param_array
 
-        return np.array(avg_daily_consumption_estimates)
+        avg_daily_heating_demand = _mean_heating_demand(X, heating_balance_temperature)
+        y_est = heating_slope * avg_daily_heating_demand + base_daily_consumption
+        jacobian = np.column_stack([
+            np.ones(y_est.shape),
+            heating_slope * _fraction_of_days_below(X, heating_balance_temperature),
+            avg_daily_heating_demand,
+        ])
+        return y_est, jacobian
 
-class AverageDailyBaseloadCoolingConsumptionModel(Model):
+class AverageDailyBaseloadCoolingConsumptionModel(_DailyTemperatureModel):
 
     def __init__(self, *args, **kwargs):
         self.param_type = BaseloadCoolingModelParameterType
+        self._degree_day_terms = [
+            ("cooling_balance_temperature", "cooling_slope", False),
+        ]
         super(AverageDailyBaseloadCoolingConsumptionModel, self).__init__(*args, **kwargs)
 
     def _transform(self, X, param_array):
         base_daily_consumption, cooling_balance_temperature, cooling_slope = \
                 param_array
 
-        if not isinstance(X, np.ndarray):
-            observed_daily_temps = np.array(X)
-        else:
-            observed_daily_temps = X
+        X = self._prepare_input(X)
+        avg_daily_cooling_demand = _mean_cooling_demand(X, cooling_balance_temperature)
+        return cooling_slope * avg_daily_cooling_demand + base_daily_consumption
 
-        avg_daily_consumption_estimates = []
-        for period_daily_temps in observed_daily_temps:
-            if not isinstance(period_daily_temps, np.ndarray):
-                period_daily_temps = np.array(period_daily_temps)
-
-            daily_cooling_demand = np.maximum(period_daily_temps - cooling_balance_temperature, 0)
-            avg_daily_cooling_consumption = np.nanmean(daily_cooling_demand * cooling_slope)
-
-            avg_daily_consumption_estimate = avg_daily_cooling_consumption + base_daily_consumption
-            avg_daily_consumption_estimates.append(avg_daily_consumption_estimate)
+    def _transform_and_jacobian(self, X, param_array):
+        base_daily_consumption, cooling_balance_temperature, cooling_slope = \
+                param_array
 
-        return np.array(avg_daily_consumption_estimates)
+        avg_daily_cooling_demand = _mean_cooling_demand(X, cooling_balance_temperature)
+        y_est = cooling_slope * avg_daily_cooling_demand + base_daily_consumption
+        jacobian = np.column_stack([
+            np.ones(y_est.shape),
+            -cooling_slope * _fraction_of_days_above(X, cooling_balance_temperature),
+            avg_daily_cooling_demand,
+        ])
+        return y_est, jacobian
 
-class AverageDailyBaseloadHeatingCoolingConsumptionModel(Model):
+class AverageDailyBaseloadHeatingCoolingConsumptionModel(_DailyTemperatureModel):
 
     def __init__(self, *args, **kwargs):
         self.param_type = BaseloadHeatingCoolingModelParameterType
+        self._degree_day_terms = [
+            ("heating_balance_temperature", "heating_slope", True),
+            ("cooling_balance_temperature", "cooling_slope", False),
+        ]
         super(AverageDailyBaseloadHeatingCoolingConsumptionModel, self).__init__(*args, **kwargs)
 
     def _transform(self, X, param_array):
         base_daily_consumption, heating_balance_temperature, heating_slope, \
                 cooling_balance_temperature, cooling_slope = param_array
 
-        if not isinstance(X, np.ndarray):
-            observed_daily_temps = np.array(X)
-        else:
-            observed_daily_temps = X
-
-        avg_daily_consumption_estimates = []
-        for period_daily_temps in observed_daily_temps:
-            if not isinstance(period_daily_temps, np.ndarray):
-                period_daily_temps = np.array(period_daily_temps)
+        X = self._prepare_input(X)
+        avg_daily_heating_demand = _mean_heating_demand(X, heating_balance_temperature)
+        avg_daily_cooling_demand = _mean_cooling_demand(X, cooling_balance_temperature)
+        return cooling_slope * avg_daily_cooling_demand + \
+                heating_slope * avg_daily_heating_demand + base_daily_consumption
 
-            daily_heating_demand = np.maximum(heating_balance_temperature - period_daily_temps, 0)
-            avg_daily_heating_consumption = np.nanmean(daily_heating_demand * heating_slope)
-
-            daily_cooling_demand = np.maximum(period_daily_temps - cooling_balance_temperature, 0)
-            avg_daily_cooling_consumption = np.nanmean(daily_cooling_demand * cooling_slope)
+    def _transform_and_jacobian(self, X, param_array):
+        base_daily_consumption, heating_balance_temperature, heating_slope, \
+                cooling_balance_temperature, cooling_slope = param_array
 
-            avg_daily_consumption_estimate = avg_daily_cooling_consumption + avg_daily_heating_consumption + base_daily_consumption
-            avg_daily_consumption_estimates.append(avg_daily_consumption_estimate)
-        return np.array(avg_daily_consumption_estimates)
+        avg_daily_heating_demand = _mean_heating_demand(X, heating_balance_temperature)
+        avg_daily_cooling_demand = _mean_cooling_demand(X, cooling_balance_temperature)
+        y_est = cooling_slope * avg_daily_cooling_demand + \
+                heating_slope * avg_daily_heating_demand + base_daily_consumption
+        jacobian = np.column_stack([
+            np.ones(y_est.shape),
+            heating_slope * _fraction_of_days_below(X, heating_balance_temperature),
+            avg_daily_heating_demand,
+            -cooling_slope * _fraction_of_days_above(X, cooling_balance_temperature),
+            avg_daily_cooling_demand,
+        ])
+        return y_est, jacobian
@@ -0,0 +1,123 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from eemeter.weather import _atomic_write
+
+
+class WarmStartStore(object):
+    """Remembers the parameters last fitted for each meter and model
+    configuration, so that fitting the same meter again (e.g. nightly, after
+    another bill has arrived) can start from them instead of from the static
+    `initial_params` of the model, and usually converges in a few
+    iterations.
+
+    Only fits which converged are used as starting points: each record
+    holds the parameters of the last one, "params", which is missing until
+    a fit has converged. Along with them, each record holds convergence
+    statistics of the last fit, whether or not it converged:
+    "n_iterations", "n_evaluations", "converged" and "objective", and the
+    number of fits recorded, "n_fits".
+
+    Parameters
+    ----------
+    filename : str, optional
+        JSON file in which records are kept between runs. Records are loaded
+        from it if it exists, and written to it by `save`. If None, records
+        are only kept in memory.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self._records = {}
+        self._lock = threading.RLock()
+        if filename is not None and os.path.exists(filename):
+            with open(filename, 'r') as f:
+                self._records = json.load(f)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, key):
+        return key in self._records
+
+    @staticmethod
+    def key(meter_id, model, **config):
+        """A key for the fits of a model to a meter.
+
+        Parameters
+        ----------
+        meter_id : str
+            Identifies the meter (or consumption history), e.g. the name of
+            its ConsumptionData.
+        model : eemeter.models.Model
+            Model being fitted; its parameters and bounds are part of the
+            key, so that changing them does not reuse old fits.
+        **config
+            Anything else the fitted parameters depend on, e.g. the
+            temperature unit.
+        """
+        model_config = {
+            "params": list(model.param_type._parameter_names),
+            "param_bounds": None if model.param_bounds is None
+                    else np.asarray(model.param_bounds.to_list(), dtype=float).tolist(),
+        }
+        model_config.update(config)
+        return "{}:{}".format(meter_id, json.dumps(model_config, sort_keys=True))
+
+    def get(self, key):
+        """The record for a key, or None if nothing has been recorded.
+        """
+        with self._lock:
+            record = self._records.get(key)
+            return None if record is None else dict(record)
+
+    def get_params(self, key):
+        """The parameters of the last fit recorded for a key which
+        converged, as an array, or None if none has.
+        """
+        record = self.get(key)
+        if record is None or "params" not in record:
+            return None
+        return np.array(record["params"], dtype=np.float64)
+
+    def put(self, key, result):
+        """Records the result of a fit.
+
+        Parameters
+        ----------
+        key : str
+            Key, e.g. from `key`.
+        result : scipy.optimize.OptimizeResult
+            Result of the fit, e.g. from `Model.minimize`.
+        """
+        converged = bool(result.get("success", False))
+        with self._lock:
+            previous = self._records.get(key, {})
+            record = {
+                "n_iterations": int(result.get("nit", 0)),
+                "n_evaluations": int(result.get("nfev", 0)),
+                "converged": converged,
+                "objective": float(result.get("fun", np.nan)),
+                "n_fits": previous.get("n_fits", 0) + 1,
+            }
+            if converged:
+                record["params"] = np.asarray(result.x, dtype=np.float64).tolist()
+            elif "params" in previous:
+                record["params"] = previous["params"]
+            self._records[key] = record
+
+    def save(self):
+        """Writes the records to `filename`, atomically so that a run which
+        is interrupted does not leave a corrupted file.
+        """
+        if self.filename is None:
+            return
+        with self._lock:
+            _atomic_write(self.filename, lambda f: json.dump(self._records, f),
+                    mode='w')
+
+    def yaml_mapping(self):
+        return {"filename": self.filename}
@@ -1,5 +1,6 @@
 from eemeter.weather import GSODWeatherSource
 from eemeter.weather import TMY3WeatherSource
+from eemeter.weather import get_weather_source
 
 class Project(object):
     """
@@ -36,9 +37,11 @@ class Project(object):
         Other named date/time periods of interest (perhaps particular seasons
         or years).
     weather_source : eemeter.weather.WeatherSourceBase
-        Source of weather data.
+        Source of weather data. Defaults to the GSOD weather source for the
+        location's station from the shared weather source registry.
     weather_normal_source : eemeter.weather.WeatherSourceBase
-        Source of weather normal data.
+        Source of weather normal data. Defaults to the TMY3 weather source
+        for the location's station from the shared weather source registry.
     """
 
     def __init__(self, location, consumption=[], baseline_period=None,
@@ -66,11 +69,13 @@ class Project(object):
             raise ValueError(message)
 
         if weather_source is None:
-            weather_source = GSODWeatherSource(location.station)
+            weather_source = get_weather_source(GSODWeatherSource,
+                    location.station)
         self.weather_source = weather_source
 
         if weather_normal_source is None:
-            weather_normal_source = TMY3WeatherSource(location.station)
+            weather_normal_source = get_weather_source(TMY3WeatherSource,
+                    location.station)
         self.weather_normal_source = weather_normal_source
 
     def all_periods(self):
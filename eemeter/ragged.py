@@ -0,0 +1,224 @@
+import numpy as np
+
+
+class RaggedArray(object):
+    """A sequence of variable-length arrays (e.g. the daily temperatures
+    observed during each of several periods) stored as one flat float64
+    buffer and an array of offsets into it.
+
+    Parameters
+    ----------
+    values : array_like
+        Flat buffer holding the elements of every segment, in order.
+    offsets : array_like
+        Array of length `n_segments + 1` such that segment `i` is
+        `values[offsets[i]:offsets[i + 1]]`.
+    """
+
+    def __init__(self, values, offsets):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.intp)
+
+        if self.offsets.ndim != 1 or self.offsets.shape[0] == 0 or \
+                self.offsets[0] != 0 or \
+                self.offsets[-1] != self.values.shape[0] or \
+                np.any(np.diff(self.offsets) < 0):
+            message = "Offsets must increase from 0 to the length of " \
+                    "values ({}), but got offsets={}" \
+                    .format(self.values.shape[0], self.offsets)
+            raise ValueError(message)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Builds a ragged array from a sequence of 1D arrays (or lists), or
+        from the rows of a 2D array.
+        """
+        if isinstance(arrays, cls):
+            return arrays
+        if isinstance(arrays, np.ndarray) and arrays.ndim == 2:
+            n_rows, n_cols = arrays.shape
+            return cls(arrays.ravel(), np.arange(n_rows + 1) * n_cols)
+        arrays = [np.asarray(a, dtype=np.float64).ravel() for a in arrays]
+        offsets = np.zeros((len(arrays) + 1,), dtype=np.intp)
+        offsets[1:] = np.cumsum([a.shape[0] for a in arrays])
+        if len(arrays) == 0:
+            return cls(np.empty((0,)), offsets)
+        return cls(np.concatenate(arrays), offsets)
+
+    @classmethod
+    def concatenate(cls, ragged_arrays):
+        """Joins ragged arrays (or anything accepted by `from_arrays`) into
+        one holding all of their segments, in order.
+        """
+        ragged_arrays = [cls.from_arrays(a) for a in ragged_arrays]
+        if len(ragged_arrays) == 0:
+            return cls.from_arrays([])
+        starts = np.cumsum([0] + [a.values.shape[0] for a in ragged_arrays[:-1]])
+        offsets = np.concatenate([[0]] + [a.offsets[1:] + start
+                for a, start in zip(ragged_arrays, starts)])
+        return cls(np.concatenate([a.values for a in ragged_arrays]), offsets)
+
+    def __len__(self):
+        return self.offsets.shape[0] - 1
+
+    def __getitem__(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("index {} out of range".format(i))
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return "RaggedArray(n_segments={}, n_values={})" \
+                .format(len(self), self.values.shape[0])
+
+    @property
+    def lengths(self):
+        """The number of elements in each segment.
+        """
+        return np.diff(self.offsets)
+
+    def with_values(self, values):
+        """A ragged array with the same segments as this one, but holding
+        the given flat buffer (e.g. the result of an elementwise operation
+        on `self.values`).
+        """
+        return RaggedArray(values, self.offsets)
+
+    def to_list(self):
+        """The segments as a list of arrays (views into the flat buffer).
+        """
+        return list(self)
+
+    def segment_sum(self, values=None):
+        """The sum of each segment, ignoring nans. Empty segments sum to 0.
+
+        Parameters
+        ----------
+        values : array_like, optional
+            Flat buffer to reduce in place of `self.values`; must have the
+            same length. It may have further dimensions (e.g. one column per
+            degree day base), in which case each column is reduced.
+        """
+        if values is None:
+            values = self.values
+        values = np.where(np.isnan(values), 0., values)
+        return self._reduce(values, np.zeros((len(self),) + values.shape[1:]))
+
+    def segment_count(self, values=None):
+        """The number of non-nan elements in each segment.
+        """
+        if values is None:
+            values = self.values
+        valid = (~np.isnan(values)).astype(np.intp)
+        return self._reduce(valid, np.zeros((len(self),) + valid.shape[1:],
+                dtype=np.intp))
+
+    def segment_nanmean(self, values=None):
+        """The mean of each segment, ignoring nans. Segments without any
+        valid elements are nan.
+        """
+        if values is None:
+            values = self.values
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.segment_sum(values) / self.segment_count(values)
+
+    def _reduce(self, values, out):
+        nonempty = self.lengths > 0
+        if np.any(nonempty):
+            # Start indices of empty segments coincide with the start of the
+            # next non-empty one, so dropping them leaves reduceat correct.
+            out[nonempty] = np.add.reduceat(values, self.offsets[:-1][nonempty])
+        return out
+
+
+class SortedRaggedArray(RaggedArray):
+    """A ragged array whose segments are sorted in increasing order, with
+    nans dropped, along with the prefix sums of its flat buffer. Counts and
+    sums of the elements of each segment below any threshold are then found
+    by binary search and differences of prefix sums, without a pass over
+    every element, e.g. to evaluate
+    average degree days at many candidate balance temperatures.
+
+    Parameters
+    ----------
+    values : array_like
+        Flat buffer holding the elements of every segment, in order (each
+        segment need not be sorted).
+    offsets : array_like
+        Array of length `n_segments + 1` such that segment `i` is
+        `values[offsets[i]:offsets[i + 1]]`.
+    """
+
+    def __init__(self, values, offsets):
+        ragged_array = RaggedArray(values, offsets)
+        segment_ids = np.repeat(np.arange(len(ragged_array)), ragged_array.lengths)
+        values = ragged_array.values[np.lexsort((ragged_array.values, segment_ids))]
+        valid = ~np.isnan(values)
+        offsets = np.zeros((len(ragged_array) + 1,), dtype=np.intp)
+        offsets[1:] = np.cumsum(np.bincount(segment_ids[valid],
+                minlength=len(ragged_array)))
+        super(SortedRaggedArray, self).__init__(values[valid], offsets)
+
+        # prefix_sums[j] is the sum of values[:j].
+        self.prefix_sums = np.zeros((self.values.shape[0] + 1,))
+        np.cumsum(self.values, out=self.prefix_sums[1:])
+
+        # Elements are also keyed by (segment, rank among the distinct
+        # values), as one sorted integer, so that all segments can be
+        # searched at once.
+        self._distinct_values = np.unique(self.values)
+        self._segment_keys = np.arange(len(self)) * (self._distinct_values.shape[0] + 1)
+        self._keys = self._segment_keys[segment_ids[valid]] + \
+                np.searchsorted(self._distinct_values, self.values)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Builds a sorted ragged array from a ragged array, a sequence of 1D
+        arrays (or lists), or the rows of a 2D array.
+        """
+        if isinstance(arrays, RaggedArray) and not isinstance(arrays, cls):
+            return cls(arrays.values, arrays.offsets)
+        return super(SortedRaggedArray, cls).from_arrays(arrays)
+
+    def segment_sum(self, values=None):
+        if values is None:
+            return self.prefix_sums[self.offsets[1:]] - self.prefix_sums[self.offsets[:-1]]
+        return super(SortedRaggedArray, self).segment_sum(values)
+
+    def count_and_sum_below(self, threshold, inclusive=False):
+        """The number and the sum of the elements of each segment which are
+        less than (or, if `inclusive`, not greater than) a threshold.
+
+        Parameters
+        ----------
+        threshold : float or array_like
+            Threshold, or array of thresholds; each segment is compared with
+            each of them.
+        inclusive : bool, default False
+            Whether to count elements equal to the threshold.
+
+        Returns
+        -------
+        counts, sums : np.ndarray
+            Arrays of shape `(n_segments,) + np.shape(threshold)`.
+        """
+        threshold = np.asarray(threshold, dtype=np.float64)
+        side = 'right' if inclusive else 'left'
+
+        # Elements below the threshold are those ranked below it among the
+        # distinct values.
+        rank = np.searchsorted(self._distinct_values, threshold, side=side)
+        segment_shape = (len(self),) + (1,) * threshold.ndim
+        stops = np.searchsorted(self._keys,
+                self._segment_keys.reshape(segment_shape) + rank)
+        starts = self.offsets[:-1].reshape(segment_shape)
+
+        counts = stops - starts
+        sums = self.prefix_sums[stops] - self.prefix_sums[starts]
+        return counts, sums
@@ -0,0 +1,222 @@
+import errno
+import ftplib
+import os
+import threading
+
+try:
+    import queue
+except ImportError: # python 2
+    import Queue as queue
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+NOAA_DATA_URL = "ftp://ftp.ncdc.noaa.gov"
+TMY3_DATA_URL = "http://rredc.nrel.gov/solar/old_data/nsrdb/1991-2005/data/tmy3"
+
+
+class DataFileNotFoundError(IOError):
+    """Raised by transports when the requested file does not exist. Other
+    IOErrors raised by transports (e.g. dropped connections) are transient,
+    so the request may succeed if retried.
+    """
+    pass
+
+
+class TransportBase(object):
+    """Retrieves weather data files by path (e.g.
+    "/pub/data/gsod/2012/722880-23152-2012.op.gz") from some location.
+    """
+
+    chunk_size = 1 << 16
+
+    def url(self, path):
+        """The location of the file at `path`, for messages.
+        """
+        message = "Inheriting classes must override this method."
+        raise NotImplementedError(message)
+
+    def retrieve(self, path, callback):
+        """Retrieves the file at `path`, calling `callback` with each chunk
+        of bytes as it arrives.
+
+        Raises
+        ------
+        DataFileNotFoundError
+            If the file does not exist.
+        IOError
+            If the file could not be retrieved for some other reason.
+        """
+        message = "Inheriting classes must override this method."
+        raise NotImplementedError(message)
+
+
+class FTPTransport(TransportBase):
+    """Retrieves files from an FTP server using anonymous login. Connections
+    are opened on first use and kept in a pool shared between threads, which
+    holds at most `max_connections`; further requests wait for one to be
+    returned.
+
+    Parameters
+    ----------
+    host : str
+        Hostname of the server.
+    n_tries : int, default=3
+        Number of attempts to make at opening a connection.
+    max_connections : int, default=4
+        Maximum number of connections open at once.
+    """
+
+    def __init__(self, host, n_tries=3, max_connections=4):
+        self.host = host
+        self.n_tries = n_tries
+        self.max_connections = max_connections
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def _get_ftp_connection(self):
+        for _ in range(self.n_tries):
+            try:
+                ftp = ftplib.FTP(self.host)
+                ftp.login()
+                return ftp
+            except EOFError:
+                pass
+        raise EOFError
+
+    def _get_idle_connection(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._get_ftp_connection()
+
+    @staticmethod
+    def _close(ftp):
+        try:
+            ftp.close()
+        except Exception:
+            pass
+
+    def url(self, path):
+        return "ftp://{}{}".format(self.host, path)
+
+    def retrieve(self, path, callback):
+        self._slots.acquire()
+        try:
+            try:
+                ftp = self._get_idle_connection()
+            except (ftplib.Error, EOFError, IOError) as e:
+                raise IOError("Could not retrieve {}: {!r}".format(self.url(path), e))
+            try:
+                ftp.retrbinary('RETR {}'.format(path), callback)
+            except BaseException as e:
+                # The connection may be mid-transfer; never reuse it.
+                self._close(ftp)
+                if isinstance(e, ftplib.error_perm):
+                    raise DataFileNotFoundError(str(e))
+                if isinstance(e, (ftplib.Error, EOFError, IOError)):
+                    raise IOError("Could not retrieve {}: {!r}".format(self.url(path), e))
+                raise
+            self._idle.put(ftp)
+        finally:
+            self._slots.release()
+
+
+class HTTPTransport(TransportBase):
+    """Retrieves files over HTTP(S) from paths relative to a base URL, using
+    a pool of at most `max_connections` kept-alive connections.
+
+    Parameters
+    ----------
+    base_url : str
+        URL which paths are appended to, e.g. "https://www1.ncdc.noaa.gov".
+    max_connections : int, default=4
+        Maximum number of connections open at once.
+    """
+
+    def __init__(self, base_url, max_connections=4):
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1,
+                pool_maxsize=max_connections, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url(self, path):
+        return "{}/{}".format(self.base_url, path.lstrip("/"))
+
+    def retrieve(self, path, callback):
+        url = self.url(path)
+        r = self.session.get(url, stream=True)
+        try:
+            if r.status_code in [403, 404, 410]:
+                raise DataFileNotFoundError("HTTP {} for {}".format(r.status_code, url))
+            elif r.status_code != 200:
+                raise IOError("HTTP {} for {}".format(r.status_code, url))
+            for chunk in r.iter_content(self.chunk_size):
+                callback(chunk)
+        finally:
+            r.close()
+
+
+class LocalTransport(TransportBase):
+    """Reads files from a local directory laid out like the remote server,
+    e.g. a mirror of `pub/data/gsod` and `pub/data/noaa`.
+
+    Parameters
+    ----------
+    directory : str
+        Root directory which paths are relative to.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def url(self, path):
+        return os.path.join(self.directory, *path.lstrip("/").split("/"))
+
+    def retrieve(self, path, callback):
+        try:
+            f = open(self.url(path), 'rb')
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                raise DataFileNotFoundError(str(e))
+            raise
+        with f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                callback(chunk)
+
+
+def get_transport(url, n_tries=3, max_connections=4):
+    """Creates a transport for a URL.
+
+    Parameters
+    ----------
+    url : str
+        One of "ftp://host", "http://host/path", "https://host/path",
+        "file:///path" or a local directory path.
+    n_tries : int, default=3
+        Number of attempts at connecting (FTP only).
+    max_connections : int, default=4
+        Maximum number of connections open at once (FTP and HTTP only).
+
+    Returns
+    -------
+    out : TransportBase
+    """
+    scheme, separator, location = url.partition("://")
+    if not separator: # a local directory
+        return LocalTransport(url)
+    elif scheme == "ftp":
+        return FTPTransport(location.split("/")[0], n_tries=n_tries,
+                max_connections=max_connections)
+    elif scheme in ["http", "https"]:
+        return HTTPTransport(url, max_connections=max_connections)
+    elif scheme == "file":
+        return LocalTransport(location)
+    else:
+        message = "Transport not supported for url {}. Use an ftp, http, " \
+                "https or file url, or a local directory.".format(url)
+        raise ValueError(message)
@@ -1,37 +1,198 @@
 from eemeter.evaluation import Period
 from eemeter.location import _load_station_to_lat_lng_index, haversine
-
-from datetime import datetime, date, timedelta
-import ftplib
+from eemeter.ragged import RaggedArray
+from eemeter.transport import DataFileNotFoundError
+from eemeter.transport import NOAA_DATA_URL
+from eemeter.transport import TMY3_DATA_URL
+from eemeter.transport import get_transport
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta, tzinfo
 import gzip
 from io import BytesIO
 import json
+from multiprocessing.pool import ThreadPool
 import os
 from pkg_resources import resource_stream
+import re
+import shutil
+import stat
+import tempfile
+import threading
+import time
 import warnings
+import zlib
+
+try:
+    import fcntl
+except ImportError: # windows
+    fcntl = None
 
 import numpy as np
 import pandas as pd
 from pandas.core.common import is_list_like
-import requests
+import pytz
+
+
+def _line_starts(data):
+    """A byte buffer as a uint8 array, with the offset and length of each
+    line in it.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord('\n'))
+    if buf.shape[0] > 0 and buf[-1] != ord('\n'):
+        ends = np.append(ends, buf.shape[0])
+    starts = np.zeros(ends.shape, dtype=np.intp)
+    starts[1:] = ends[:-1] + 1
+    return buf, starts, ends - starts
+
+
+def _field_chars(buf, starts, offset, width):
+    return buf[starts[:, np.newaxis] + offset + np.arange(width)]
+
+
+def _field_int(buf, starts, offset, width):
+    """The values of a fixed-width field of ASCII digits in each line.
+    """
+    digits = _field_chars(buf, starts, offset, width).astype(np.int64) - ord('0')
+    return digits.dot(10 ** np.arange(width - 1, -1, -1))
+
+
+def _field_float(buf, starts, offset, width):
+    """The values of a fixed-width field of ASCII decimals in each line.
+    """
+    chars = np.ascontiguousarray(_field_chars(buf, starts, offset, width))
+    return chars.view('S{}'.format(width)).ravel().astype(np.float64)
+
+
+def _field_dates(buf, starts, offset):
+    """The values of a fixed-width YYYYMMDD field in each line, as
+    datetime64[D].
+    """
+    year = _field_int(buf, starts, offset, 4)
+    month = _field_int(buf, starts, offset + 4, 2)
+    day = _field_int(buf, starts, offset + 6, 2)
+    months = ((year - 1970) * 12 + month - 1).astype('datetime64[M]')
+    return months.astype('datetime64[D]') + (day - 1)
+
+
+def _parse_gsod(data):
+    """Parses a decompressed GSOD year file into an array of dates
+    (datetime64[D]) and an array of mean daily temperatures (degC).
+    """
+    header_end = data.find(b'\n')
+    return _parse_gsod_records(data[header_end + 1:] if header_end >= 0 else b'')
+
+
+def _parse_gsod_records(data):
+    # GSOD lines, without the header.
+    buf, starts, lengths = _line_starts(data)
+    starts = starts[lengths >= 30]
+    dates = _field_dates(buf, starts, 14)
+    temp_F = _field_float(buf, starts, 24, 6)
+    return dates, (5./9.) * (temp_F - 32.)
+
+
+def _parse_isd(data):
+    """Parses a decompressed ISD year file into an array of observation
+    times (datetime64[m]) and an array of temperatures (degC), which are nan
+    where the observation is missing.
+    """
+    buf, starts, lengths = _line_starts(data)
+    starts = starts[lengths >= 92]
+    minutes = _field_int(buf, starts, 23, 2) * 60 + _field_int(buf, starts, 25, 2)
+    datetimes = _field_dates(buf, starts, 15).astype('datetime64[m]') + minutes
+    sign = np.where(buf[starts + 87] == ord('-'), -1., 1.)
+    temp = _field_int(buf, starts, 88, 4)
+    temp_C = sign * temp / 10.
+    temp_C[(sign > 0) & (temp == 9999)] = np.nan
+    return datetimes, temp_C
+
+
+class _GzipRecordStream(object):
+    """Decompresses a gzipped file of line records as chunks of it arrive,
+    parsing each block of complete lines as soon as it is decompressed, so
+    that neither the compressed nor the decompressed file is ever held in
+    memory as a whole.
+
+    Parameters
+    ----------
+    parse : callable
+        Parses a byte string of complete lines into a tuple of arrays.
+    skip_lines : int, default=0
+        Number of header lines to skip.
+    """
+
+    def __init__(self, parse, skip_lines=0):
+        self.parse = parse
+        self.skip_lines = skip_lines
+        self.blocks = []
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._remainder = b''
+
+    def write(self, chunk):
+        while chunk:
+            self._feed(self._decompressor.decompress(chunk))
+            # a new gzip member may follow the end of the last one
+            chunk = self._decompressor.unused_data.lstrip(b'\x00')
+            if chunk:
+                self._feed(self._decompressor.flush())
+                self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def _feed(self, data):
+        data = self._remainder + data
+        end = data.rfind(b'\n') + 1
+        self._remainder = data[end:]
+        if end > 0:
+            self._parse_lines(data[:end])
+
+    def _parse_lines(self, lines):
+        while self.skip_lines > 0 and lines:
+            lines = lines[lines.find(b'\n') + 1:] if b'\n' in lines else b''
+            self.skip_lines -= 1
+        if lines:
+            self.blocks.append(self.parse(lines))
+
+    def close(self):
+        """Parses any remaining data, and returns the concatenated arrays
+        parsed from every block.
+        """
+        self._feed(self._decompressor.flush())
+        if self._remainder:
+            self._parse_lines(self._remainder)
+            self._remainder = b''
+        blocks = self.blocks or [self.parse(b'')]
+        return tuple(np.concatenate(arrays) for arrays in zip(*blocks))
 
 
 class NOAAClient(object):
-
-    def __init__(self, n_tries=3):
+    """Fetches GSOD and ISD data from NOAA.
+
+    Parameters
+    ----------
+    n_tries : int, default=3
+        Number of attempts at connecting to the server and at retrieving
+        each file.
+    transport : eemeter.transport.TransportBase, optional
+        Where to retrieve files from. Defaults to the transport for the url
+        in `EEMETER_NOAA_DATA_URL` (e.g. "https://www1.ncdc.noaa.gov", or a
+        local directory containing a mirror of `pub/data/gsod` and
+        `pub/data/noaa`), or to the NOAA FTP server if that is not set.
+    backoff : float, default=1.0
+        Seconds to wait before retrying a failed retrieval; doubles after
+        each further failure.
+    """
+
+    def __init__(self, n_tries=3, transport=None, backoff=1.0):
         self.n_tries = n_tries
-        self.ftp = None # lazily load
+        self.transport = transport # lazily load
+        self.backoff = backoff
         self.station_index = None # lazily load
 
-    def _get_ftp_connection(self):
-        for _ in range(self.n_tries):
-            try:
-                ftp = ftplib.FTP("ftp.ncdc.noaa.gov")
-                ftp.login()
-                return ftp
-            except EOFError:
-                pass
-        raise EOFError
+    def _get_transport(self):
+        url = os.environ.get("EEMETER_NOAA_DATA_URL", NOAA_DATA_URL)
+        return get_transport(url, n_tries=self.n_tries)
 
     def _load_station_index(self):
         with resource_stream('eemeter.resources', 'GSOD-ISD_station_index.json') as f:
@@ -47,74 +208,221 @@ class NOAAClient(object):
             potential_station_ids = [station]
         return potential_station_ids
 
-    def _retreive_file_lines(self, filename_format, station, year):
-        string = BytesIO()
-
-        if self.ftp is None:
-            self.ftp = self._get_ftp_connection()
+    def _retrieve(self, filename_format, station, year, new_sink):
+        """Retrieves a file for the first potential station id which has
+        one, writing its chunks to a sink created by `new_sink` (a fresh one
+        for each attempt). Returns the sink, or None if no file was found.
+        """
+        if self.transport is None:
+            self.transport = self._get_transport()
 
         for station_id in self._get_potential_station_ids(station):
             filename = filename_format.format(station=station_id, year=year)
-            try:
-                self.ftp.retrbinary('RETR {}'.format(filename), string.write)
-                break
-            except (IOError, ftplib.error_perm):
-                pass
-            except (ftplib.error_temp, EOFError): # Bad connection. attempt to reconnect.
-                self.ftp.close()
-                self.ftp = self._get_ftp_connection()
-                try:
-                    self.ftp.retrbinary('RETR {}'.format(filename), string.write)
-                    break
-                except (IOError, ftplib.error_perm):
-                    pass
+            sink = self._retrieve_with_retries(filename, new_sink)
+            if sink is not None:
+                return sink
+        return None
 
+    def _retrieve_with_retries(self, filename, new_sink):
+        # Returns None if the file does not exist.
+        for attempt in range(self.n_tries):
+            sink = new_sink()
+            try:
+                self.transport.retrieve(filename, sink.write)
+                return sink
+            except DataFileNotFoundError:
+                return None
+            except IOError:
+                if attempt + 1 == self.n_tries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _retreive_file_bytes(self, filename_format, station, year):
+        string = self._retrieve(filename_format, station, year, BytesIO)
+        if string is None:
+            return b''
         string.seek(0)
         f = gzip.GzipFile(fileobj=string)
-        lines = f.readlines()
+        data = f.read()
         string.close()
-        return lines
+        return data
 
-    def get_gsod_data(self, station, year):
+    def _retreive_file_lines(self, filename_format, station, year):
+        data = self._retreive_file_bytes(filename_format, station, year)
+        return BytesIO(data).readlines()
+
+    def _retrieve_records(self, filename_format, station, year, parse,
+            skip_lines=0):
+        # Parses the file while it is being retrieved.
+        new_sink = lambda: _GzipRecordStream(parse, skip_lines)
+        stream = self._retrieve(filename_format, station, year, new_sink)
+        if stream is None:
+            return parse(b'')
+        return stream.close()
+
+    def get_gsod_arrays(self, station, year):
+        """Fetches a year of GSOD data for a station.
 
+        Returns
+        -------
+        dates : numpy.ndarray
+            Dates of the observations, as datetime64[D].
+        temps : numpy.ndarray
+            Mean daily temperatures (degC) on each date.
+        """
         filename_format = '/pub/data/gsod/{year}/{station}-{year}.op.gz'
-        lines = self._retreive_file_lines(filename_format, station, year)
+        return self._retrieve_records(filename_format, station, year,
+                _parse_gsod_records, skip_lines=1)
 
-        days = []
-        for line in lines[1:]:
-            columns=line.split()
-            date_str = columns[2].decode('utf-8')
-            temp_F = float(columns[3])
-            temp_C = (5./9.) * (temp_F - 32.)
-            dt = datetime.strptime(date_str,"%Y%m%d").date()
-            days.append({"temp_C": temp_C, "date": dt})
+    def get_isd_arrays(self, station, year):
+        """Fetches a year of ISD data for a station.
 
-        return days
+        Returns
+        -------
+        datetimes : numpy.ndarray
+            Times of the observations, as datetime64[m].
+        temps : numpy.ndarray
+            Temperatures (degC) at each time, nan where missing.
+        """
+        filename_format = '/pub/data/noaa/{year}/{station}-{year}.gz'
+        return self._retrieve_records(filename_format, station, year, _parse_isd)
+
+    def get_gsod_data(self, station, year):
+        dates, temps = self.get_gsod_arrays(station, year)
+        return [{"temp_C": t, "date": d}
+                for d, t in zip(dates.astype(object), temps.tolist())]
 
     def get_isd_data(self, station, year):
+        datetimes, temps = self.get_isd_arrays(station, year)
+        return [{"temp_C": t, "datetime": dt}
+                for dt, t in zip(datetimes.astype(object), temps.tolist())]
+
+
+class TMY3Archive(object):
+    """A packed archive of the hourly temperatures (degC) of many TMY3
+    stations, for use without network access. It is stored as a `.npy`
+    matrix with one row of 8760 temperatures (starting at midnight on
+    January 1) per station, and a JSON index from station to row with the
+    same name but a `.json` extension. The matrix is memory-mapped, so
+    reading a station parses nothing and touches only that station's row.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the `.npy` matrix.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(self._index_filename(filename), 'r') as f:
+            self.index = json.load(f)
+        self.temperatures = np.load(filename, mmap_mode='r')
 
-        filename_format = '/pub/data/noaa/{year}/{station}-{year}.gz'
-        lines = self._retreive_file_lines(filename_format, station, year)
+    @staticmethod
+    def _index_filename(filename):
+        return "{}.json".format(os.path.splitext(filename)[0])
 
-        hours = []
-        for line in lines:
-            if line[87:92].decode('utf-8') == "+9999":
-                temp_C = float("nan")
-            else:
-                temp_C = float(line[87:92]) / 10.
-            date_str = line[15:27].decode('utf-8')
-            dt = datetime.strptime(date_str, "%Y%m%d%H%M")
-            hours.append({"temp_C": temp_C, "datetime": dt})
+    def __contains__(self, station):
+        return station in self.index
 
-        return hours
+    def __len__(self):
+        return len(self.index)
 
+    def get(self, station):
+        """The hourly temperatures of a station as a float64 array, or None
+        if the station is not in the archive.
+        """
+        row = self.index.get(station)
+        if row is None:
+            return None
+        return np.asarray(self.temperatures[row], dtype=np.float64)
 
-class TMY3Client(object):
+    @classmethod
+    def build(cls, filename, stations=None, client=None, dtype=np.float32):
+        """Fetches the hourly temperatures of TMY3 stations and packs them
+        into an archive.
 
-    def __init__(self):
+        Parameters
+        ----------
+        filename : str
+            Path of the `.npy` matrix to write.
+        stations : list of str, optional
+            Stations to include; defaults to every TMY3 station. Stations
+            for which no data can be found are left out.
+        client : TMY3Client, optional
+            Client to fetch data with (e.g. one with a local transport).
+        dtype : {numpy.float32, numpy.float16}
+            Type in which to store temperatures; float16 halves the size of
+            the archive but keeps only about three significant digits.
+
+        Returns
+        -------
+        out : TMY3Archive
+        """
+        if client is None:
+            client = TMY3Client(archive=False)
+        if stations is None:
+            stations = sorted(client.get_stations())
+
+        index, rows = {}, []
+        for station in stations:
+            temps = client.get_tmy3_array(station, station_fallback=False)
+            if temps is not None:
+                index[station] = len(rows)
+                rows.append(temps)
+
+        temperatures = np.array(rows, dtype=dtype).reshape((len(rows), 365 * 24))
+        _atomic_save_npy(filename, temperatures)
+        with open(cls._index_filename(filename), 'w') as f:
+            json.dump(index, f)
+        return cls(filename)
+
+
+class TMY3Client(object):
+    """Fetches TMY3 data from NREL.
+
+    Parameters
+    ----------
+    transport : eemeter.transport.TransportBase, optional
+        Where to retrieve `<station>TYA.CSV` files from. Defaults to the
+        transport for the url in `EEMETER_TMY3_DATA_URL` (e.g. a local
+        directory of those files), or to the NREL website if that is not
+        set.
+    archive : {TMY3Archive, False}, optional
+        Archive to read stations from before falling back to the transport.
+        Defaults to the archive at `EEMETER_TMY3_ARCHIVE`, if that is set;
+        False disables the archive.
+    n_tries : int, default=3
+        Number of attempts at retrieving each file.
+    backoff : float, default=1.0
+        Seconds to wait before retrying a failed retrieval; doubles after
+        each further failure.
+    """
+
+    def __init__(self, transport=None, archive=None, n_tries=3, backoff=1.0):
+        self.transport = transport # lazily load
+        self.archive = archive # lazily load
+        self.n_tries = n_tries
+        self.backoff = backoff
         self.stations = None # lazily load
         self.station_to_lat_lng = None # lazily load
 
+    def _get_transport(self):
+        return get_transport(os.environ.get("EEMETER_TMY3_DATA_URL", TMY3_DATA_URL))
+
+    def _get_archive(self):
+        if self.archive is None:
+            filename = os.environ.get("EEMETER_TMY3_ARCHIVE")
+            self.archive = TMY3Archive(filename) if filename else False
+        return self.archive or None
+
+    def get_stations(self):
+        """The TMY3 stations, as a dict keyed by station.
+        """
+        if self.stations is None:
+            self.stations = self._load_stations()
+        return self.stations
+
     def _load_stations(self):
         with resource_stream('eemeter.resources', 'tmy3_stations.json') as f:
             return json.loads(f.read().decode("utf-8"))
@@ -147,8 +455,7 @@ class TMY3Client(object):
                 return nearby_station
         return None
 
-    def get_tmy3_data(self, station, station_fallback=True):
-
+    def _resolve_station(self, station, station_fallback):
         if self.stations is None:
             self.stations = self._load_stations()
 
@@ -161,37 +468,388 @@ class TMY3Client(object):
                 station = self._find_nearby_station(station)
             else:
                 station = None
+        return station
+
+    def get_tmy3_array(self, station, station_fallback=True):
+        """The hourly temperatures (degC) of a station's typical
+        meteorological year, as an array of 8760 values starting at midnight
+        on January 1, read from the archive if it has the station. Returns
+        None if no data is available; raises IOError if the data could not
+        be retrieved.
+        """
+        station = self._resolve_station(station, station_fallback)
+        if station is None:
+            return None
+
+        archive = self._get_archive()
+        if archive is not None and station in archive:
+            return archive.get(station)
 
+        data = self._get_tmy3_data(station)
+        if data is None:
+            return None
+        # Hours are placed by day of year and hour, ignoring the year they
+        # were taken from; repeated hours are averaged.
+        origin = datetime(1900, 1, 1)
+        positions = np.array([(datetime(1900, d["dt"].month, d["dt"].day,
+                d["dt"].hour) - origin).total_seconds() // 3600 for d in data],
+                dtype=np.intp)
+        temps = np.array([d["temp_C"] for d in data], dtype=np.float64)
+        valid = ~np.isnan(temps) & (positions >= 0) & (positions < 365 * 24)
+        sums = np.bincount(positions[valid], temps[valid], minlength=365 * 24)
+        counts = np.bincount(positions[valid], minlength=365 * 24)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return sums / counts
+
+    def get_tmy3_data(self, station, station_fallback=True):
+        """The hourly temperatures of a station's typical meteorological
+        year, as a list of dicts with "temp_C" and "dt", fetched with the
+        transport. Returns None if no data is available.
+        """
+        station = self._resolve_station(station, station_fallback)
         if station is None:
             return None
+        return self._get_tmy3_data(station)
 
-        url = "http://rredc.nrel.gov/solar/old_data/nsrdb/1991-2005/data/tmy3/{}TYA.CSV".format(station)
-        r = requests.get(url)
-
-        if r.status_code == 200:
-            hours = []
-            for line in r.text.splitlines()[2:]:
-                row = line.split(",")
-                year = row[0][6:10]
-                month = row[0][0:2]
-                day = row[0][3:5]
-                hour = int(row[1][0:2]) - 1
-                date_string = "{}{}{}{:02d}".format(year, month, day, hour) # YYYYMMDDHH
-                dt = datetime.strptime(date_string,"%Y%m%d%H")
-                temp_C = float(row[31])
-                hours.append({"temp_C": temp_C, "dt": dt})
-            return hours
-        else:
-            warnings.warn("Station {} was not found. Tried url {}.".format(station, url))
+    def _get_tmy3_data(self, station):
+        if self.transport is None:
+            self.transport = self._get_transport()
+
+        path = "/{}TYA.CSV".format(station)
+        for attempt in range(self.n_tries):
+            string = BytesIO()
+            try:
+                self.transport.retrieve(path, string.write)
+                break
+            except DataFileNotFoundError:
+                url = self.transport.url(path)
+                warnings.warn("Station {} was not found. Tried url {}.".format(station, url))
+                return None
+            except IOError:
+                if attempt + 1 == self.n_tries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+        text = string.getvalue().decode("utf-8")
+        hours = []
+        for line in text.splitlines()[2:]:
+            row = line.split(",")
+            year = row[0][6:10]
+            month = row[0][0:2]
+            day = row[0][3:5]
+            hour = int(row[1][0:2]) - 1
+            date_string = "{}{}{}{:02d}".format(year, month, day, hour) # YYYYMMDDHH
+            dt = datetime.strptime(date_string,"%Y%m%d%H")
+            temp_C = float(row[31])
+            hours.append({"temp_C": temp_C, "dt": dt})
+        return hours
+
+
+CACHE_FORMATS = ["json", "npz"]
+
+_JSON_GENERATION = re.compile(r'\{"generation": (\d+),')
+
+_replace = getattr(os, "replace", os.rename)
+
+
+def _current_umask():
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+# Mode given to new files, as open() would.
+_NEW_FILE_MODE = 0o666 & ~_current_umask()
+
+_FREQ_SECONDS = {"D": 86400, "H": 3600}
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _localize(dt, tz):
+    """A naive datetime as a local time in `tz` (a name or a tzinfo). Times
+    which occur twice when clocks go back are taken to be in standard time,
+    and so are times skipped when clocks go forward, which therefore land
+    that much later (e.g. 02:30 becomes 03:30 daylight time).
+    """
+    if not isinstance(tz, tzinfo):
+        tz = pytz.timezone(tz)
+    if hasattr(tz, "localize"): # pytz
+        return tz.localize(dt, is_dst=False)
+    return dt.replace(tzinfo=tz)
+
+
+def _epoch_seconds(dt, tz=None):
+    """Whole seconds since the UTC epoch at a datetime or date. Naive
+    datetimes and dates are taken to be local times in `tz` (see
+    `_localize` for times around daylight saving transitions), or in UTC if
+    `tz` is None.
+    """
+    if not isinstance(dt, datetime):
+        dt = datetime(dt.year, dt.month, dt.day)
+    if dt.tzinfo is None and tz is not None:
+        dt = _localize(dt, tz)
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None) - dt.utcoffset()
+    delta = dt - _EPOCH
+    return delta.days * 86400 + delta.seconds
+
+
+def _epoch_day(dt, tz=None):
+    """Days since the epoch to the date of a datetime or date. Aware
+    datetimes are first converted to `tz`, or to UTC if `tz` is None.
+    """
+    if isinstance(dt, datetime):
+        if dt.tzinfo is not None:
+            if tz is None:
+                dt = dt.replace(tzinfo=None) - dt.utcoffset()
+            else:
+                dt = pd.Timestamp(dt).tz_convert(tz)
+        dt = dt.date()
+    return dt.toordinal() - _EPOCH.toordinal()
+
+
+def _stack_period_arrays(arrays):
+    # Mirrors np.array(arrays): rectangular input gives a 2D array, ragged
+    # input gives an object array of 1D arrays.
+    if len(set(a.shape[0] for a in arrays)) <= 1:
+        return np.array(arrays)
+    stacked = np.empty((len(arrays),), dtype=object)
+    for i, a in enumerate(arrays):
+        stacked[i] = a
+    return stacked
+
+
+def _atomic_write(path, write, mode='wb'):
+    # Call write(f) on a temporary file in the same directory, then rename it
+    # over the destination so readers never see a partially written file.
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        try:
+            os.makedirs(directory)
+        except OSError: # created concurrently
+            pass
+    fd, temp_path = tempfile.mkstemp(dir=directory or None, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        # mkstemp makes files readable only by their owner; keep the mode of
+        # the file being replaced, so that shared directories stay shared.
+        try:
+            file_mode = stat.S_IMODE(os.stat(path).st_mode)
+        except OSError:
+            file_mode = _NEW_FILE_MODE
+        os.chmod(temp_path, file_mode)
+        _replace(temp_path, path)
+    except:
+        os.remove(temp_path)
+        raise
+
+
+def _atomic_save_npy(path, values):
+    _atomic_write(path, lambda f: np.save(f, values))
+
+
+@contextmanager
+def _file_lock(path):
+    """Holds an exclusive lock on the file at `path` (created if it does not
+    exist), so that other processes wait. Not available on windows, where
+    nothing is locked.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as lock_file: # closing releases the lock
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        yield
+
+
+class SharedWeatherStore(object):
+    """A store of yearly weather data on disk which many processes can use
+    at once without each keeping its own copy in memory.
+
+    The years of data for a station and source type (e.g. "GSOD", "ISD") are
+    kept in one file of float64 temperatures (degC), `<station>.values`, in
+    which each year has a fixed place: its temperatures from midnight on
+    January 1, at the frequency of the source, start as many steps after
+    January 1, 1900 as there are between the two dates. Consecutive years
+    are therefore next to each other, and a run of them is a single
+    contiguous view, while adding or replacing a year writes only that
+    year. Years not in the store are holes in the (sparse) file; which
+    years are there is recorded in a small index, `<station>.years.npy`,
+    which is replaced atomically once their values have been written.
+
+    Files are memory-mapped read-only rather than read, so processes which
+    use the same station share its pages through the page cache. Complete
+    years are only replaced when they are fetched again, and other
+    processes may see the new values as soon as they are written.
+
+    Parameters
+    ----------
+    directory : str
+        Root directory of the store; created if it does not exist.
+    """
+
+    base_year = 1900
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._attached = {}
+        self._lock = threading.RLock()
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _path(self, source_type, station, suffix):
+        return os.path.join(self.directory, source_type,
+                "{}.{}".format(station, suffix))
+
+    def _span(self, year, steps_per_day):
+        # The (start, end) of a year's values in a station's values file.
+        year = int(year)
+        if year < self.base_year:
+            message = "Years before {} can not be stored.".format(self.base_year)
+            raise ValueError(message)
+        start = (date(year, 1, 1) - date(self.base_year, 1, 1)).days
+        end = (date(year + 1, 1, 1) - date(self.base_year, 1, 1)).days
+        return start * steps_per_day, end * steps_per_day
+
+    def _load_index(self, source_type, station):
+        # The number of steps per day and the stored years of a station.
+        try:
+            index = np.load(self._path(source_type, station, "years.npy"))
+        except IOError:
             return None
+        return int(index[0]), set(index[1:].tolist())
+
+    def _attach(self, source_type, station, reload=False):
+        """The memory-mapped values of a station, the number of steps per
+        day and the set of stored years, or None if the store has no data
+        for the station.
+        """
+        key = (source_type, station)
+        with self._lock:
+            if reload or key not in self._attached:
+                # The index is read first: values are written before the
+                # index which lists them.
+                index = self._load_index(source_type, station)
+                if index is None:
+                    return None
+                values = np.memmap(self._path(source_type, station, "values"),
+                        dtype="<f8", mode='r')
+                self._attached[key] = (values,) + index
+            return self._attached[key]
+
+    def has_year(self, source_type, station, year):
+        return self.get_year(source_type, station, year) is not None
+
+    def get_year(self, source_type, station, year):
+        """A read-only memory-mapped array of the temperatures for a year, or
+        None if the store does not contain that year.
+        """
+        return self.get_years(source_type, station, year, year)
+
+    def get_years(self, source_type, station, first_year, last_year):
+        """A read-only memory-mapped array of the temperatures for a range
+        of years (inclusive), with the years one after the other, or None if
+        the store does not contain every one of them.
+        """
+        years = range(int(first_year), int(last_year) + 1)
+        for reload in [False, True]: # another process may have added years
+            attached = self._attach(source_type, station, reload)
+            if attached is None:
+                return None
+            values, steps_per_day, stored_years = attached
+            if all(year in stored_years for year in years):
+                start, _ = self._span(years[0], steps_per_day)
+                _, end = self._span(years[-1], steps_per_day)
+                return values[start:end]
+        return None
+
+    def put_year(self, source_type, station, year, values):
+        """Adds (or replaces) the temperatures for a year.
+        """
+        self.put_years(source_type, station, {year: values})
+
+    def put_years(self, source_type, station, values_by_year):
+        """Adds (or replaces) the temperatures for several years, given as a
+        dict of arrays keyed by year. Only these years are written.
+        """
+        if not values_by_year:
+            return
+        values_path = self._path(source_type, station, "values")
+        directory = os.path.dirname(values_path)
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError: # created concurrently
+                pass
+        # Held while years are written and the index replaced, so that years
+        # added by other processes at the same time are not lost.
+        with _file_lock(self._path(source_type, station, "lock")), self._lock:
+            index = self._load_index(source_type, station)
+            steps_per_day, stored_years = None, set()
+            if index is not None:
+                steps_per_day, stored_years = index
+            if not os.path.exists(values_path):
+                open(values_path, 'ab').close()
+            with open(values_path, 'r+b') as f:
+                for year in sorted(values_by_year):
+                    year_values = np.asarray(values_by_year[year], dtype="<f8")
+                    n_days = (date(int(year) + 1, 1, 1) - date(int(year), 1, 1)).days
+                    if steps_per_day is None:
+                        steps_per_day = year_values.shape[0] // n_days
+                    if year_values.shape[0] != n_days * steps_per_day:
+                        message = "Expected {} values for {}, got {}.".format(
+                                n_days * steps_per_day, year, year_values.shape[0])
+                        raise ValueError(message)
+                    f.seek(self._span(year, steps_per_day)[0] * 8)
+                    f.write(year_values.tobytes())
+                    stored_years.add(int(year))
+            index = np.array([steps_per_day] + sorted(stored_years), dtype=np.int64)
+            _atomic_save_npy(self._path(source_type, station, "years.npy"), index)
+            self._attached.pop((source_type, station), None)
 
 
 class WeatherSourceBase(object):
 
+    freq = None
+
     def __init__(self, station):
         self.station = station
+        self._tz = None
         self.tempC = pd.Series(dtype=float)
 
+    @property
+    def tz(self):
+        """Time zone (e.g. "US/Pacific") of the days over which daily
+        temperatures and degree days are aggregated, and of naive datetimes
+        in periods. If None (the default), days are UTC days, and naive
+        datetimes are in UTC, like the timestamps of `tempC`. Aware datetimes
+        are converted either way.
+
+        Observations more frequent than daily are aggregated into local
+        days; daily observations are taken to already be local days.
+        """
+        return self._tz
+
+    @tz.setter
+    def tz(self, value):
+        self._tz = value
+        self._derived = {}
+
+    @property
+    def tempC(self):
+        """Observed temperatures (degC) as a pandas Series. Derived arrays
+        (e.g. daily averages) are cached until this series is replaced, so
+        it should be reassigned rather than modified in place.
+        """
+        return self._tempC
+
+    @tempC.setter
+    def tempC(self, value):
+        self._tempC = value
+        self._derived = {}
+
     @staticmethod
     def _unit_convert(x, unit):
         if unit is None or unit == "degC":
@@ -258,8 +916,7 @@ class WeatherSourceBase(object):
         """
 
         if is_list_like(periods):
-            values = np.array([self._period_daily_temperatures(p, None) for p in periods])
-            return self._unit_convert(values, unit)
+            return _stack_period_arrays(self.ragged_daily_temperatures(periods, unit).to_list())
         else:
             return self._period_daily_temperatures(periods, unit)
 
@@ -284,31 +941,195 @@ class WeatherSourceBase(object):
         """
 
         if is_list_like(periods):
-            values = np.array([self._period_hourly_temperatures(p, None) for p in periods])
-            return self._unit_convert(values, unit)
+            return _stack_period_arrays(self.ragged_hourly_temperatures(periods, unit).to_list())
         else:
             return self._period_hourly_temperatures(periods, unit)
 
+    def _fetch_periods(self, periods):
+        for period in periods:
+            self._fetch_period(period)
+
+    def _temperature_array(self, freq):
+        """The start of the first step covered by `tempC` (as whole seconds
+        since the UTC epoch) and a contiguous float64 array of temperatures
+        (degC) from that step at the given frequency: daily averages for
+        "D", observations aligned to the hour for "H".
+
+        Daily steps are dates, so their starts are counted as if the day
+        began at midnight UTC; with `tz` set, they are local dates.
+        """
+        key = ("temperatures", freq)
+        if key not in self._derived:
+            if self.tempC.shape[0] == 0:
+                array = (None, np.empty((0,), dtype=np.float64))
+            elif freq == "D" and self._local_days():
+                start, means, _ = self._local_daily_aggregates()
+                array = (start, means)
+            elif freq == "D":
+                daily = self.tempC.resample('D').mean()
+                array = (_epoch_day(daily.index[0]) * 86400,
+                        daily.values.astype(np.float64))
+            else:
+                hourly = self.tempC.asfreq('H')
+                array = (_epoch_seconds(hourly.index[0]),
+                        hourly.values.astype(np.float64))
+            self._derived[key] = array
+        return self._derived[key]
+
+    def _local_days(self):
+        # Whether observations need aggregating into local days.
+        return self.tz is not None and self.freq != "D"
+
+    def _local_daily_aggregates(self):
+        """The start of the first local day (as for `_temperature_array`),
+        and the mean temperature and number of observations on each local
+        day.
+        """
+        local = self.tempC.tz_localize("UTC").tz_convert(self.tz).tz_localize(None)
+        daily = local.resample('D')
+        means, counts = daily.mean(), daily.count()
+        return _epoch_day(means.index[0]) * 86400, \
+                means.values.astype(np.float64), counts.values
+
+    def epoch_index(self, freq):
+        """Whole seconds since the UTC epoch at the start of each step of the
+        temperatures at the given frequency.
+
+        Parameters
+        ----------
+        freq : {"D", "H"}
+            Frequency of the temperatures: daily (local days if `tz` is set)
+            or hourly.
+
+        Returns
+        -------
+        out : np.ndarray
+            Integer array with one element per step.
+        """
+        start, temps = self._temperature_array(freq)
+        if start is None:
+            return np.empty((0,), dtype=np.int64)
+        step = _FREQ_SECONDS[freq]
+        index = start + step * np.arange(temps.shape[0], dtype=np.int64)
+        if freq == "D" and self.tz is not None:
+            # local midnights shift with daylight saving time
+            dates = pd.to_datetime(index, unit='s')
+            index = np.array([_epoch_seconds(d, self.tz) for d in dates.to_pydatetime()],
+                    dtype=np.int64)
+        return index
+
+    def _datetime_offset(self, dt, freq):
+        """The offset of a datetime into the temperature array of the given
+        frequency, or None if it does not fall on a step boundary.
+        """
+        start, _ = self._temperature_array(freq)
+        if start is None:
+            return None
+        if freq == "D":
+            return _epoch_day(dt, self.tz) - start // 86400
+        delta = _epoch_seconds(dt, self.tz) - start
+        if delta % _FREQ_SECONDS[freq] != 0:
+            return None
+        return delta // _FREQ_SECONDS[freq]
+
+    def _period_offsets(self, periods, freq):
+        """The offset of the start of each period into the temperature array
+        of the given frequency, the number of steps in each period, and
+        whether each period starts on a step boundary (days are counted by
+        date, so daily periods always do).
+        """
+        start, _ = self._temperature_array(freq)
+        step = _FREQ_SECONDS[freq]
+        seconds = [p.timedelta.total_seconds() for p in periods]
+        if freq == "D":
+            lengths = [max(int(s // step), 0) for s in seconds]
+            period_starts = [_epoch_day(p.start, self.tz) * 86400 for p in periods]
+        else:
+            lengths = [max(int(-(-s // step)), 0) for s in seconds]
+            period_starts = [_epoch_seconds(p.start, self.tz) for p in periods]
+        lengths = np.array(lengths, dtype=np.intp)
+
+        if start is None:
+            offsets = np.zeros(lengths.shape, dtype=np.int64)
+            return offsets, lengths, np.ones(lengths.shape, dtype=bool)
+
+        delta = np.array(period_starts, dtype=np.int64) - start
+        return delta // step, lengths, delta % step == 0
+
+    def _normalize_index(self, index, freq):
+        return index
+
+    def _ragged_temperatures(self, periods, unit, freq):
+        """Temperatures of the given frequency during every period, gathered
+        in a single pass over the contiguous temperature array. Steps not
+        covered by the data are nan.
+        """
+        if not is_list_like(periods):
+            periods = [periods]
+        self._fetch_periods(periods)
+        _, temps = self._temperature_array(freq)
+        offsets, lengths, aligned = self._period_offsets(periods, freq)
+
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        index = np.arange(ends[-1] if len(periods) > 0 else 0)
+        index = index + np.repeat(offsets - starts, lengths)
+        index = self._normalize_index(index, freq)
+        in_range = (index >= 0) & (index < temps.shape[0])
+        in_range &= np.repeat(aligned, lengths)
+
+        values = np.empty(index.shape, dtype=np.float64)
+        values.fill(np.nan)
+        values[in_range] = temps[index[in_range]]
+        values = self._unit_convert(values, unit)
+        return RaggedArray(values, np.concatenate([[0], ends]))
+
+    def ragged_daily_temperatures(self, periods, unit):
+        """The daily average temperatures for each period, as a single flat
+        buffer with offsets marking where each period starts.
+
+        Parameters
+        ----------
+        periods : list of eemeter.evaluation.Period
+            Time periods over which temperatures will be aggregated.
+        unit : {"degC", "degF"}
+            The unit in which temperatures should be returned.
+
+        Returns
+        -------
+        out : eemeter.ragged.RaggedArray
+            Average daily temperatures observed during each period.
+        """
+        return self._ragged_temperatures(periods, unit, "D")
+
+    def ragged_hourly_temperatures(self, periods, unit):
+        """The hourly observed temperatures for each period, as a single flat
+        buffer with offsets marking where each period starts.
+
+        Parameters
+        ----------
+        periods : list of eemeter.evaluation.Period
+            Time periods over which temperatures will be collected.
+        unit : {"degC", "degF"}
+            The unit in which temperatures should be returned.
+
+        Returns
+        -------
+        out : eemeter.ragged.RaggedArray
+            Hourly temperatures observed during each period.
+        """
+        return self._ragged_temperatures(periods, unit, "H")
+
     def _period_average_temperature(self, period, unit):
         self._fetch_period(period)
         value = self.tempC[period.start:period.end - timedelta(seconds=1)].mean()
         return self._unit_convert(value, unit)
 
     def _period_daily_temperatures(self, period, unit):
-        self._fetch_period(period)
-        temps = []
-        for days in range(period.timedelta.days):
-            dt = period.start + timedelta(days=days)
-            temps.append(self.datetime_average_temperature(dt, unit))
-        return np.array(temps)
+        return self.ragged_daily_temperatures([period], unit)[0]
 
     def _period_hourly_temperatures(self, period, unit):
-        self._fetch_period(period)
-        temps = []
-        for seconds in range(0, int(period.timedelta.total_seconds()), 3600):
-            dt = period.start + timedelta(seconds=seconds)
-            temps.append(self.datetime_hourly_temperature(dt, unit))
-        return np.array(temps)
+        return self.ragged_hourly_temperatures([period], unit)[0]
 
     def datetime_average_temperature(self, dt, unit):
         """The daily average temperatures for a particular period.
@@ -326,17 +1147,7 @@ class WeatherSourceBase(object):
             Average temperature observed.
         """
 
-        try:
-            value = self.tempC[dt.strftime("%Y-%m-%d")].mean()
-            return self._unit_convert(value, unit)
-        except KeyError:
-            try:
-                self._fetch_datetime(dt)
-                value = self.tempC[dt.strftime("%Y-%m-%d")].mean()
-                return self._unit_convert(value, unit)
-            except KeyError:
-                pass
-        return np.nan
+        return self._datetime_temperature(dt, unit, "D")
 
     def datetime_hourly_temperature(self, dt, unit):
         """The hourly observed temperatures for each period.
@@ -358,14 +1169,17 @@ class WeatherSourceBase(object):
             temperatures will be returned.
         """
 
-        try:
-            return self._unit_convert(self.tempC[dt], unit)
-        except KeyError:
-            try:
+        return self._datetime_temperature(dt, unit, "H")
+
+    def _datetime_temperature(self, dt, unit, freq):
+        # Fetches data and looks again if the datetime is not covered.
+        for attempt in range(2):
+            i = self._datetime_offset(dt, freq)
+            _, temps = self._temperature_array(freq)
+            if i is not None and 0 <= i < temps.shape[0]:
+                return self._unit_convert(temps[i], unit)
+            if attempt == 0:
                 self._fetch_datetime(dt)
-                return self._unit_convert(self.tempC[dt], unit)
-            except KeyError:
-                pass
         return np.nan
 
     def hdd(self, periods, unit, base, per_day=False):
@@ -391,7 +1205,7 @@ class WeatherSourceBase(object):
         """
 
         if is_list_like(periods):
-            return np.array([self._period_hdd(p, unit, base, per_day) for p in periods])
+            return self._degree_days(periods, unit, base, per_day, heating=True)
         else:
             return self._period_hdd(periods, unit, base, per_day)
 
@@ -418,7 +1232,7 @@ class WeatherSourceBase(object):
         """
 
         if is_list_like(periods):
-            return np.array([self._period_cdd(p, unit, base, per_day) for p in periods])
+            return self._degree_days(periods, unit, base, per_day, heating=False)
         else:
             return self._period_cdd(periods, unit, base, per_day)
 
@@ -444,14 +1258,8 @@ class WeatherSourceBase(object):
             Total heating degree days observed during the time period.
         """
 
-        temps = self._period_daily_temperatures(period,unit)
-        masked_temps = np.ma.masked_array(temps, np.isnan(temps))
-        total_hdd = np.sum(np.maximum(base - masked_temps,0))
-        if per_day:
-            n_days = period.timedelta.days
-            return total_hdd / n_days
-        else:
-            return total_hdd
+        return self._degree_days([period], unit, base, per_day,
+                heating=True)[0]
 
     def _period_cdd(self, period, unit, base, per_day):
         """The total cooling degree days observed during a particular
@@ -475,14 +1283,55 @@ class WeatherSourceBase(object):
             Total cooling degree days observed during the time period.
         """
 
-        temps = self._period_daily_temperatures(period,unit)
-        masked_temps = np.ma.masked_array(temps, np.isnan(temps))
-        total_cdd = np.sum(np.maximum(masked_temps - base,0))
+        return self._degree_days([period], unit, base, per_day,
+                heating=False)[0]
+
+    def _degree_days(self, periods, unit, base, per_day, heating):
+        self._fetch_periods(periods)
+        cumulative_degree_days, cumulative_n_valid = \
+                self._degree_day_index(unit, base, heating)
+        offsets, lengths, _ = self._period_offsets(periods, "D")
+        totals = self._cumulative_range_sums(cumulative_degree_days, offsets, lengths)
+        n_valid = self._cumulative_range_sums(cumulative_n_valid, offsets, lengths)
+
+        # periods without any observed temperatures have unknown totals
+        totals[(n_valid == 0) & (lengths > 0)] = np.nan
+
         if per_day:
-            n_days = period.timedelta.days
-            return total_cdd / n_days
-        else:
-            return total_cdd
+            n_days = np.array([p.timedelta.days for p in periods], dtype=float)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                totals = totals / n_days
+        return totals
+
+    def _degree_day_index(self, unit, base, heating):
+        """Cumulative degree days and cumulative counts of days with observed
+        temperatures along the daily temperature array, such that element
+        `i` covers the first `i` days. Built once per unit and base, then
+        reused until `tempC` is replaced.
+        """
+        key = ("degree_days", unit, base, heating)
+        if key not in self._derived:
+            _, temps = self._temperature_array("D")
+            temps = self._unit_convert(temps, unit)
+            valid = ~np.isnan(temps)
+            degree_days = np.zeros(temps.shape)
+            if heating:
+                degree_days[valid] = np.maximum(base - temps[valid], 0)
+            else:
+                degree_days[valid] = np.maximum(temps[valid] - base, 0)
+            cumulative_degree_days = np.zeros((temps.shape[0] + 1,))
+            cumulative_n_valid = np.zeros((temps.shape[0] + 1,), dtype=np.intp)
+            np.cumsum(degree_days, out=cumulative_degree_days[1:])
+            np.cumsum(valid, out=cumulative_n_valid[1:])
+            self._derived[key] = (cumulative_degree_days, cumulative_n_valid)
+        return self._derived[key]
+
+    def _cumulative_range_sums(self, cumulative, offsets, lengths):
+        # days outside of the daily temperature array contribute nothing
+        n = cumulative.shape[0] - 1
+        starts = np.clip(offsets, 0, n)
+        ends = np.clip(offsets + lengths, 0, n)
+        return cumulative[ends] - cumulative[starts]
 
     def json(self):
         return {
@@ -498,6 +1347,7 @@ class CachedWeatherSourceBase(WeatherSourceBase):
 
     cache_date_format = None
     cache_filename_format = None
+    sidecar_suffixes = []
     freq = None
 
     def __init__(self, station, cache_directory=None, cache_filename=None):
@@ -508,15 +1358,35 @@ class CachedWeatherSourceBase(WeatherSourceBase):
         else:
             self.cache_filename = cache_filename
 
+        self._lock = threading.RLock()
+        self._lock_file = None
+        self._cache_token = None
         self.load_from_cache()
 
     def get_cache_filename(self, cache_directory=None):
+        """ Returns the path of the cache file. The format of the cache is
+        chosen by the extension of `cache_filename_format`, which can be
+        overridden by setting `EEMETER_WEATHER_CACHE_FORMAT` to one of
+        "json" or "npz".
+        """
+        return self._cache_filename_for(self.station, cache_directory)
+
+    @classmethod
+    def _cache_filename_for(cls, station, cache_directory=None):
         if cache_directory is None:
-            cache_directory = self.get_cache_directory()
-        filename = self.cache_filename_format.format(self.station)
+            cache_directory = cls.get_cache_directory()
+        filename = cls.cache_filename_format.format(station)
+        cache_format = os.environ.get("EEMETER_WEATHER_CACHE_FORMAT")
+        if cache_format is not None:
+            if cache_format not in CACHE_FORMATS:
+                message = "Cache format not supported ({}). Use one of {}." \
+                        .format(cache_format, CACHE_FORMATS)
+                raise ValueError(message)
+            filename = "{}.{}".format(os.path.splitext(filename)[0], cache_format)
         return os.path.join(cache_directory, filename)
 
-    def get_cache_directory(self):
+    @staticmethod
+    def get_cache_directory():
         """ Returns a directory to be used for caching.
         """
         directory = os.environ.get("EEMETER_WEATHER_CACHE_DIRECTORY", os.path.expanduser('~/.eemeter/cache'))
@@ -524,40 +1394,260 @@ class CachedWeatherSourceBase(WeatherSourceBase):
             os.makedirs(directory)
         return directory
 
+    def _has_binary_cache(self):
+        return self.cache_filename.endswith(".npz")
+
+    @contextmanager
+    def _cache_lock(self):
+        """Holds the lock on this weather source, and an exclusive lock on
+        `<cache name>.lock` so that other processes sharing the cache
+        directory wait to write the cache (or fetch data) for the station.
+        Reentrant within a thread. The file lock is not available on
+        windows, where only the in-process lock is held.
+        """
+        with self._lock:
+            if self._lock_file is not None or fcntl is None:
+                yield
+                return
+            lock_file = open("{}.lock".format(os.path.splitext(self.cache_filename)[0]), 'a')
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                self._lock_file = lock_file
+                yield
+            finally:
+                self._lock_file = None
+                lock_file.close() # releases the file lock
+
+    def _cache_file_token(self, filename=None):
+        """A token which changes whenever the cache file (or another file in
+        the same format) is replaced, or None if there is no such file: its
+        inode, size and modification time, along with the generation written
+        into it. The generation tells apart writes which land on a reused
+        inode within the resolution of the modification time.
+        """
+        if filename is None:
+            filename = self.cache_filename
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        mtime_ns = getattr(st, "st_mtime_ns", None)
+        if mtime_ns is None: # python 2
+            mtime_ns = int(st.st_mtime * 1e9)
+        return "{}:{}:{}:{}".format(st.st_ino, st.st_size, mtime_ns,
+                self._cache_generation(filename))
+
+    def _cache_generation(self, filename=None):
+        """The number of times the cache file has been written, read from
+        the start of the file (or the member holding it), or 0 if it was
+        written without one.
+        """
+        if filename is None:
+            filename = self.cache_filename
+        try:
+            if filename.endswith(".npz"):
+                with np.load(filename, allow_pickle=False) as data:
+                    if "generation" not in data.files:
+                        return 0
+                    return int(data["generation"])
+            with open(filename, 'r') as f:
+                match = _JSON_GENERATION.match(f.read(64))
+            return int(match.group(1)) if match else 0
+        except Exception: # missing or corrupted; read_cache deals with it
+            return 0
+
     def save_to_cache(self):
-        data = [[d.strftime(self.cache_date_format), t if pd.notnull(t) else None] for d,t in self.tempC.iteritems()]
-        with open(self.cache_filename, 'w') as f:
-            json.dump(data,f)
+        with self._cache_lock():
+            self._write_cache_file(self.cache_filename, self.tempC)
+            self._cache_token = self._cache_file_token()
+
+    def _write_cache_file(self, filename, tempC):
+        # Writes temperatures to a file in the format given by its
+        # extension, with the next generation. Called with the cache lock.
+        generation = self._cache_generation(filename) + 1
+        if filename.endswith(".npz"):
+            self._save_to_binary_cache(filename, generation, tempC)
+        else:
+            self._save_to_json_cache(filename, generation, tempC)
+
+    def _read_cache_file(self, filename):
+        if filename.endswith(".npz"):
+            return self._load_from_binary_cache(filename)
+        return self._load_from_json_cache(filename)
 
     def load_from_cache(self):
         try:
-            with open(self.cache_filename, 'r') as f:
-                data = json.load(f)
-        except IOError:
-            return
-        except ValueError: # Corrupted json file
+            tempC = self._read_cache()
+        except ValueError: # Corrupted cache file
             self.clear_cache()
             return
+
+        if tempC is not None:
+            self.tempC = tempC
+
+    def _read_cache(self):
+        # Cache files are replaced atomically, so they can be read without
+        # holding the file lock.
+        self._cache_token = self._cache_file_token()
+        if self._has_binary_cache():
+            tempC = self._load_from_binary_cache(self.cache_filename)
+            if tempC is None:
+                tempC = self._migrate_json_cache()
+            return tempC
+        return self._load_from_json_cache(self.cache_filename)
+
+    def _save_to_json_cache(self, filename, generation=1, tempC=None):
+        # The generation comes first, so that it can be read without
+        # parsing the rest of the file.
+        if tempC is None:
+            tempC = self.tempC
+        data = [[d.strftime(self.cache_date_format), t if pd.notnull(t) else None] for d,t in tempC.iteritems()]
+        def write(f):
+            f.write('{{"generation": {}, "records": '.format(int(generation)))
+            json.dump(data, f)
+            f.write('}')
+        _atomic_write(filename, write, mode='w')
+
+    def _load_from_json_cache(self, filename):
+        try:
+            with open(filename, 'r') as f:
+                data = json.load(f)
+        except IOError:
+            return None
+        if isinstance(data, dict): # written with a generation
+            try:
+                data = data["records"]
+            except KeyError:
+                raise ValueError("Could not read weather cache {}".format(filename))
         index = pd.to_datetime([d[0] for d in data], format=self.cache_date_format)
         values = [d[1] for d in data]
 
         # changed for pandas > 0.18
-        self.tempC = pd.Series(values, index=index, dtype=float).sort_index().resample(self.freq).mean()
+        return pd.Series(values, index=index, dtype=float).sort_index().resample(self.freq).mean()
+
+    def _save_to_binary_cache(self, filename, generation=1, tempC=None):
+        # tempC is always regularly spaced, so its start timestamp and
+        # frequency are enough to rebuild the index.
+        if tempC is None:
+            tempC = self.tempC
+        if tempC.shape[0] == 0:
+            start, values = "", np.empty((0,), dtype=np.float64)
+        else:
+            tempC = tempC.asfreq(self.freq)
+            start = tempC.index[0].strftime("%Y-%m-%dT%H:%M:%S")
+            values = tempC.values.astype(np.float64)
+        _atomic_write(filename, lambda f: np.savez(f, start=np.array(start),
+                freq=np.array(self.freq), values=values,
+                generation=np.array(generation, dtype=np.int64)))
+
+    def _load_from_binary_cache(self, filename):
+        if not os.path.exists(filename):
+            return None
+        try:
+            with np.load(filename, allow_pickle=False) as data:
+                start = str(data["start"])
+                freq = str(data["freq"])
+                values = data["values"]
+        except Exception:
+            raise ValueError("Could not read weather cache {}".format(filename))
+
+        if values.shape[0] == 0:
+            return pd.Series(dtype=float)
+        index = pd.date_range(start, periods=values.shape[0], freq=freq)
+        return pd.Series(values, index=index)
+
+    def _migrate_json_cache(self):
+        json_filename = "{}.json".format(os.path.splitext(self.cache_filename)[0])
+        try:
+            tempC = self._load_from_json_cache(json_filename)
+        except ValueError: # Corrupted json file; nothing to migrate
+            return None
+        if tempC is not None:
+            self.tempC = tempC
+            with self._cache_lock():
+                self._save_to_binary_cache(self.cache_filename,
+                        self._cache_generation() + 1)
+        return tempC
 
     def clear_cache(self):
         try:
             os.remove(self.cache_filename)
         except OSError:
             pass
+        for suffix in self.sidecar_suffixes:
+            try:
+                os.remove(self._sidecar_filename(suffix))
+            except OSError:
+                pass
+
+    def _sidecar_filename(self, suffix, cache_filename=None):
+        if cache_filename is None:
+            cache_filename = self.cache_filename
+        return "{}.{}.npz".format(os.path.splitext(cache_filename)[0], suffix)
+
+    def _save_sidecar(self, suffix, cache_filename=None, **arrays):
+        """Saves arrays derived from the cached data next to the cache file
+        (or another file in the same format), along with the token of that
+        file.
+        """
+        with self._cache_lock():
+            cache_token = self._cache_file_token(cache_filename)
+            if cache_token is None:
+                return
+            _atomic_write(self._sidecar_filename(suffix, cache_filename),
+                    lambda f: np.savez(f, cache_token=np.array(cache_token),
+                    **arrays))
+
+    def _load_sidecar(self, suffix, cache_filename=None):
+        """Loads arrays saved by `_save_sidecar` as a dict, or returns None
+        if they are missing, corrupted, or the file they were derived from
+        has changed since they were saved.
+        """
+        try:
+            with np.load(self._sidecar_filename(suffix, cache_filename),
+                    allow_pickle=False) as data:
+                arrays = dict((key, data[key]) for key in data.files)
+        except Exception:
+            return None
+        cache_token = arrays.pop("cache_token", None)
+        if cache_token is None or \
+                str(cache_token) != self._cache_file_token(cache_filename):
+            return None
+        return arrays
 
 
 class NOAAWeatherSourceBase(CachedWeatherSourceBase):
+    """Base class for weather sources which fetch data from NOAA a year at a
+    time. Each year is kept in its own preallocated array (a partition), so
+    adding a year does not touch the others; `tempC` is assembled from the
+    partitions only when it is read.
+
+    With a SharedWeatherStore, the partitions of complete years are views
+    onto the store. When every year in `tempC` is one of those, `tempC` and
+    the temperature array at the frequency of the source are views onto the
+    same memory-mapped range rather than copies, so processes using the same
+    station share it. Derived arrays at other frequencies, and years which
+    are not in the store (e.g. the current year), are still per process.
+
+    Each year is cached in its own file (a segment), in a directory named
+    after the cache file, e.g. `GSOD-722880/2013.json`, so that adding a
+    year writes only that year. A cache written as a single file is still
+    read, and is replaced by segments on `save_to_cache`.
+    """
 
     year_existence_format = None
+    store_source_type = None
+    max_fetch_threads = 4
     client = NOAAClient()
 
     def __init__(self, station, start_year=None, end_year=None,
-            cache_directory=None, cache_filename=None):
+            cache_directory=None, cache_filename=None, store=None,
+            client=None):
+        self.store = store
+        if client is not None:
+            self.client = client
+        self._dirty_years = set()
+        self._segment_tokens = {}
         super(NOAAWeatherSourceBase, self).__init__(station, cache_directory,
                 cache_filename)
 
@@ -574,6 +1664,233 @@ class NOAAWeatherSourceBase(CachedWeatherSourceBase):
 
         self._check_for_recent_data()
 
+    @property
+    def tempC(self):
+        """Observed temperatures (degC) as a pandas Series, assembled from
+        the yearly partitions on first access after a year is added.
+        """
+        if self._tempC is None:
+            self._tempC = self._assemble_partitions()
+        return self._tempC
+
+    @tempC.setter
+    def tempC(self, value):
+        self._set_partitions(value)
+        self._tempC = value
+        self._derived = {}
+
+    def _year_start(self, year):
+        return datetime(int(year), 1, 1)
+
+    def _year_dates(self, year):
+        return pd.date_range(self._year_start(year),
+                self._year_start(int(year) + 1), freq=self.freq)[:-1]
+
+    def _year_length(self, year):
+        year = int(year)
+        days = (date(year + 1, 1, 1) - date(year, 1, 1)).days
+        return days * 86400 // _FREQ_SECONDS[self.freq]
+
+    def _set_partitions(self, tempC):
+        self._partitions, self._span = self._split_years(tempC)
+        self._stored_years = set()
+
+    def _split_years(self, tempC):
+        """Splits temperatures into arrays for each year, and returns them
+        (keyed by year) along with the first and last timestamps.
+        """
+        if tempC.shape[0] == 0:
+            return {}, None
+
+        tempC = tempC.resample(self.freq).mean()
+        first_year, last_year = tempC.index[0].year, tempC.index[-1].year
+        lengths = [self._year_length(y) for y in range(first_year, last_year + 1)]
+        buf = np.empty((sum(lengths),))
+        buf.fill(np.nan)
+        origin = np.datetime64(self._year_start(first_year), 's')
+        positions = (tempC.index.values.astype('datetime64[s]') - origin) \
+                .astype(np.int64) // _FREQ_SECONDS[self.freq]
+        buf[positions] = tempC.values
+        partitions = dict(zip(range(first_year, last_year + 1),
+                np.split(buf, np.cumsum(lengths)[:-1])))
+        return partitions, (tempC.index[0], tempC.index[-1])
+
+    def _assemble_partitions(self):
+        if self._span is None:
+            return pd.Series(dtype=float)
+        start, end = self._span
+        years = range(start.year, end.year + 1)
+        values = self._get_years_from_store(years)
+        if values is None:
+            values = np.concatenate([self._partitions[y] if y in self._partitions
+                    else np.nan * np.ones((self._year_length(y),)) for y in years])
+        index = pd.date_range(self._year_start(start.year), periods=values.shape[0],
+                freq=self.freq)
+        i, j = index.get_loc(start), index.get_loc(end) + 1
+        return pd.Series(values[i:j], index=index[i:j])
+
+    def _insert_year(self, year, values, dirty=True, stored=False):
+        """Inserts a year of temperatures into its partition. Non-null
+        values replace any already there. If `stored`, the values are a view
+        onto the store, which is kept as the partition unless it lacks
+        values already there.
+        """
+        year = int(year)
+        values = np.asarray(values, dtype=np.float64)
+        existing = self._partitions.get(year)
+        if existing is not None:
+            fills = np.isnan(values) & ~np.isnan(existing)
+            if fills.any():
+                values = np.where(fills, existing, values)
+                stored = False
+        self._partitions[year] = values
+        if stored:
+            self._stored_years.add(year)
+        else:
+            self._stored_years.discard(year)
+
+        dates = self._year_dates(year)
+        if self._span is None:
+            self._span = (dates[0], dates[-1])
+        else:
+            self._span = (min(self._span[0], dates[0]), max(self._span[1], dates[-1]))
+
+        self._tempC = None
+        self._derived = {}
+        if dirty:
+            self._dirty_years.add(year)
+
+    def _flush(self):
+        """Persists years added since the last flush.
+        """
+        with self._cache_lock():
+            if not self._dirty_years:
+                return
+            years = sorted(self._dirty_years)
+            self._put_years_in_store(years)
+            self._save_years_to_cache(years)
+            self._dirty_years = set()
+
+    def _segment_directory(self):
+        return os.path.splitext(self.cache_filename)[0]
+
+    def _segment_filename(self, year):
+        extension = os.path.splitext(self.cache_filename)[1]
+        return os.path.join(self._segment_directory(),
+                "{}{}".format(int(year), extension))
+
+    def _segment_years(self):
+        # The years which have a segment in the cache.
+        try:
+            names = os.listdir(self._segment_directory())
+        except OSError:
+            return []
+        extension = os.path.splitext(self.cache_filename)[1]
+        years = []
+        for name in names:
+            root, ext = os.path.splitext(name)
+            if ext == extension and root.isdigit():
+                years.append(int(root))
+        return sorted(years)
+
+    def _save_years_to_cache(self, years):
+        # Merge first, so that values written by other processes are kept.
+        with self._cache_lock():
+            self._merge_from_cache(years)
+            for year in years:
+                self._save_year_to_cache(year)
+
+    def _save_year_to_cache(self, year):
+        """Writes the segment of a year. Called with the cache lock.
+        """
+        values = self._partitions.get(year)
+        if values is None:
+            values = np.nan * np.ones((self._year_length(year),))
+        filename = self._segment_filename(year)
+        self._write_cache_file(filename,
+                pd.Series(values, index=self._year_dates(year)))
+        self._segment_tokens[year] = self._cache_file_token(filename)
+
+    def _year_loaded_from_cache(self, year, filename):
+        """Called when the partition of a year has been read, as it is, from
+        its segment.
+        """
+        pass
+
+    def _merge_from_cache(self, years=None):
+        """If the cache has been written by another weather source (e.g. in
+        another process) since this one last read or wrote it, fills in years
+        and values missing here from it, and returns the years it had data
+        for. Only the segments of `years` are checked, if given.
+        """
+        years_with_data = set()
+        cache_token = self._cache_file_token()
+        if cache_token is not None and cache_token != self._cache_token:
+            try:
+                tempC = self._read_cache()
+            except ValueError:
+                tempC = None
+            if tempC is not None:
+                for year, values in self._split_years(tempC)[0].items():
+                    if self._merge_year(year, values):
+                        years_with_data.add(year)
+
+        if years is None:
+            years = self._segment_years()
+        for year in years:
+            filename = self._segment_filename(year)
+            token = self._cache_file_token(filename)
+            if token is None or token == self._segment_tokens.get(year):
+                continue
+            self._segment_tokens[year] = token
+            try:
+                tempC = self._read_cache_file(filename)
+            except ValueError: # Corrupted; replaced when the year is written
+                continue
+            values = self._split_years(tempC)[0].get(year)
+            if values is None:
+                continue
+            unchanged = year not in self._partitions
+            if self._merge_year(year, values):
+                years_with_data.add(year)
+                if unchanged:
+                    self._year_loaded_from_cache(year, filename)
+        return years_with_data
+
+    def _merge_year(self, year, values):
+        # Fills in values missing from a year's partition, and returns
+        # whether there were any values to fill in from.
+        if np.all(np.isnan(values)):
+            return False
+        existing = self._partitions.get(year)
+        if existing is not None:
+            fills = np.isnan(existing) & ~np.isnan(values)
+            if not fills.any():
+                return True
+            values = np.where(fills, values, existing)
+        self._insert_year(year, values, dirty=False)
+        return True
+
+    def save_to_cache(self):
+        """Writes the segment of every year, including years written by
+        other processes, and removes any cache written as a single file.
+        """
+        with self._cache_lock():
+            self._merge_from_cache()
+            self._save_years_to_cache(sorted(self._partitions))
+            self._dirty_years = set()
+            super(NOAAWeatherSourceBase, self).clear_cache()
+            self._cache_token = None
+
+    def load_from_cache(self):
+        super(NOAAWeatherSourceBase, self).load_from_cache()
+        self._merge_from_cache()
+
+    def clear_cache(self):
+        super(NOAAWeatherSourceBase, self).clear_cache()
+        shutil.rmtree(self._segment_directory(), ignore_errors=True)
+        self._segment_tokens = {}
+
     def add_year_range(self, start_year, end_year, force=False):
         """Adds temperature data to internal pandas timeseries across a
         range of years.
@@ -588,32 +1905,177 @@ class NOAAWeatherSourceBase(CachedWeatherSourceBase):
             If True, forces the fetch; if false, checks to see if year
             has been added before actually fetching.
         """
-        for year in range(start_year, end_year + 1):
-            self.add_year(year, force)
+        self._add_years(range(start_year, end_year + 1), force)
+        self._flush()
 
     def add_year(self, year, force=False):
+        """Adds temperature data to internal pandas timeseries
+
+        Parameters
+        ----------
+        year : {int, string}
+            The year for which data should be fetched, e.g. "2010".
+        force : bool, default=False
+            If True, forces the fetch; if false, checks to see if year
+            has been added before actually fetching.
+        """
+        self._add_years([year], force)
+        self._flush()
+
+    def _add_years(self, years, force=False):
+        # Work out which years are missing first, so that they can all be
+        # fetched at once. The cache lock is not held while fetching, so
+        # other processes sharing the cache are not held up for the whole
+        # download; they take it again only to merge and write the cache.
+        missing_years = self._missing_years(years, force)
+        for year, values in zip(missing_years, self._fetch_years(missing_years)):
+            self._add_fetched_year(year, values)
+
+    def _missing_years(self, years, force=False):
+        """Adds years which have already been fetched, are in the store, or
+        have been written to the cache by another process, and returns those
+        which still need to be fetched.
+        """
+        with self._cache_lock():
+            missing_years = self._missing_years_once(years, force)
+            if missing_years and not force:
+                merged_years = self._merge_from_cache(missing_years)
+                self._year_fetches_attempted.update(year for year in merged_years
+                        if self._year_complete(year))
+                missing_years = self._missing_years_once(missing_years)
+            return missing_years
+
+    def _missing_years_once(self, years, force=False):
+        missing_years = []
+        for year in years:
+            if not force and self._year_fetch_attempted(year):
+                if not self._year_in_series(year):
+                    self._insert_year(year, np.nan * np.ones((self._year_length(year),)))
+                continue
+
+            stored_values = None if force else self._get_year_from_store(year)
+            if stored_values is not None:
+                self._insert_year(year, stored_values, dirty=False, stored=True)
+                self._year_fetches_attempted.add(year)
+            else:
+                missing_years.append(year)
+        return missing_years
+
+    def _add_fetched_year(self, year, values):
+        with self._lock:
+            self._insert_year(year, values)
+            self._year_fetches_attempted.add(year)
+
+    def _fetch_years(self, years):
+        """Fetches several years concurrently, using up to
+        `max_fetch_threads` threads.
+        """
+        n_threads = min(len(years), self.max_fetch_threads)
+        if n_threads <= 1:
+            return [self._fetch_year(year) for year in years]
+        pool = ThreadPool(n_threads)
+        try:
+            return pool.map(self._fetch_year, years)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _fetch_year(self, year):
+        """Fetches a year of temperatures as an array with one element per
+        step of `freq`, starting at midnight on January 1.
+        """
         message = "Inheriting classes must override this method."
         raise NotImplementedError(message)
 
+    def _year_values(self, year, times, temps):
+        """Places observations (at datetime64 `times`) into an array with
+        one element per step of `freq` in the year. Null observations are
+        skipped, and where several fall in the same step the last one wins.
+        """
+        values = np.nan * np.ones((self._year_length(year),))
+        origin = np.datetime64(self._year_start(year), 's')
+        positions = (times.astype('datetime64[s]') - origin).astype(np.int64) \
+                // _FREQ_SECONDS[self.freq]
+        valid = ~np.isnan(temps) & (positions >= 0) & (positions < values.shape[0])
+        positions, temps = positions[valid], temps[valid]
+
+        _, last = np.unique(positions[::-1], return_index=True)
+        last = positions.shape[0] - 1 - last
+        values[positions[last]] = temps[last]
+        return values
+
+    def _year_complete(self, year):
+        return int(year) < date.today().year
+
+    def _get_year_from_store(self, year):
+        # Only complete years are shared; the current year keeps changing.
+        if self.store is None or not self._year_complete(year):
+            return None
+        return self.store.get_year(self.store_source_type, self.station, year)
+
+    def _get_years_from_store(self, years):
+        """A single view onto the store of consecutive years, if the
+        partitions of all of them are views onto the store; otherwise None.
+        """
+        if self.store is None or not all(y in self._stored_years for y in years):
+            return None
+        return self.store.get_years(self.store_source_type, self.station,
+                years[0], years[-1])
+
+    def _put_years_in_store(self, years):
+        years = [year for year in years if self._year_complete(year)]
+        if self.store is None or not years:
+            return
+        self.store.put_years(self.store_source_type, self.station,
+                dict((year, self._partitions[year]) for year in years))
+        # Swap private partitions for views onto the rewritten store.
+        for year in sorted(self._stored_years.union(years)):
+            values = self._get_year_from_store(year)
+            if values is not None:
+                self._insert_year(year, values, dirty=False, stored=True)
+
     def _year_fetch_attempted(self, year):
         return year in self._year_fetches_attempted
 
     def _year_in_series(self, year):
-        return self.year_existence_format.format(year) in self.tempC
+        year_start = self._year_start(year)
+        return self._span is not None and \
+                self._span[0] <= year_start <= self._span[1]
+
+    def _temperature_array(self, freq):
+        # tempC is regularly spaced at the frequency of the source, so its
+        # values are used as they are, without resampling (or copying).
+        key = ("temperatures", freq)
+        if key not in self._derived and freq == self.freq and \
+                self._span is not None:
+            tempC = self.tempC
+            self._derived[key] = (_epoch_seconds(tempC.index[0]), tempC.values)
+        return super(NOAAWeatherSourceBase, self)._temperature_array(freq)
 
     def _check_for_recent_data(self):
         yesterday = date.today() - timedelta(days=1)
         if yesterday in self.tempC and pd.isnull(self.tempC[yesterday]):
             self.add_year(yesterday.year, force=True)
 
-    def _fetch_period(self, period):
-        years = []
+    def _period_years(self, period):
         if period.start is not None and period.end is not None:
-            self.add_year_range(period.start.year, period.end.year)
+            return range(period.start.year, period.end.year + 1)
         elif period.start is not None:
-            self.add_year(period.start.year)
+            return [period.start.year]
         elif period.end is not None:
-            self.add_year(period.end.year)
+            return [period.end.year]
+        return []
+
+    def _fetch_period(self, period):
+        self._add_years(self._period_years(period))
+        self._flush()
+
+    def _fetch_periods(self, periods):
+        years = set()
+        for period in periods:
+            years.update(self._period_years(period))
+        self._add_years(sorted(years))
+        self._flush()
 
     def _fetch_datetime(self, dt):
         self.add_year(dt.year)
@@ -624,108 +2086,334 @@ class GSODWeatherSource(NOAAWeatherSourceBase):
     cache_date_format = "%Y%m%d"
     cache_filename_format = "GSOD-{}.json"
     year_existence_format = "{}-01-01"
+    store_source_type = "GSOD"
     freq = "D"
 
-    def add_year(self, year, force=False):
-        """Adds temperature data to internal pandas timeseries
-
-        Parameters
-        ----------
-        year : {int, string}
-            The year for which data should be fetched, e.g. "2010".
-        force : bool, default=False
-            If True, forces the fetch; if false, checks to see if year
-            has been added before actually fetching.
-        """
-
-        if not force and self._year_fetch_attempted(year):
-            if self._year_in_series(year):
-                return
-            else:
-                dates = pd.date_range("{}-01-01".format(year),"{}-12-31".format(year), freq=self.freq)
-                new_series = pd.Series(None, index=dates, dtype=float)
-                self.tempC = self.tempC.append(new_series).sort_index().resample(self.freq).mean()
-                self.save_to_cache()
-                return
+    def _fetch_year(self, year):
+        dates, temps = self.client.get_gsod_arrays(self.station, year)
+        return self._year_values(year, dates, temps)
 
-        data = self.client.get_gsod_data(self.station, year)
-        dates = pd.date_range("{}-01-01".format(year),"{}-12-31".format(year), freq=self.freq)
-        new_series = pd.Series(None, index=dates, dtype=float)
-        for day in data:
-            if not pd.isnull(day["temp_C"]):
-                new_series[day["date"]] = day["temp_C"]
 
-        # changed for pandas > 0.18
-        self.tempC = self.tempC.append(new_series).sort_index().resample(self.freq).mean()
-        self.save_to_cache()
-        self._year_fetches_attempted.add(year)
+class ISDWeatherSource(NOAAWeatherSourceBase):
+    """Hourly temperatures from the NOAA Integrated Surface Database.
 
+    Daily mean temperatures, along with the number of valid hourly
+    observations behind each, are derived once per year of data and saved
+    next to the cache segment of the year (as `<year>.daily.npz`); daily
+    temperatures, degree days and `datetime_average_temperature` all read
+    from them.
 
-class ISDWeatherSource(NOAAWeatherSourceBase):
+    Parameters
+    ----------
+    min_hours : int, default=1
+        Minimum number of valid hourly observations needed for a day to
+        have a daily mean temperature; days with fewer are nan.
+    """
 
     cache_date_format = "%Y%m%d%H"
     cache_filename_format = "ISD-{}.json"
     year_existence_format = "{}-01-01 00"
+    store_source_type = "ISD"
+    sidecar_suffixes = ["daily"]
     freq = "H"
 
-    def add_year(self, year, force=False):
-        """Adds temperature data to internal pandas timeseries
+    def __init__(self, station, start_year=None, end_year=None,
+            cache_directory=None, cache_filename=None, store=None,
+            client=None, min_hours=1):
+        self.min_hours = min_hours
+        super(ISDWeatherSource, self).__init__(station, start_year, end_year,
+                cache_directory, cache_filename, store, client)
+
+    def _fetch_year(self, year):
+        datetimes, temps = self.client.get_isd_arrays(self.station, year)
+        return self._year_values(year, datetimes, temps)
+
+    def _set_partitions(self, tempC):
+        super(ISDWeatherSource, self)._set_partitions(tempC)
+        self._daily_aggregates = {}
+
+    def _insert_year(self, year, values, dirty=True, stored=False):
+        super(ISDWeatherSource, self)._insert_year(year, values, dirty, stored)
+        self._daily_aggregates.pop(int(year), None)
+
+    def _year_daily_aggregates(self, year):
+        """The mean temperature and number of valid hourly observations on
+        each day of a year.
+        """
+        if year not in self._daily_aggregates:
+            hours = self._partitions.get(year)
+            if hours is None:
+                hours = np.nan * np.ones((self._year_length(year),))
+            hours = hours.reshape((-1, 24))
+            valid = ~np.isnan(hours)
+            counts = valid.sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = np.where(valid, hours, 0.).sum(axis=1) / counts
+            self._daily_aggregates[year] = (means, counts)
+        return self._daily_aggregates[year]
+
+    def _temperature_array(self, freq):
+        if freq != "D" or self._span is None:
+            return super(ISDWeatherSource, self)._temperature_array(freq)
+
+        key = ("temperatures", freq)
+        if key not in self._derived and self._local_days():
+            start, means, counts = self._local_daily_aggregates()
+            means[counts < max(self.min_hours, 1)] = np.nan
+            self._derived[key] = (start, means)
+        elif key not in self._derived:
+            start, end = self._span
+            aggregates = [self._year_daily_aggregates(year)
+                    for year in range(start.year, end.year + 1)]
+            means = np.concatenate([m for m, _ in aggregates])
+            counts = np.concatenate([c for _, c in aggregates])
+            year_start = date(start.year, 1, 1)
+            i = (start.date() - year_start).days
+            j = (end.date() - year_start).days + 1
+            means, counts = means[i:j].copy(), counts[i:j]
+            means[counts < max(self.min_hours, 1)] = np.nan
+            self._derived[key] = (_epoch_day(start) * 86400, means)
+        return self._derived[key]
+
+    def _save_year_to_cache(self, year):
+        super(ISDWeatherSource, self)._save_year_to_cache(year)
+        means, counts = self._year_daily_aggregates(year)
+        self._save_sidecar("daily", self._segment_filename(year),
+                means=means, counts=counts)
+
+    def _year_loaded_from_cache(self, year, filename):
+        arrays = self._load_sidecar("daily", filename)
+        if arrays is None or \
+                arrays["means"].shape[0] != self._year_length(year) // 24:
+            return
+        self._daily_aggregates[year] = (arrays["means"],
+                arrays["counts"].astype(np.intp))
+
+
+class NOAAWeatherFetcher(object):
+    """Fetches GSOD or ISD data for many stations and years at once, e.g. to
+    fill the caches for a whole portfolio before running meters.
+
+    Station-years are fetched concurrently on a pool of threads which share
+    one client, so the number of open connections is bounded by the
+    client's transport. Failed retrievals are retried with exponential
+    backoff by the client.
+
+    Parameters
+    ----------
+    weather_source_class : type, default=GSODWeatherSource
+        Subclass of NOAAWeatherSourceBase to fetch data for.
+    n_threads : int, default=8
+        Number of station-years to fetch at once.
+    client : NOAAClient, optional
+        Client to fetch data with. By default, a client with a transport
+        for `EEMETER_NOAA_DATA_URL` (or the NOAA FTP server) which keeps at
+        most `n_threads` connections open.
+    cache_directory : str, optional
+        Cache directory for the weather sources.
+    store : SharedWeatherStore, optional
+        Shared store for the weather sources.
+    """
+
+    def __init__(self, weather_source_class=None, n_threads=8, client=None,
+            cache_directory=None, store=None):
+        if weather_source_class is None:
+            weather_source_class = GSODWeatherSource
+        if client is None:
+            url = os.environ.get("EEMETER_NOAA_DATA_URL", NOAA_DATA_URL)
+            client = NOAAClient(transport=get_transport(url,
+                    max_connections=n_threads))
+        self.weather_source_class = weather_source_class
+        self.n_threads = n_threads
+        self.client = client
+        self.cache_directory = cache_directory
+        self.store = store
+
+    def fetch(self, station_years, force=False):
+        """Fetches the given station-years, and writes each station's cache
+        once.
 
         Parameters
         ----------
-        year : {int, string}
-            The year for which data should be fetched, e.g. "2010".
+        station_years : list of (str, int)
+            Pairs of station (e.g. "722880") and year (e.g. 2012).
+        force : bool, default=False
+            If True, fetches years which have been fetched before.
+
+        Returns
+        -------
+        weather_sources : dict
+            Weather sources holding the fetched data, keyed by station.
         """
-        if not force and self._year_fetch_attempted(year):
-            if self._year_in_series(year):
-                return
-            else:
-                dates = pd.date_range("{}-01-01 00:00".format(year),"{}-01-01 00:00".format(int(year) + 1), freq=self.freq)[:-1]
-                new_series = pd.Series(None, index=dates, dtype=float)
-                self.tempC = self.tempC.append(new_series).sort_index().resample(self.freq).mean()
-                self.save_to_cache()
-                return
+        weather_sources = {}
+        years_by_station = {}
+        for station, year in station_years:
+            if station not in weather_sources:
+                weather_source = self.weather_source_class(station,
+                        cache_directory=self.cache_directory, store=self.store,
+                        client=self.client)
+                weather_sources[station] = weather_source
+                years_by_station[station] = []
+            years_by_station[station].append(int(year))
+
+        tasks = []
+        for station in sorted(years_by_station):
+            years = sorted(set(years_by_station[station]))
+            weather_source = weather_sources[station]
+            for year in weather_source._missing_years(years, force):
+                tasks.append((weather_source, year))
+
+        def fetch_year(task):
+            weather_source, year = task
+            return weather_source._fetch_year(year)
+
+        if tasks:
+            pool = ThreadPool(min(len(tasks), self.n_threads))
+            try:
+                results = pool.map(fetch_year, tasks)
+            finally:
+                pool.close()
+                pool.join()
 
-        data = self.client.get_isd_data(self.station, year)
-        dates = pd.date_range("{}-01-01 00:00".format(year),"{}-01-01 00:00".format(int(year) + 1), freq=self.freq)[:-1]
-        new_series = pd.Series(None, index=dates, dtype=float)
-        for hour in data:
-            if not pd.isnull(hour["temp_C"]):
-                dt = hour["datetime"]
-                new_series[datetime(dt.year, dt.month, dt.day, dt.hour)] = hour["temp_C"]
+            for (weather_source, year), values in zip(tasks, results):
+                weather_source._add_fetched_year(year, values)
 
-        # changed for pandas > 0.18
-        self.tempC = self.tempC.append(new_series).sort_index().resample(self.freq).mean()
-        self.save_to_cache()
-        self._year_fetches_attempted.add(year)
+        for weather_source in weather_sources.values():
+            weather_source._flush()
+        return weather_sources
 
 
 class TMY3WeatherSource(CachedWeatherSourceBase):
+    """Hourly temperatures in a typical meteorological year.
+
+    A table of normals -- the mean temperature on each of the 365 days, in
+    degC and degF, and the annual heating and cooling degree days at the
+    bases in `normal_bases` -- is built once when the data is loaded and
+    saved next to the cache (as `<cache name>.normals.npz`).
+    """
 
     cache_date_format = "%Y%m%d%H"
     cache_filename_format = "TMY3-{}.json"
+    sidecar_suffixes = ["normals"]
     freq = "H"
     client = TMY3Client()
+    normal_bases = {
+        "degF": list(range(40, 91)),
+        "degC": list(range(5, 33)),
+    }
 
     def __init__(self, station, station_fallback=True):
         super(TMY3WeatherSource, self).__init__(station)
         self.station_id = station
         self.station_fallback = station_fallback
-        if self.tempC.shape[0] != 365 * 24:
+        # A cache with no data is refetched rather than trusted.
+        if self.tempC.shape[0] != 365 * 24 or self.tempC.isnull().all():
             self._load_data()
+        if "normals" not in self._derived:
+            self._derived["normals"] = self._build_normals()
+            if self.tempC.notnull().any():
+                self._save_sidecar("normals", **self._derived["normals"])
+
+    def load_from_cache(self):
+        super(TMY3WeatherSource, self).load_from_cache()
+        normals = self._load_sidecar("normals")
+        if normals is not None:
+            self._derived["normals"] = normals
+
+    @property
+    def normals(self):
+        """The table of normals, as a dict of arrays:
+
+        - "daily_temperatures_degC", "daily_temperatures_degF": mean
+          temperature on each day of the year.
+        - "bases_degC", "bases_degF": degree day bases.
+        - "hdd_degC", "cdd_degC", "hdd_degF", "cdd_degF": annual heating and
+          cooling degree days at each base.
+        """
+        if "normals" not in self._derived:
+            self._derived["normals"] = self._build_normals()
+        return self._derived["normals"]
+
+    def _build_normals(self):
+        daily = np.nan * np.ones((365,))
+        _, temps = super(TMY3WeatherSource, self)._temperature_array("D")
+        daily[:min(temps.shape[0], 365)] = temps[:365]
+
+        normals = {}
+        for unit in ["degC", "degF"]:
+            daily_temps = self._unit_convert(daily, unit)
+            bases = np.array(self.normal_bases[unit], dtype=float)
+            normals["daily_temperatures_{}".format(unit)] = daily_temps
+            normals["bases_{}".format(unit)] = bases
+            normals["hdd_{}".format(unit)] = self._annual_degree_days_at(daily_temps, bases, True)
+            normals["cdd_{}".format(unit)] = self._annual_degree_days_at(daily_temps, bases, False)
+        return normals
+
+    @staticmethod
+    def _annual_degree_days_at(daily_temps, bases, heating):
+        daily_temps = daily_temps[~np.isnan(daily_temps)]
+        if daily_temps.shape[0] == 0:
+            return np.nan * np.ones(bases.shape)
+        diffs = bases[:, np.newaxis] - daily_temps[np.newaxis, :]
+        if not heating:
+            diffs = -diffs
+        return np.maximum(diffs, 0).sum(axis=1)
+
+    def _annual_degree_days(self, unit, base, heating):
+        self._unit_convert(0, unit) # check unit
+        normals = self.normals
+        bases = normals["bases_{}".format(unit)]
+        totals = normals["{}_{}".format("hdd" if heating else "cdd", unit)]
+        matches = np.flatnonzero(bases == base)
+        if matches.shape[0] > 0:
+            return totals[matches[0]]
+        daily_temps = normals["daily_temperatures_{}".format(unit)]
+        return self._annual_degree_days_at(daily_temps, np.array([base], dtype=float), heating)[0]
+
+    def annual_hdd(self, unit, base):
+        """The total heating degree days in the typical meteorological year.
+
+        Parameters
+        ----------
+        unit : {"degC", "degF"}
+            The temperature unit to be used.
+        base : int or float
+            The base of the heating degree day.
+
+        Returns
+        -------
+        out : float
+            Total heating degree days, read from the table of normals.
+        """
+        return self._annual_degree_days(unit, base, heating=True)
+
+    def annual_cdd(self, unit, base):
+        """The total cooling degree days in the typical meteorological year.
+
+        Parameters
+        ----------
+        unit : {"degC", "degF"}
+            The temperature unit to be used.
+        base : int or float
+            The base of the cooling degree day.
+
+        Returns
+        -------
+        out : float
+            Total cooling degree days, read from the table of normals.
+        """
+        return self._annual_degree_days(unit, base, heating=False)
 
     def _load_data(self):
-        data = self.client.get_tmy3_data(self.station, self.station_fallback)
-        if data is None:
-            temps = [np.nan for _ in range(365 * 24)]
-            index = [datetime(1900, 1, 1) + timedelta(seconds=i*3600) for i in range(365 * 24)]
+        # Stations without data get nan temperatures, which are not cached,
+        # so that they are looked up again next time.
+        temps = self.client.get_tmy3_array(self.station, self.station_fallback)
+        index = pd.date_range(datetime(1900, 1, 1), periods=365 * 24, freq='H')
+        if temps is None:
+            self.tempC = pd.Series(np.nan, index=index, dtype=float)
         else:
-            temps = [d["temp_C"] for d in data]
-            index = [datetime(1900, d["dt"].month, d["dt"].day, d["dt"].hour) for d in data]
-
-        # changed for pandas > 0.18
-        self.tempC = pd.Series(temps, index=index, dtype=float).sort_index().resample('H').mean()
-        self.save_to_cache()
+            self.tempC = pd.Series(temps, index=index, dtype=float)
+            self.save_to_cache()
 
     def annual_daily_temperatures(self, unit):
         """Returns a list of daily temperature normals for a typical
@@ -744,8 +2432,9 @@ class TMY3WeatherSource(CachedWeatherSourceBase):
 
         """
 
-        periods = [Period(start=datetime(1900,1,1), end=datetime(1901,1,1))]
-        return self.daily_temperatures(periods, unit)
+        self._unit_convert(0, unit) # check unit
+        daily_temps = self.normals["daily_temperatures_{}".format(unit)]
+        return daily_temps[np.newaxis, :].copy()
 
     def _fetch_period(self, period):
         pass # loaded at init
@@ -767,13 +2456,31 @@ class TMY3WeatherSource(CachedWeatherSourceBase):
         period = self._normalize_period(period)
         return super(TMY3WeatherSource, self)._period_average_temperature(period, unit)
 
-    def _period_daily_temperatures(self, period, unit):
-        period = self._normalize_period(period)
-        return super(TMY3WeatherSource, self)._period_daily_temperatures(period, unit)
-
-    def _period_hourly_temperatures(self, period, unit):
-        period = self._normalize_period(period)
-        return super(TMY3WeatherSource, self)._period_hourly_temperatures(period, unit)
+    def _period_offsets(self, periods, freq):
+        periods = [self._normalize_period(p) for p in periods]
+        return super(TMY3WeatherSource, self)._period_offsets(periods, freq)
+
+    def _normalize_index(self, index, freq):
+        # Steps past the end of the normalized year wrap around to its start,
+        # as datetime_average_temperature and datetime_hourly_temperature map
+        # every date into 1900. average_temperature still slices tempC and
+        # so ignores them.
+        return index % (365 * 86400 // _FREQ_SECONDS[freq])
+
+    def _cumulative_range_sums(self, cumulative, offsets, lengths):
+        # days past the end of the normalized year wrap around to its start,
+        # matching the daily temperatures the totals are built from
+        n = cumulative.shape[0] - 1
+        if n == 0:
+            return np.zeros(lengths.shape, dtype=cumulative.dtype)
+        starts = offsets % n
+        n_cycles, remainders = lengths // n, lengths % n
+        ends = starts + remainders
+        wrapped = ends > n
+        sums = n_cycles * cumulative[n] + \
+                cumulative[np.where(wrapped, n, ends)] - cumulative[starts]
+        sums[wrapped] += cumulative[ends[wrapped] - n]
+        return sums
 
     def datetime_average_temperature(self, dt, unit):
         """The daily average temperatures for a particular period.
@@ -814,3 +2521,91 @@ class TMY3WeatherSource(CachedWeatherSourceBase):
         """
         dt = self._normalize_datetime(dt)
         return super(TMY3WeatherSource, self).datetime_hourly_temperature(dt, unit)
+
+
+class WeatherSourceRegistry(object):
+    """A size-bounded registry of weather sources, so that projects which
+    share a station also share one weather source (and read its cache once)
+    instead of each constructing their own.
+
+    Weather sources are keyed by class, station, cache path and any other
+    constructor arguments. When the registry is full, the least recently
+    used source is evicted. Sources handed out by the registry are shared,
+    so they should not be modified other than by fetching more data.
+
+    Parameters
+    ----------
+    max_size : int, default=128
+        Maximum number of weather sources to keep.
+    """
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._sources = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._sources)
+
+    def _key(self, weather_source_class, station, kwargs):
+        cache_filename = None
+        if issubclass(weather_source_class, CachedWeatherSourceBase):
+            cache_filename = kwargs.get("cache_filename")
+            if cache_filename is None:
+                cache_filename = weather_source_class._cache_filename_for(
+                        station, kwargs.get("cache_directory"))
+        other_kwargs = tuple(sorted((k, v) for k, v in kwargs.items()
+                if k not in ["cache_filename", "cache_directory"]))
+        return (weather_source_class, station, cache_filename, other_kwargs)
+
+    def get(self, weather_source_class, station, **kwargs):
+        """Returns the registered weather source for a station, constructing
+        (and registering) it if necessary.
+
+        Parameters
+        ----------
+        weather_source_class : type
+            Class of the weather source, e.g. GSODWeatherSource.
+        station : str
+            Station of the weather source.
+        **kwargs
+            Other arguments to the constructor of the weather source.
+        """
+        key = self._key(weather_source_class, station, kwargs)
+        with self._lock:
+            weather_source = self._sources.pop(key, None)
+            if weather_source is not None:
+                self.hits += 1
+                self._sources[key] = weather_source # now most recently used
+                return weather_source
+            self.misses += 1
+
+        # Constructed outside of the lock, since this may fetch data.
+        weather_source = weather_source_class(station, **kwargs)
+        with self._lock:
+            # another thread may have registered one in the meantime
+            weather_source = self._sources.pop(key, weather_source)
+            self._sources[key] = weather_source
+            while len(self._sources) > self.max_size:
+                self._sources.popitem(last=False)
+        return weather_source
+
+    def clear(self):
+        """Removes all weather sources and resets the counters.
+        """
+        with self._lock:
+            self._sources.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+weather_source_registry = WeatherSourceRegistry()
+
+
+def get_weather_source(weather_source_class, station, **kwargs):
+    """Returns a weather source from the process-wide registry,
+    `weather_source_registry`; see `WeatherSourceRegistry.get`.
+    """
+    return weather_source_registry.get(weather_source_class, station, **kwargs)
@@ -1,6 +1,7 @@
 from eemeter.meter import DefaultResidentialMeter
 from eemeter.meter import DataCollection
 from eemeter.models import AverageDailyTemperatureSensitivityModel
+from eemeter.models import WarmStartStore
 from eemeter.generator import MonthlyBillingConsumptionGenerator
 from eemeter.generator import generate_monthly_billing_datetimes
 from eemeter.consumption import ConsumptionData
@@ -14,6 +15,7 @@ from fixtures.weather import tmy3_722880_weather_source
 from numpy.testing import assert_allclose
 import numpy as np
 from scipy.stats import randint
+import scipy.optimize as opt
 
 from datetime import datetime
 import pytz
@@ -219,3 +221,23 @@ def test_default_residential_meter_bad_inputs():
     with pytest.raises(ValueError):
         DefaultResidentialMeter(settings={"electricity_cooling_slope_high":-1})
 
+    with pytest.raises(ValueError):
+        DefaultResidentialMeter(settings={"fit_method":"unexpected"})
+
+    with pytest.raises(ValueError):
+        DefaultResidentialMeter(settings={"fit_method":"multistart","n_starts":0})
+
+def test_default_residential_meter_warm_start_store(tmpdir):
+    filename = str(tmpdir.join("warm_start.json"))
+    store = WarmStartStore(filename)
+    meter = DefaultResidentialMeter(settings={"warm_start_store": store})
+    assert meter.settings["warm_start_store"] is store
+
+    # fits recorded during an evaluation are saved once it is done
+    def evaluate(data_collection):
+        store.put("meter-1", opt.OptimizeResult(x=np.array([1., 2.]),
+                success=True, nit=3, nfev=4, fun=0.))
+        return DataCollection()
+    meter.meter.evaluate = evaluate
+    meter.evaluate(DataCollection())
+    assert_allclose(WarmStartStore(filename).get_params("meter-1"), [1., 2.])
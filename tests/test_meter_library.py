@@ -414,3 +414,20 @@ def test_project_attributes(generated_consumption_data_1):
     assert result["fuel_types"][0]["tags"] == ["electricity"]
     assert result["fuel_types"][1]["value"] == "electricity"
     assert result["fuel_types"][1]["tags"] == ["electricity"]
+
+def test_normal_annual_degree_days_without_annual_totals():
+    class DailyNormalSource(object):
+        # only provides the generic period methods
+        def hdd(self, period, unit, base):
+            return (period.end - period.start).days * 2.
+
+        def cdd(self, period, unit, base):
+            return (period.end - period.start).days * 3.
+
+    source = DailyNormalSource()
+    meter = NormalAnnualHDD(base=65,temperature_unit_str="degF")
+    result = meter.evaluate_raw(weather_normal_source=source)
+    assert_allclose(result["normal_annual_hdd"],365 * 2.,rtol=RTOL,atol=ATOL)
+    meter = NormalAnnualCDD(base=65,temperature_unit_str="degF")
+    result = meter.evaluate_raw(weather_normal_source=source)
+    assert_allclose(result["normal_annual_cdd"],365 * 3.,rtol=RTOL,atol=ATOL)
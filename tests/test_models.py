@@ -1,9 +1,22 @@
 from eemeter.models import AverageDailyTemperatureSensitivityModel
+from eemeter.models import WarmStartStore
+from eemeter.models import FitReport
+from eemeter.models import FitReportAggregator
+from eemeter.models.temperature_sensitivity import _StartsTimer
+from eemeter.models.temperature_sensitivity import _shared_pool
+from eemeter.ragged import RaggedArray
+from eemeter.ragged import SortedRaggedArray
 
 from numpy.testing import assert_allclose
 import numpy as np
+import scipy.optimize as opt
 
+import os
 import pytest
+import stat
+import threading
+import time
+import warnings
 
 def test_average_daily_baseload_heating_cooling_consumption_model():
     initial_params = {
@@ -74,3 +87,362 @@ def test_model_weather_input_not_np_array():
     observed_temps = [[70],[65,60]]
     usages = model.transform(observed_temps, params)
     assert_allclose(usages, [1,1], rtol=1e-2, atol=1e-2)
+
+def test_model_ragged_array_input():
+    initial_params = {
+        "base_daily_consumption": 0,
+        "heating_slope": 0,
+        "cooling_slope": 0,
+        "heating_balance_temperature": 55,
+        "cooling_balance_temperature": 57,
+    }
+    model = AverageDailyTemperatureSensitivityModel(cooling=True, heating=True, initial_params=initial_params)
+    params = model.param_type([1,60,1,65,1])
+    observed_temps = [[50, 70, np.nan], [], [np.nan], [62, 66, 58, 61]]
+    usages = model.transform(RaggedArray.from_arrays(observed_temps), params)
+    assert_allclose(usages, [8.5, np.nan, np.nan, 1.75], rtol=1e-2, atol=1e-2)
+
+def test_model_input_types_agree():
+    observed_temps = [[50, 70, np.nan], [62, 66, 58], [np.nan, np.nan, np.nan]]
+    for heating in [True, False]:
+        for cooling in [True, False]:
+            model = AverageDailyTemperatureSensitivityModel(cooling=cooling, heating=heating)
+            n_params = len(model.param_type._parameter_names)
+            params = model.param_type([1, 60, 1, 65, 1][:n_params])
+            expected = model.transform(RaggedArray.from_arrays(observed_temps), params)
+            assert_allclose(model.transform(observed_temps, params), expected)
+            assert_allclose(model.transform(np.array(observed_temps), params), expected)
+
+def test_model_gradients():
+    rng = np.random.RandomState(0)
+    observed_temps = RaggedArray.from_arrays(
+            [rng.randn(30) * 10 + 60 for _ in range(12)] + [[np.nan]])
+    usages = rng.rand(13) * 5
+    weights = rng.rand(13)
+    for heating in [True, False]:
+        for cooling in [True, False]:
+            model = AverageDailyTemperatureSensitivityModel(cooling=cooling, heating=heating)
+            n_params = len(model.param_type._parameter_names)
+            param_array = np.array([1, 58.3, 0.7, 66.1, 0.4])[:n_params]
+            params = model.param_type(param_array)
+            assert model.jacobian(observed_temps, params).shape == (13, n_params)
+
+            prepared_temps = model._prepare_input(observed_temps)
+            sse, gradient = model._objective(prepared_temps, usages, weights, param_array)
+            y_est = model.transform(observed_temps, params)
+            assert_allclose(sse, np.nansum((usages - y_est)**2 * weights))
+            for i in range(n_params):
+                step = np.zeros(n_params)
+                step[i] = 1e-6
+                sse_step, _ = model._objective(prepared_temps, usages, weights, param_array + step)
+                assert_allclose(gradient[i], (sse_step - sse) / 1e-6, rtol=1e-3, atol=1e-4)
+
+def test_grid_search_fit():
+    param_bounds = {
+        "base_daily_consumption": [0,100],
+        "heating_slope": [0,100],
+        "cooling_slope": [0,100],
+        "heating_balance_temperature": [50,60],
+        "cooling_balance_temperature": [52,72],
+    }
+    model = AverageDailyTemperatureSensitivityModel(cooling=True, heating=True,
+            param_bounds=param_bounds, fit_method="grid")
+    params = model.param_type([1,60,1,65,1])
+    observed_temps = [[i, i + 0.5, np.nan] for i in range(45,75)]
+    usages = model.transform(observed_temps, params)
+    usages[3] = np.nan
+    opt_params = model.fit(observed_temps, usages)
+    assert_allclose(params.to_list(), opt_params.to_list(), rtol=1e-6, atol=1e-6)
+
+    # slopes are held within bounds
+    model = AverageDailyTemperatureSensitivityModel(cooling=False, heating=True,
+            param_bounds={
+                "base_daily_consumption": [0,100],
+                "heating_slope": [2,100],
+                "heating_balance_temperature": [50,60],
+            }, fit_method="grid", grid_step=0.5)
+    opt_params = model.fit(observed_temps, usages)
+    assert opt_params.to_dict()["heating_slope"] == 2
+
+    with pytest.raises(ValueError):
+        AverageDailyTemperatureSensitivityModel(cooling=False, heating=True,
+                fit_method="newton")
+
+def test_bounded_least_squares():
+    from scipy.optimize import lsq_linear
+    from eemeter.models.temperature_sensitivity import _bounded_least_squares
+    rng = np.random.RandomState(0)
+    A = rng.randn(20, 10, 3)
+    b = rng.randn(10)
+    lower, upper = np.array([-np.inf, 0, 0.1]), np.array([np.inf, 0.2, 1])
+    x, sse = _bounded_least_squares(A, b, lower, upper)
+    for i in range(20):
+        expected = lsq_linear(A[i], b, bounds=(lower, upper)).x
+        assert_allclose(x[i], expected, atol=1e-6)
+        assert_allclose(sse[i], np.sum((A[i].dot(expected) - b) ** 2))
+
+def test_fit_many():
+    param_bounds = {
+        "base_daily_consumption": [0,100],
+        "heating_slope": [0,100],
+        "heating_balance_temperature": [50,60],
+    }
+    initial_params = {
+        "base_daily_consumption": 0,
+        "heating_slope": 0,
+        "heating_balance_temperature": 55,
+    }
+    rng = np.random.RandomState(0)
+    observed_temps = [[rng.randn(30) * 10 + 55 for _ in range(n_periods)]
+            for n_periods in [12, 5, 0, 20]]
+    model = AverageDailyTemperatureSensitivityModel(cooling=False, heating=True,
+            initial_params=initial_params, param_bounds=param_bounds,
+            fit_method="grid")
+    true_params = [[1, 56, 0], [2, 57, 0.5], [3, 58, 1], [4, 59, 1.5]]
+    usages = [model.transform(X, model.param_type(p))
+            for p, X in zip(true_params, observed_temps)]
+    weights = [np.ones(len(X)) * 30 for X in observed_temps]
+    params = model.fit_many(observed_temps, usages, weights)
+    assert params.shape == (4, 3)
+    # the balance temperature of a set without heating is arbitrary, and a
+    # set without periods has nothing to fit
+    assert_allclose(params[0, [0, 2]], [1, 0], atol=1e-8)
+    assert_allclose(params[[1, 3]], [true_params[1], true_params[3]], atol=1e-8)
+    for X, y, w, p in zip(observed_temps, usages, weights, params):
+        if len(X) > 0:
+            assert_allclose(p, model.fit(X, y, w).to_array())
+
+    for fit_method in ["minimize", "multistart"]:
+        model = AverageDailyTemperatureSensitivityModel(cooling=False, heating=True,
+                initial_params=initial_params, param_bounds=param_bounds,
+                fit_method=fit_method)
+        with pytest.raises(ValueError):
+            model.fit_many(observed_temps, usages, weights)
+
+def test_warm_start_store(tmpdir):
+    initial_params = {
+        "base_daily_consumption": 0,
+        "heating_slope": 0,
+        "heating_balance_temperature": 55,
+    }
+    param_bounds = {
+        "base_daily_consumption": [0,100],
+        "heating_slope": [0,100],
+        "heating_balance_temperature": [50,60],
+    }
+    model = AverageDailyTemperatureSensitivityModel(cooling=False, heating=True,
+            initial_params=initial_params, param_bounds=param_bounds)
+    rng = np.random.RandomState(0)
+    X = [rng.randn(30) * 10 + 55 for _ in range(12)]
+    y = model.transform(X, model.param_type([2, 1, 57]))
+
+    filename = str(tmpdir.join("warm_start.json"))
+    store = WarmStartStore(filename)
+    key = store.key("meter-1", model, temperature_unit="degF")
+    assert key not in store
+    assert store.get_params(key) is None
+
+    cold = model.minimize(X, y)
+    store.put(key, cold)
+    assert_allclose(store.get_params(key), cold.x)
+    assert store.get(key)["n_fits"] == 1
+
+    warm = model.minimize(X, y, x0=store.get_params(key))
+    assert warm.nit <= cold.nit
+    assert_allclose(warm.x, cold.x, rtol=1e-3)
+    store.put(key, warm)
+    store.save()
+
+    # readable by others as a new file would be, not only by its owner
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(os.stat(filename).st_mode) == 0o666 & ~umask
+
+    reloaded = WarmStartStore(filename)
+    assert len(reloaded) == 1
+    assert reloaded.get(key)["n_fits"] == 2
+    assert reloaded.get(key)["n_iterations"] == warm.nit
+    assert_allclose(reloaded.get_params(key), warm.x)
+
+    # fits which did not converge are recorded but not started from
+    failed = opt.OptimizeResult(x=np.array([50., 50., 50.]), success=False,
+            nit=100, nfev=400, fun=1e6)
+    reloaded.put(key, failed)
+    assert reloaded.get(key)["n_fits"] == 3
+    assert not reloaded.get(key)["converged"]
+    assert_allclose(reloaded.get_params(key), warm.x)
+
+    new_key = store.key("meter-2", model, temperature_unit="degF")
+    store.put(new_key, failed)
+    assert new_key in store
+    assert not store.get(new_key)["converged"]
+    assert store.get_params(new_key) is None
+
+    other_bounds = dict(param_bounds, heating_balance_temperature=[40,60])
+    other_model = AverageDailyTemperatureSensitivityModel(cooling=False,
+            heating=True, initial_params=initial_params,
+            param_bounds=other_bounds)
+    assert store.key("meter-1", other_model, temperature_unit="degF") != key
+
+def test_sorted_input_degree_days():
+    from eemeter.models.temperature_sensitivity import _mean_heating_demand
+    from eemeter.models.temperature_sensitivity import _mean_cooling_demand
+    rng = np.random.RandomState(0)
+    arrays = [np.round(rng.randn(30) * 10 + 60) for _ in range(12)] + [[np.nan, 55], []]
+    X = SortedRaggedArray.from_arrays(arrays)
+    for balance_temperature in [40, 58, 60.5, 80]:
+        with np.errstate(invalid='ignore'):
+            heating = [np.nanmean(np.maximum(balance_temperature - np.asarray(a), 0))
+                    if len(a) > 0 else np.nan for a in arrays]
+            cooling = [np.nanmean(np.maximum(np.asarray(a) - balance_temperature, 0))
+                    if len(a) > 0 else np.nan for a in arrays]
+        assert_allclose(_mean_heating_demand(X, balance_temperature), heating)
+        assert_allclose(_mean_cooling_demand(X, balance_temperature), cooling)
+
+def test_multistart_fit():
+    param_bounds = {
+        "base_daily_consumption": [0,100],
+        "heating_slope": [0,100],
+        "heating_balance_temperature": [50,60],
+    }
+    initial_params = {
+        "base_daily_consumption": 0,
+        "heating_slope": 0,
+        "heating_balance_temperature": 55,
+    }
+    rng = np.random.RandomState(0)
+    observed_temps = [rng.randn(30) * 10 + 55 for _ in range(12)]
+    single_start = AverageDailyTemperatureSensitivityModel(cooling=False,
+            heating=True, initial_params=initial_params,
+            param_bounds=param_bounds)
+    usages = single_start.transform(observed_temps,
+            single_start.param_type([2, 57, 1.5])) + rng.randn(12) * 0.1
+    single_result = single_start.minimize(observed_temps, usages)
+
+    for n_workers in [1, 3]:
+        model = AverageDailyTemperatureSensitivityModel(cooling=False,
+                heating=True, initial_params=initial_params,
+                param_bounds=param_bounds, fit_method="multistart",
+                n_starts=5, n_workers=n_workers)
+        result = model.minimize(observed_temps, usages)
+        assert result.starts.shape == (5, 3)
+        assert_allclose(result.starts[0], [0, 55, 0])
+        assert result.n_starts_run == 5
+        assert not result.time_limit_reached
+        assert result.fun <= single_result.fun + 1e-9
+        assert result.fun == min(r.fun for r in result.start_results)
+        assert_allclose(model.fit(observed_temps, usages).to_array(), result.x)
+
+    # starts run on a pool of threads shared by all fits, without changing
+    # the (process-wide) warning filters
+    assert _shared_pool(3) is _shared_pool(3)
+    filters = []
+    model = AverageDailyTemperatureSensitivityModel(cooling=False,
+            heating=True, initial_params=initial_params,
+            param_bounds=param_bounds, fit_method="multistart",
+            n_starts=5, n_workers=3)
+    transform = model._transform_and_jacobian
+    def recording_transform(X, param_array):
+        filters.append(list(warnings.filters))
+        return transform(X, param_array)
+    model._transform_and_jacobian = recording_transform
+    model.minimize(observed_temps, usages)
+    assert all(f == warnings.filters for f in filters)
+
+    # each parameter has one start in each fifth of its range
+    strata = np.floor((result.starts[1:] - [0, 50, 0]) / [25, 2.5, 25])
+    for column in strata.T:
+        assert sorted(column) == [0, 1, 2, 3]
+
+    model = AverageDailyTemperatureSensitivityModel(cooling=False,
+            heating=True, initial_params=initial_params,
+            param_bounds=param_bounds, fit_method="multistart",
+            n_starts=5, n_workers=1, max_cpu_time=0)
+    result = model.minimize(observed_temps, usages)
+    assert result.time_limit_reached
+    assert result.n_starts_run == 1
+    assert result.start_results[1:] == [None] * 4
+    assert result.x.shape == (3,)
+
+    with pytest.raises(ValueError):
+        AverageDailyTemperatureSensitivityModel(cooling=False, heating=True,
+                fit_method="multistart").fit(observed_temps, usages)
+
+@pytest.mark.skipif(not hasattr(time, "thread_time"),
+        reason="per-thread CPU time not available")
+def test_multistart_cpu_time_excludes_other_threads():
+    # CPU time used by other threads (e.g. other fits) does not count
+    # against the time limit of a fit.
+    timer = _StartsTimer()
+    timer.begin(0)
+    def busy():
+        end = time.time() + 0.3
+        while time.time() < end:
+            pass
+    thread = threading.Thread(target=busy)
+    thread.start()
+    thread.join()
+    timer.update(0)
+    assert timer.total() < 0.1
+
+def test_fit_with_report():
+    param_bounds = {
+        "base_daily_consumption": [0,100],
+        "heating_slope": [0,100],
+        "heating_balance_temperature": [50,60],
+    }
+    initial_params = {
+        "base_daily_consumption": 0,
+        "heating_slope": 0,
+        "heating_balance_temperature": 55,
+    }
+    rng = np.random.RandomState(0)
+    observed_temps = [rng.randn(30) * 10 + 55 for _ in range(12)]
+    weights = np.ones(12) * 30
+    for fit_method in ["minimize", "grid", "multistart"]:
+        model = AverageDailyTemperatureSensitivityModel(cooling=False,
+                heating=True, initial_params=initial_params,
+                param_bounds=param_bounds, fit_method=fit_method, n_starts=3)
+        usages = model.transform(observed_temps, model.param_type([2, 57, 1.5]))
+        params, report = model.fit_with_report(observed_temps, usages, weights)
+        assert_allclose(params.to_array(), model.fit(observed_temps, usages, weights).to_array())
+        assert report.fit_method == fit_method
+        assert report.converged
+        assert report.status == 0
+        assert report.wall_time >= 0
+        assert report.n_evaluations > 0
+        assert_allclose(report.objective, np.sum((usages -
+                model.transform(observed_temps, params)) ** 2 * weights), atol=1e-8)
+        assert sorted(report.to_dict().keys()) == sorted(FitReport.fields)
+        if fit_method == "grid":
+            assert report.result is None
+            assert report.n_evaluations == 11
+        else:
+            assert report.n_iterations > 0
+            assert_allclose(report.result.x, params.to_array())
+        if fit_method == "multistart":
+            assert report.n_evaluations == sum(r.nfev for r in report.result.start_results)
+
+def test_fit_report_aggregator():
+    aggregator = FitReportAggregator()
+    for i in range(10):
+        result = opt.OptimizeResult(x=np.array([float(i)]), hess_inv=np.eye(1))
+        report = FitReport("minimize", converged=i != 3, status=0 if i != 3 else 2,
+                message="", n_iterations=i, n_evaluations=10 * i,
+                objective=float(i), wall_time=0.01 * i, result=result)
+        aggregator.add(report, meter_id="meter-{}".format(i))
+        assert report.result is result
+    assert len(aggregator) == 10
+    # the optimizer results are not kept
+    assert all(report.result is None for _, report in aggregator.reports)
+    assert aggregator.reports[4][1].to_dict() == FitReport("minimize",
+            converged=True, status=0, message="", n_iterations=4,
+            n_evaluations=40, objective=4., wall_time=0.04).to_dict()
+    assert_allclose(aggregator.values("n_evaluations"), np.arange(10) * 10)
+    counts, edges = aggregator.histogram("wall_time", bins=3)
+    assert counts.sum() == 10
+    assert [meter_id for meter_id, _ in aggregator.pathological()] == ["meter-3"]
+    assert [meter_id for meter_id, _ in aggregator.pathological(max_wall_time=0.075)] == \
+            ["meter-3", "meter-8", "meter-9"]
+    assert [meter_id for meter_id, _ in aggregator.pathological(max_evaluations=85)] == \
+            ["meter-3", "meter-9"]
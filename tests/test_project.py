@@ -6,6 +6,7 @@ from datetime import datetime
 
 import pytest
 
+@pytest.mark.internet
 def test_project():
     location = Location(zipcode="60604")
     baseline_period = Period(datetime(2014,1,1), datetime(2015,1,1))
@@ -43,6 +44,7 @@ def test_project_null_station():
                 weather_normal_source=None)
 
 
+@pytest.mark.internet
 def test_project_partial_period():
     location = Location(zipcode="60604")
     baseline_period = Period(None, datetime(2015,1,1))
@@ -0,0 +1,90 @@
+from eemeter.ragged import RaggedArray
+from eemeter.ragged import SortedRaggedArray
+
+from numpy.testing import assert_allclose
+import numpy as np
+
+import pytest
+
+@pytest.fixture
+def ragged_array():
+    return RaggedArray.from_arrays([[1, 2, 3], [], [np.nan, 4], [np.nan]])
+
+def test_from_arrays(ragged_array):
+    assert len(ragged_array) == 4
+    assert_allclose(ragged_array.offsets, [0, 3, 3, 5, 6])
+    assert_allclose(ragged_array.lengths, [3, 0, 2, 1])
+    assert_allclose(ragged_array[0], [1, 2, 3])
+    assert_allclose(ragged_array[-2], [np.nan, 4])
+    assert [len(a) for a in ragged_array] == [3, 0, 2, 1]
+
+    with pytest.raises(IndexError):
+        ragged_array[4]
+
+def test_from_2d_array():
+    ragged_array = RaggedArray.from_arrays(np.array([[1, 2], [3, 4], [5, 6]]))
+    assert_allclose(ragged_array.offsets, [0, 2, 4, 6])
+    assert_allclose(ragged_array[1], [3, 4])
+
+def test_invalid_offsets():
+    with pytest.raises(ValueError):
+        RaggedArray([1, 2, 3], [0, 2])
+    with pytest.raises(ValueError):
+        RaggedArray([1, 2, 3], [0, 2, 1, 3])
+
+def test_segment_reductions(ragged_array):
+    assert_allclose(ragged_array.segment_sum(), [6, 0, 4, 0])
+    assert_allclose(ragged_array.segment_count(), [3, 0, 1, 0])
+    assert_allclose(ragged_array.segment_nanmean(), [2, np.nan, 4, np.nan])
+    assert_allclose(ragged_array.segment_sum(ragged_array.values * 2),
+            [12, 0, 8, 0])
+
+def test_segment_reductions_2d(ragged_array):
+    values = np.column_stack([ragged_array.values, ragged_array.values * 2])
+    assert_allclose(ragged_array.segment_sum(values), [[6, 12], [0, 0], [4, 8], [0, 0]])
+    assert_allclose(ragged_array.segment_nanmean(values),
+            [[2, 4], [np.nan, np.nan], [4, 8], [np.nan, np.nan]])
+
+def test_concatenate(ragged_array):
+    joined = RaggedArray.concatenate([ragged_array, [[5, 6]], ragged_array])
+    assert len(joined) == 9
+    assert_allclose(joined.lengths, [3, 0, 2, 1, 2, 3, 0, 2, 1])
+    assert_allclose(joined[4], [5, 6])
+    assert_allclose(joined[5], [1, 2, 3])
+    assert len(RaggedArray.concatenate([])) == 0
+
+def test_empty():
+    ragged_array = RaggedArray.from_arrays([])
+    assert len(ragged_array) == 0
+    assert ragged_array.segment_sum().shape == (0,)
+    ragged_array = RaggedArray.from_arrays([[], []])
+    assert_allclose(ragged_array.segment_sum(), [0, 0])
+    assert_allclose(ragged_array.segment_nanmean(), [np.nan, np.nan])
+
+def test_sorted_ragged_array(ragged_array):
+    sorted_array = SortedRaggedArray.from_arrays([[3, 1, 2], [], [np.nan, 4], [np.nan]])
+    assert len(sorted_array) == 4
+    assert_allclose(sorted_array.offsets, [0, 3, 3, 4, 4])
+    assert_allclose(sorted_array[0], [1, 2, 3])
+    assert_allclose(sorted_array.segment_sum(), [6, 0, 4, 0])
+    assert_allclose(sorted_array.segment_nanmean(), [2, np.nan, 4, np.nan])
+    assert_allclose(SortedRaggedArray.from_arrays(ragged_array).offsets,
+            sorted_array.offsets)
+
+def test_count_and_sum_below():
+    rng = np.random.RandomState(0)
+    arrays = [np.round(rng.randn(n) * 10) for n in [0, 1, 5, 31, 64]]
+    sorted_array = SortedRaggedArray.from_arrays(arrays)
+    thresholds = np.array([-100, -3, 0, 2.5, 7, 100])
+    for inclusive in [False, True]:
+        counts, sums = sorted_array.count_and_sum_below(thresholds, inclusive)
+        assert counts.shape == (5, 6)
+        for i, a in enumerate(arrays):
+            for j, t in enumerate(thresholds):
+                below = a <= t if inclusive else a < t
+                assert counts[i, j] == np.sum(below)
+                assert_allclose(sums[i, j], np.sum(a[below]))
+    counts, sums = sorted_array.count_and_sum_below(0)
+    assert counts.shape == (5,)
+    counts, sums = SortedRaggedArray.from_arrays([[], []]).count_and_sum_below(0)
+    assert_allclose(counts, [0, 0])
@@ -0,0 +1,189 @@
+from eemeter.transport import get_transport
+from eemeter.transport import DataFileNotFoundError
+from eemeter.transport import FTPTransport
+from eemeter.transport import HTTPTransport
+from eemeter.transport import LocalTransport
+from eemeter.weather import NOAAClient
+from eemeter.weather import GSODWeatherSource
+from eemeter.weather import NOAAWeatherFetcher
+
+from pkg_resources import resource_stream
+from datetime import datetime
+import os
+import shutil
+import tempfile
+import threading
+
+try:
+    from http.server import HTTPServer, SimpleHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError: # python 2
+    from BaseHTTPServer import HTTPServer
+    from SimpleHTTPServer import SimpleHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+import numpy as np
+import pytest
+
+from numpy.testing import assert_allclose
+
+@pytest.fixture
+def gsod_mirror():
+    directory = tempfile.mkdtemp()
+    for year in [2012, 2013]:
+        year_directory = os.path.join(directory, "pub", "data", "gsod", str(year))
+        os.makedirs(year_directory)
+        resource = "722880-23152-{}.op.gz".format(year)
+        # the same data also stands in for another station
+        for station_id in ["722880-23152", "724940-23234"]:
+            filename = os.path.join(year_directory,
+                    "{}-{}.op.gz".format(station_id, year))
+            with resource_stream('eemeter.resources', resource) as f:
+                with open(filename, 'wb') as out:
+                    shutil.copyfileobj(f, out)
+    return directory
+
+@pytest.fixture
+def flaky_http_server(gsod_mirror):
+    # Serves the mirror, failing the first request for each file in it.
+    requested = []
+
+    class Handler(SimpleHTTPRequestHandler):
+
+        def translate_path(self, path):
+            return os.path.join(gsod_mirror, *path.lstrip("/").split("/"))
+
+        def do_GET(self):
+            if os.path.exists(self.translate_path(self.path)) and \
+                    self.path not in requested:
+                requested.append(self.path)
+                self.send_error(503)
+            else:
+                SimpleHTTPRequestHandler.do_GET(self)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+    server = Server(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield "http://127.0.0.1:{}".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+def test_get_transport(gsod_mirror):
+    transport = get_transport("ftp://ftp.ncdc.noaa.gov")
+    assert isinstance(transport, FTPTransport)
+    assert transport.host == "ftp.ncdc.noaa.gov"
+
+    transport = get_transport("https://www1.ncdc.noaa.gov/")
+    assert isinstance(transport, HTTPTransport)
+    assert transport.url("/pub/data/gsod") == "https://www1.ncdc.noaa.gov/pub/data/gsod"
+
+    transport = get_transport(gsod_mirror)
+    assert isinstance(transport, LocalTransport)
+    transport = get_transport("file://" + gsod_mirror)
+    assert isinstance(transport, LocalTransport)
+    assert transport.directory == gsod_mirror
+
+    with pytest.raises(ValueError):
+        get_transport("gopher://example.com")
+
+def test_local_transport(gsod_mirror):
+    transport = LocalTransport(gsod_mirror)
+    chunks = []
+    transport.retrieve("/pub/data/gsod/2012/722880-23152-2012.op.gz", chunks.append)
+    assert len(b"".join(chunks)) > 0
+
+    with pytest.raises(DataFileNotFoundError):
+        transport.retrieve("/pub/data/gsod/2012/000000-00000-2012.op.gz", chunks.append)
+
+def test_weather_source_local_mirror(gsod_mirror):
+    ws = GSODWeatherSource("722880", cache_directory=tempfile.mkdtemp())
+    ws.client = NOAAClient(transport=LocalTransport(gsod_mirror))
+    ws.add_year(2012)
+    assert ws.tempC.shape == (366,)
+    assert_allclose(ws.tempC[datetime(2012, 1, 1)], (63.2 - 32) * 5. / 9.)
+
+    # years missing from the mirror are empty
+    ws.add_year(2011)
+    assert ws.tempC.shape == (365 + 366,)
+    assert np.all(np.isnan(ws.tempC["2011"]))
+
+def test_noaa_data_url_environment_variable(gsod_mirror):
+    os.environ["EEMETER_NOAA_DATA_URL"] = gsod_mirror
+    try:
+        client = NOAAClient()
+        dates, temps = client.get_gsod_arrays("722880", 2012)
+        assert dates.shape == (366,)
+        assert isinstance(client.transport, LocalTransport)
+    finally:
+        del os.environ["EEMETER_NOAA_DATA_URL"]
+
+def test_http_transport_retries(flaky_http_server):
+    client = NOAAClient(transport=HTTPTransport(flaky_http_server), backoff=0.01)
+    dates, temps = client.get_gsod_arrays("722880", 2012)
+    assert dates.shape == (366,)
+
+    client = NOAAClient(transport=HTTPTransport(flaky_http_server), n_tries=1)
+    with pytest.raises(IOError):
+        client.get_gsod_arrays("722880", 2013)
+
+    # missing files are not retried
+    dates, temps = client.get_gsod_arrays("722880", 2011)
+    assert dates.shape == (0,)
+
+def test_noaa_weather_fetcher(flaky_http_server):
+    transport = HTTPTransport(flaky_http_server, max_connections=2)
+    client = NOAAClient(transport=transport, backoff=0.01)
+    fetcher = NOAAWeatherFetcher(GSODWeatherSource, n_threads=4, client=client,
+            cache_directory=tempfile.mkdtemp())
+    weather_sources = fetcher.fetch([("722880", 2012), ("724940", 2012),
+            ("722880", 2013), ("724940", 2013)])
+
+    assert sorted(weather_sources) == ["722880", "724940"]
+    for station, ws in weather_sources.items():
+        assert ws.tempC.shape == (366 + 365,)
+        assert_allclose(ws.tempC[datetime(2012, 1, 1)], (63.2 - 32) * 5. / 9.)
+
+        # caches were populated
+        ws = GSODWeatherSource(station, cache_directory=fetcher.cache_directory)
+        assert ws.tempC.shape == (366 + 365,)
+
+def test_ftp_transport_drops_failed_connections():
+    class FakeFTP(object):
+        def __init__(self, error):
+            self.error = error
+            self.closed = False
+
+        def retrbinary(self, command, callback):
+            if self.error is not None:
+                raise self.error
+            callback(b"data")
+
+        def close(self):
+            self.closed = True
+
+    transport = FTPTransport("ftp.example.com")
+    connections = []
+
+    def connect():
+        connections.append(FakeFTP(errors.pop(0)))
+        return connections[-1]
+    transport._get_ftp_connection = connect
+
+    errors = [ValueError("bad callback"), None]
+    with pytest.raises(ValueError):
+        transport.retrieve("/a", lambda chunk: None)
+    assert connections[0].closed
+    assert transport._idle.empty()
+
+    chunks = []
+    transport.retrieve("/a", chunks.append)
+    assert chunks == [b"data"]
+    assert not connections[1].closed
+    assert transport._idle.get_nowait() is connections[1]
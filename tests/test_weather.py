@@ -1,20 +1,35 @@
 from eemeter.weather import WeatherSourceBase
+from eemeter.weather import NOAAClient
+from eemeter.transport import LocalTransport
+from eemeter.transport import TransportBase
 from eemeter.weather import GSODWeatherSource
 from eemeter.weather import ISDWeatherSource
 from eemeter.weather import TMY3WeatherSource
+from eemeter.weather import SharedWeatherStore
+from eemeter.weather import TMY3Archive
+from eemeter.weather import TMY3Client
+from eemeter.weather import WeatherSourceRegistry
 
 from eemeter.consumption import ConsumptionData
 from eemeter.evaluation import Period
 
 from pkg_resources import resource_stream
+from datetime import date
 from datetime import datetime
 from datetime import timedelta
+import gzip
+import json
+from io import BytesIO
 import pytest
+import pytz
 import os
+import stat
 import warnings
 import tempfile
+import threading
 
 import numpy as np
+import pandas as pd
 
 from numpy.testing import assert_allclose
 
@@ -59,9 +74,9 @@ def gsod_weather_source(request):
 def isd_weather_source(request):
     return request.param
 
-@pytest.fixture(params=[TMY3WeatherSource('722880')])
-def tmy3_weather_source(request):
-    return request.param
+@pytest.fixture
+def tmy3_weather_source():
+    return TMY3WeatherSource('722880')
 
 @pytest.fixture(params=[("60611","725340"),
                         ("91104","722880"),
@@ -71,6 +86,26 @@ def zipcode_to_station(request):
     return request.param
 
 
+@pytest.fixture
+def hourly_weather_source():
+    index = pd.date_range("2012-01-01", periods=10 * 24, freq="H")
+    temps = np.arange(10 * 24, dtype=float) / 24.
+    temps[30:40] = np.nan
+    return StaticWeatherSource(pd.Series(temps, index=index))
+
+
+class StaticWeatherSource(WeatherSourceBase):
+
+    def __init__(self, tempC):
+        super(StaticWeatherSource, self).__init__("000000")
+        self.tempC = tempC
+
+    def _fetch_period(self, period):
+        pass
+
+    def _fetch_datetime(self, dt):
+        pass
+
 ##### Tests #####
 
 @pytest.mark.slow
@@ -197,3 +232,594 @@ def test_cache():
     ws = GSODWeatherSource('722880', cache_directory=cache_dir)
 
     assert ws.tempC.shape == (1,)
+
+def test_daily_temperatures_batch(hourly_weather_source):
+    periods = [Period(datetime(2012,1,1), datetime(2012,1,4)),
+               Period(datetime(2011,12,30), datetime(2012,1,2)),
+               Period(datetime(2012,1,9,12), datetime(2012,1,12,12))]
+    daily_temps = hourly_weather_source.daily_temperatures(periods, "degC")
+    assert [len(t) for t in daily_temps] == [3, 3, 3]
+    assert_allclose(daily_temps[0], [11.5 / 24,
+            np.mean(list(range(24, 30)) + list(range(40, 48))) / 24,
+            2 + 11.5 / 24])
+    assert_allclose(daily_temps[1], [np.nan, np.nan, 11.5 / 24])
+    assert_allclose(daily_temps[2], [8 + 11.5 / 24, 9 + 11.5 / 24, np.nan])
+
+    for period, temps in zip(periods, daily_temps):
+        assert_allclose(hourly_weather_source.daily_temperatures(period, "degF"),
+                temps * 1.8 + 32)
+
+def test_ragged_temperatures(hourly_weather_source):
+    periods = [Period(datetime(2012,1,1), datetime(2012,1,4)),
+               Period(datetime(2012,1,3), datetime(2012,1,3)),
+               Period(datetime(2012,1,10), datetime(2012,1,11,2)),
+               Period(datetime(2012,1,2,0,30), datetime(2012,1,2,2))]
+    daily_temps = hourly_weather_source.ragged_daily_temperatures(periods, "degC")
+    assert_allclose(daily_temps.lengths, [3, 0, 1, 0])
+    for period, temps in zip(periods, daily_temps):
+        assert_allclose(temps, hourly_weather_source.daily_temperatures(period, "degC"))
+
+    hourly_temps = hourly_weather_source.ragged_hourly_temperatures(periods, "degF")
+    assert_allclose(hourly_temps.lengths, [72, 0, 26, 2])
+    assert_allclose(hourly_temps[0][:3], np.array([0, 1, 2]) / 24. * 1.8 + 32)
+    assert_allclose(hourly_temps[2][:24], np.arange(216, 240) / 24. * 1.8 + 32)
+    assert_allclose(hourly_temps[2][24:], [np.nan, np.nan])
+    assert_allclose(hourly_temps[3], [np.nan, np.nan])
+
+    hdd = hourly_weather_source.hdd(periods, "degC", 2)
+    assert_allclose(hdd, [np.nansum(np.maximum(2 - daily_temps[0], 0)), 0, 0, 0])
+
+    # no observed temperatures at all
+    period = Period(datetime(2011,12,1), datetime(2011,12,3))
+    assert np.isnan(hourly_weather_source.hdd(period, "degC", 2))
+
+def test_degree_day_index(hourly_weather_source):
+    periods = [Period(datetime(2011,12,30), datetime(2012,1,4)),
+               Period(datetime(2012,1,4), datetime(2012,1,12))]
+    daily_temps = hourly_weather_source.daily_temperatures(periods, "degF")
+    for base in [33, 40, 65]:
+        hdd = hourly_weather_source.hdd(periods, "degF", base)
+        cdd = hourly_weather_source.cdd(periods, "degF", base, per_day=True)
+        assert_allclose(hdd, [np.nansum(np.maximum(base - t, 0)) for t in daily_temps])
+        assert_allclose(cdd, [np.nansum(np.maximum(t - base, 0)) / len(t) for t in daily_temps])
+
+    # index is rebuilt when temperatures change
+    hourly_weather_source.tempC = hourly_weather_source.tempC + 10
+    hdd = hourly_weather_source.hdd(periods, "degC", 12)
+    daily_temps = hourly_weather_source.daily_temperatures(periods, "degC")
+    assert_allclose(hdd, [np.nansum(np.maximum(12 - t, 0)) for t in daily_temps])
+
+def test_local_time_days(hourly_weather_source):
+    ws = hourly_weather_source
+    utc_period = Period(datetime(2012, 1, 3, 8, tzinfo=pytz.UTC),
+            datetime(2012, 1, 4, 8, tzinfo=pytz.UTC))
+    local_period = Period(datetime(2012, 1, 3), datetime(2012, 1, 4))
+
+    # UTC days by default
+    assert_allclose(ws.daily_temperatures(utc_period, "degC"), [59.5 / 24])
+    assert_allclose(ws.datetime_hourly_temperature(utc_period.start, "degC"), 56 / 24.)
+    assert ws.epoch_index("H")[0] == 1325376000
+    assert ws.epoch_index("D")[1] - ws.epoch_index("D")[0] == 86400
+
+    ws.tz = "US/Pacific"
+    for period in [utc_period, local_period]:
+        assert_allclose(ws.daily_temperatures(period, "degC"), [67.5 / 24])
+        assert_allclose(ws.hdd(period, "degC", 10), [10 - 67.5 / 24])
+        assert_allclose(ws.datetime_average_temperature(period.start, "degC"), 67.5 / 24)
+        assert_allclose(ws.datetime_hourly_temperature(period.start, "degC"), 56 / 24.)
+    assert ws.epoch_index("D")[0] == 1325318400 # 2011-12-31 08:00 UTC
+
+def test_local_time_dst_transitions():
+    index = pd.date_range("2012-03-10", periods=250 * 24, freq="H")
+    ws = StaticWeatherSource(pd.Series(np.arange(250 * 24, dtype=float), index=index))
+    ws.tz = "US/Pacific"
+
+    # skipped and repeated local times are taken to be in standard time
+    skipped = datetime(2012, 3, 11, 2) # 10:00 UTC
+    repeated = datetime(2012, 11, 4, 1) # 09:00 UTC, not 08:00
+    assert_allclose(ws.datetime_hourly_temperature(skipped, "degC"), 24 + 10)
+    assert_allclose(ws.datetime_hourly_temperature(repeated, "degC"), 239 * 24 + 9)
+    assert_allclose(ws.hourly_temperatures(Period(repeated, repeated + timedelta(hours=2)),
+            "degC"), [239 * 24 + 9, 239 * 24 + 10])
+    assert_allclose(ws.daily_temperatures(Period(datetime(2012, 3, 11),
+            datetime(2012, 3, 12)), "degC"), [np.mean(np.arange(32, 55))])
+
+    epoch_index = ws.epoch_index("D") # from 2012-03-09, local time
+    assert epoch_index[3] - epoch_index[2] == 23 * 3600 # 2012-03-11
+    assert epoch_index[241] - epoch_index[240] == 25 * 3600 # 2012-11-04
+
+def test_binary_cache():
+    cache_dir = tempfile.mkdtemp()
+    json_filename = os.path.join(cache_dir, "GSOD-722880.json")
+    npz_filename = os.path.join(cache_dir, "GSOD-722880.npz")
+
+    with open(json_filename, 'w') as f:
+        f.write('[["20110101", 1.5], ["20110103", null], ["20110104", 3.0]]')
+
+    # migrated from json cache on first read
+    ws = GSODWeatherSource('722880', cache_filename=npz_filename)
+    assert os.path.exists(npz_filename)
+    assert ws.tempC.shape == (4,)
+    assert_allclose(ws.tempC.values, [1.5, np.nan, np.nan, 3.0])
+
+    # loaded from binary cache
+    os.remove(json_filename)
+    ws = GSODWeatherSource('722880', cache_filename=npz_filename)
+    assert ws.tempC.index[0] == datetime(2011, 1, 1)
+    assert ws.tempC.index[-1] == datetime(2011, 1, 4)
+    assert_allclose(ws.tempC.values, [1.5, np.nan, np.nan, 3.0])
+
+    # corrupted cache is cleared
+    with open(npz_filename, 'w') as f:
+        f.write("0#2]]]],,,sd,f")
+    ws = GSODWeatherSource('722880', cache_filename=npz_filename)
+    assert ws.tempC.shape == (0,)
+    assert not os.path.exists(npz_filename)
+
+def test_cache_format_environment_variable():
+    cache_dir = tempfile.mkdtemp()
+    os.environ["EEMETER_WEATHER_CACHE_FORMAT"] = "npz"
+    try:
+        ws = GSODWeatherSource('722880', cache_directory=cache_dir)
+        assert ws.cache_filename.endswith("GSOD-722880.npz")
+
+        os.environ["EEMETER_WEATHER_CACHE_FORMAT"] = "xml"
+        with pytest.raises(ValueError):
+            GSODWeatherSource('722880', cache_directory=cache_dir)
+    finally:
+        del os.environ["EEMETER_WEATHER_CACHE_FORMAT"]
+
+def test_shared_weather_store():
+    store = SharedWeatherStore(tempfile.mkdtemp())
+    assert store.get_year("GSOD", "722880", 2011) is None
+
+    values = np.arange(365, dtype=float)
+    values[10] = np.nan
+    store.put_year("GSOD", "722880", 2011, values)
+    stored = store.get_year("GSOD", "722880", 2011)
+    assert isinstance(stored, np.memmap)
+    assert not stored.flags.writeable
+    assert_allclose(stored, values)
+
+    # sources read complete years from the store rather than fetching them
+    cache_dir = tempfile.mkdtemp()
+    ws = GSODWeatherSource('722880', 2011, 2011, cache_directory=cache_dir,
+            store=store)
+    assert ws.tempC.shape == (365,)
+    assert ws.tempC.index[0] == datetime(2011, 1, 1)
+    assert_allclose(ws.tempC.values, values)
+
+    # consecutive years are one contiguous view, which temperatures are
+    # read from without copying
+    store.put_year("GSOD", "722880", 2010, values + 1000)
+    assert store.get_year("GSOD", "722880", 2009) is None
+    assert store.get_years("GSOD", "722880", 2009, 2011) is None
+    stored = store.get_years("GSOD", "722880", 2010, 2011)
+    assert stored.shape == (365 * 2,)
+    assert_allclose(stored[365:], values)
+
+    ws = GSODWeatherSource('722880', 2010, 2011, cache_directory=cache_dir,
+            store=store)
+    assert np.shares_memory(ws.tempC.values, stored)
+    assert np.shares_memory(ws._temperature_array("D")[1], stored)
+    assert_allclose(ws.daily_temperatures(Period(datetime(2010, 12, 31),
+            datetime(2011, 1, 2)), "degC"), [1364, 0])
+
+class MockGSODClient(object):
+
+    def __init__(self):
+        self.years_fetched = []
+
+    def get_gsod_arrays(self, station, year):
+        self.years_fetched.append(year)
+        dates = np.datetime64(date(year, 1, 1)) + np.arange(0, 365, 2)
+        return dates, float(year) * np.ones(dates.shape)
+
+def test_year_partitions():
+    store = SharedWeatherStore(tempfile.mkdtemp())
+    cache_dir = tempfile.mkdtemp()
+    ws = GSODWeatherSource('722880', cache_directory=cache_dir, store=store)
+    ws.client = MockGSODClient()
+
+    ws.add_year(2015)
+    ws.add_year(2013)
+    assert ws.tempC.shape == (365 * 3,)
+    assert ws.tempC.index[0] == datetime(2013, 1, 1)
+    assert_allclose(ws.tempC[:3], [2013, np.nan, 2013])
+    assert np.all(np.isnan(ws.tempC["2014"]))
+    assert_allclose(ws.tempC["2015-12-31"], 2015)
+
+    # only fetched years are persisted to the store
+    assert store.has_year("GSOD", "722880", 2013)
+    assert not store.has_year("GSOD", "722880", 2014)
+    assert store.has_year("GSOD", "722880", 2015)
+
+    # years already fetched are not fetched again
+    ws.add_year_range(2013, 2015)
+    assert ws.client.years_fetched == [2015, 2013, 2014]
+
+    ws = GSODWeatherSource('722880', cache_directory=cache_dir)
+    assert ws.tempC.shape == (365 * 3,)
+    assert_allclose(ws.tempC["2015-12-31"], 2015)
+
+def test_add_year_range_bulk():
+    cache_dir = tempfile.mkdtemp()
+    ws = GSODWeatherSource('722880', cache_directory=cache_dir)
+    ws.client = MockGSODClient()
+    cache_writes = []
+    ws._save_years_to_cache = lambda years: cache_writes.append(list(years))
+
+    # missing years are fetched together and the cache written once
+    ws.add_year_range(2009, 2011)
+    assert sorted(ws.client.years_fetched) == [2009, 2010, 2011]
+    assert cache_writes == [[2009, 2010, 2011]]
+    assert_allclose(ws.tempC[["2009-01-01", "2010-01-01", "2011-01-01"]],
+            [2009, 2010, 2011])
+
+    periods = [Period(datetime(2010, 6, 1), datetime(2013, 1, 1)),
+            Period(datetime(2015, 1, 1), datetime(2015, 2, 1))]
+    ws.hdd(periods, "degC", 0)
+    assert sorted(ws.client.years_fetched) == \
+            [2009, 2010, 2011, 2012, 2013, 2015]
+    assert cache_writes[1:] == [[2012, 2013, 2015]]
+
+def test_shared_cache_writes():
+    cache_dir = tempfile.mkdtemp()
+    ws1 = GSODWeatherSource('722880', cache_directory=cache_dir)
+    ws1.client = MockGSODClient()
+    ws2 = GSODWeatherSource('722880', cache_directory=cache_dir)
+    ws2.client = MockGSODClient()
+
+    # years written to the cache by another source are not fetched again,
+    # and are kept when the cache is written
+    ws1.add_year(2013)
+    ws2.add_year_range(2013, 2014)
+    assert ws2.client.years_fetched == [2014]
+
+    # each year is cached in its own segment, and only the years added are
+    # written
+    segment_2013 = os.path.join(cache_dir, "GSOD-722880", "2013.json")
+    written_2013 = os.stat(segment_2013)
+    ws1.add_year(2015)
+    assert ws1.client.years_fetched == [2013, 2015]
+    assert os.stat(segment_2013).st_ino == written_2013.st_ino
+    assert sorted(os.listdir(os.path.join(cache_dir, "GSOD-722880"))) == \
+            ["2013.json", "2014.json", "2015.json"]
+
+    ws = GSODWeatherSource('722880', cache_directory=cache_dir)
+    assert_allclose(ws.tempC[["2013-01-01", "2014-01-01", "2015-01-01"]],
+            [2013, 2014, 2015])
+
+    # cache files get the usual mode for new files, and keep their mode
+    # when replaced
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(os.stat(segment_2013).st_mode) == 0o666 & ~umask
+    os.chmod(segment_2013, 0o640)
+    ws1.add_year(2013, force=True)
+    assert os.stat(segment_2013).st_ino != written_2013.st_ino
+    assert stat.S_IMODE(os.stat(segment_2013).st_mode) == 0o640
+
+    # a cache written as a single file is read, and replaced by segments
+    ws = GSODWeatherSource('722880', cache_directory=cache_dir)
+    with open(ws.cache_filename, 'w') as f:
+        f.write('[["20110101", 1.5], ["20110102", null]]')
+    ws = GSODWeatherSource('722880', cache_directory=cache_dir)
+    assert_allclose(ws.tempC[["2011-01-01", "2013-01-01"]], [1.5, 2013])
+    ws.save_to_cache()
+    assert not os.path.exists(ws.cache_filename)
+    ws = GSODWeatherSource('722880', cache_directory=cache_dir)
+    assert_allclose(ws.tempC[["2011-01-01", "2013-01-01"]], [1.5, 2013])
+
+    # concurrent writers
+    cache_dir = tempfile.mkdtemp()
+    def add_year(year):
+        ws = GSODWeatherSource('722880', cache_directory=cache_dir)
+        ws.client = MockGSODClient()
+        ws.add_year(year)
+    threads = [threading.Thread(target=add_year, args=(year,))
+            for year in range(2008, 2014)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ws = GSODWeatherSource('722880', cache_directory=cache_dir)
+    assert_allclose(ws.tempC[["{}-01-01".format(y) for y in range(2008, 2014)]],
+            range(2008, 2014))
+    assert not [f for f in os.listdir(os.path.join(cache_dir, "GSOD-722880"))
+            if f.endswith(".tmp")]
+
+def test_cache_rewritten_within_mtime_resolution():
+    cache_dir = tempfile.mkdtemp()
+    ws1 = GSODWeatherSource('722880', cache_directory=cache_dir)
+    ws1.client = MockGSODClient()
+    ws1.add_year(2013)
+    ws2 = GSODWeatherSource('722880', cache_directory=cache_dir)
+    assert ws2._merge_from_cache() == set()
+
+    # another writer replaces the cache with one of the same size and
+    # modification time, on the same inode; only the generation differs
+    filename = ws1._segment_filename(2013)
+    stat_result = os.stat(filename)
+    with open(filename, 'r') as f:
+        data = f.read()
+    assert data.startswith('{"generation": 1,')
+    with open(filename, 'w') as f:
+        f.write(data.replace("2013.0", "2015.0", 1)
+                .replace('"generation": 1', '"generation": 2', 1))
+    if hasattr(stat_result, "st_mtime_ns"):
+        os.utime(filename, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns))
+    else: # python 2
+        os.utime(filename, (stat_result.st_atime, stat_result.st_mtime))
+    rewritten = os.stat(filename)
+    assert rewritten.st_size == stat_result.st_size
+    assert rewritten.st_ino == stat_result.st_ino
+    assert ws2._merge_from_cache() == set([2013])
+
+class LockCheckingGSODClient(MockGSODClient):
+    # Checks, while fetching, whether another source can take the cache lock.
+
+    def __init__(self, cache_dir):
+        super(LockCheckingGSODClient, self).__init__()
+        self.cache_dir = cache_dir
+        self.lock_available = []
+
+    def get_gsod_arrays(self, station, year):
+        other = GSODWeatherSource(station, cache_directory=self.cache_dir)
+        def take_lock():
+            with other._cache_lock():
+                pass
+        thread = threading.Thread(target=take_lock)
+        thread.daemon = True
+        thread.start()
+        thread.join(5)
+        self.lock_available.append(not thread.is_alive())
+        return super(LockCheckingGSODClient, self).get_gsod_arrays(station, year)
+
+def test_fetch_outside_cache_lock():
+    cache_dir = tempfile.mkdtemp()
+    ws = GSODWeatherSource('722880', cache_directory=cache_dir)
+    ws.client = LockCheckingGSODClient(cache_dir)
+    ws.add_year_range(2012, 2013)
+    assert ws.client.lock_available == [True, True]
+    assert_allclose(ws.tempC[["2012-01-01", "2013-01-01"]], [2012, 2013])
+
+def test_weather_source_registry():
+    registry = WeatherSourceRegistry(max_size=2)
+    cache_dir = tempfile.mkdtemp()
+
+    ws = registry.get(GSODWeatherSource, '722880', cache_directory=cache_dir)
+    assert registry.get(GSODWeatherSource, '722880',
+            cache_directory=cache_dir) is ws
+    assert (registry.hits, registry.misses) == (1, 1)
+
+    # keyed by class, station and cache path
+    other_dir = registry.get(GSODWeatherSource, '722880',
+            cache_directory=tempfile.mkdtemp())
+    assert other_dir is not ws
+    assert registry.get(ISDWeatherSource, '722880',
+            cache_directory=cache_dir) is not ws
+    assert len(registry) == 2
+    assert (registry.hits, registry.misses) == (1, 3)
+
+    # least recently used is evicted
+    assert registry.get(GSODWeatherSource, '722880',
+            cache_directory=cache_dir) is not ws
+
+    registry.clear()
+    assert len(registry) == 0
+    assert (registry.hits, registry.misses) == (0, 0)
+
+class ChunkedTransport(TransportBase):
+    # Serves one gzipped file in small chunks, as a network transport would.
+
+    def __init__(self, data, chunk_size=100):
+        self.data = data
+        self.chunk_size = chunk_size
+
+    def url(self, path):
+        return path
+
+    def retrieve(self, path, callback):
+        for i in range(0, len(self.data), self.chunk_size):
+            callback(self.data[i:i + self.chunk_size])
+
+def gzip_bytes(data):
+    string = BytesIO()
+    with gzip.GzipFile(fileobj=string, mode='wb') as f:
+        f.write(data)
+    return string.getvalue()
+
+def test_noaa_client_parsers():
+    with resource_stream('eemeter.resources', '722880-23152-2012.op.gz') as f:
+        gsod_data = f.read()
+    client = NOAAClient(transport=ChunkedTransport(gsod_data))
+    dates, temps = client.get_gsod_arrays("722880", 2012)
+    assert dates.shape == (366,)
+    assert dates[0] == np.datetime64("2012-01-01")
+    assert dates[-1] == np.datetime64("2012-12-31")
+    assert_allclose(temps[:2], [(63.2 - 32) * 5. / 9., (63.6 - 32) * 5. / 9.])
+    days = client.get_gsod_data("722880", 2012)
+    assert days[1]["date"] == date(2012, 1, 2)
+    assert_allclose(days[1]["temp_C"], temps[1])
+
+    def isd_line(datetime_str, temp_str):
+        line = bytearray(b"0" * 105)
+        line[15:27] = datetime_str.encode("ascii")
+        line[87:92] = temp_str.encode("ascii")
+        return bytes(line) + b"ADDEXTRA\n"
+
+    isd_data = isd_line("201201010053", "+0123") + \
+            isd_line("201201010100", "+9999") + \
+            isd_line("201212312359", "-0056")
+    # two gzip members, split mid-line
+    client = NOAAClient(transport=ChunkedTransport(
+            gzip_bytes(isd_data[:150]) + gzip_bytes(isd_data[150:]), chunk_size=7))
+    datetimes, temps = client.get_isd_arrays("722880", 2012)
+    assert datetimes[0] == np.datetime64("2012-01-01T00:53")
+    assert datetimes[2] == np.datetime64("2012-12-31T23:59")
+    assert_allclose(temps, [12.3, np.nan, -5.6])
+    hours = client.get_isd_data("722880", 2012)
+    assert hours[0]["datetime"] == datetime(2012, 1, 1, 0, 53)
+
+class MockISDClient(object):
+
+    def get_isd_arrays(self, station, year):
+        # a full day of readings on Jan 1 and only two on Jan 2
+        hours = np.arange(24 + 2)
+        datetimes = np.datetime64(datetime(year, 1, 1)) + hours * np.timedelta64(1, 'h')
+        return datetimes, hours.astype(float)
+
+def test_isd_daily_aggregates():
+    cache_dir = tempfile.mkdtemp()
+    ws = ISDWeatherSource('722880', cache_directory=cache_dir,
+            client=MockISDClient())
+    ws.add_year(2013)
+    periods = [Period(datetime(2013, 1, 1), datetime(2013, 1, 4))]
+    assert_allclose(ws.daily_temperatures(periods, "degC")[0], [11.5, 24.5, np.nan])
+    assert_allclose(ws.hdd(periods, "degC", 20), [8.5])
+    assert_allclose(ws.datetime_average_temperature(datetime(2013, 1, 2), "degC"), 24.5)
+
+    # daily aggregates are saved next to the hourly cache
+    daily_cache_filename = os.path.join(cache_dir, "ISD-722880", "2013.daily.npz")
+    assert os.path.exists(daily_cache_filename)
+    ws = ISDWeatherSource('722880', cache_directory=cache_dir, min_hours=12,
+            client=MockISDClient())
+    assert 2013 in ws._daily_aggregates
+    assert_allclose(ws.daily_temperatures(periods, "degC")[0], [11.5, np.nan, np.nan])
+    assert_allclose(ws.hdd(periods, "degC", 20), [8.5])
+    assert np.isnan(ws.datetime_average_temperature(datetime(2013, 1, 2), "degC"))
+
+    ws.clear_cache()
+    assert not os.path.exists(daily_cache_filename)
+
+def test_tmy3_normals():
+    cache_dir = tempfile.mkdtemp()
+    index = pd.date_range("1900-01-01", periods=365 * 24, freq="H")
+    temps = 10 - 15 * np.cos(np.arange(365 * 24) * 2 * np.pi / (365 * 24))
+    with open(os.path.join(cache_dir, "TMY3-722880.json"), 'w') as f:
+        f.write(json.dumps([[d.strftime("%Y%m%d%H"), t] for d, t in zip(index, temps)]))
+
+    os.environ["EEMETER_WEATHER_CACHE_DIRECTORY"] = cache_dir
+    try:
+        ws = TMY3WeatherSource('722880')
+        normals_filename = os.path.join(cache_dir, "TMY3-722880.normals.npz")
+        assert os.path.exists(normals_filename)
+
+        period = Period(datetime(2013, 1, 1), datetime(2014, 1, 1))
+        for unit, base in [("degF", 65), ("degC", 18), ("degF", 65.5)]:
+            assert_allclose(ws.annual_hdd(unit, base), ws.hdd(period, unit, base))
+            assert_allclose(ws.annual_cdd(unit, base), ws.cdd(period, unit, base))
+        assert_allclose(ws.annual_daily_temperatures("degF"),
+                ws.daily_temperatures([period], "degF"))
+
+        # normals are read back from the cache
+        ws = TMY3WeatherSource('722880')
+        assert "normals" in ws._derived
+        assert_allclose(ws.annual_hdd("degF", 65), ws.hdd(period, "degF", 65))
+    finally:
+        del os.environ["EEMETER_WEATHER_CACHE_DIRECTORY"]
+
+def test_tmy3_year_end():
+    # Days in January of a period crossing Dec 31 are taken from the start of
+    # the typical year, as looking them up one at a time does.
+    cache_dir = tempfile.mkdtemp()
+    index = pd.date_range("1900-01-01", periods=365 * 24, freq="H")
+    temps = np.repeat(np.arange(365.), 24)
+    with open(os.path.join(cache_dir, "TMY3-722880.json"), 'w') as f:
+        f.write(json.dumps([[d.strftime("%Y%m%d%H"), t] for d, t in zip(index, temps)]))
+
+    os.environ["EEMETER_WEATHER_CACHE_DIRECTORY"] = cache_dir
+    try:
+        ws = TMY3WeatherSource('722880')
+        periods = [Period(datetime(2013, 12, 30), datetime(2014, 1, 3))]
+        expected = [363, 364, 0, 1]
+        assert_allclose(ws.daily_temperatures(periods, "degC")[0], expected)
+        assert_allclose([ws.datetime_average_temperature(
+                datetime(2013, 12, 30) + timedelta(days=i), "degC")
+                for i in range(4)], expected)
+        assert_allclose(ws.hdd(periods, "degC", 400), [400 * 4 - sum(expected)])
+        assert_allclose(ws.cdd(periods, "degC", 100), [263 + 264])
+        assert_allclose(ws.hourly_temperatures(periods, "degC")[0][::24], expected)
+        # the average only covers the part of the period before Dec 31
+        assert_allclose(ws.average_temperature(periods, "degC"), [363.5])
+    finally:
+        del os.environ["EEMETER_WEATHER_CACHE_DIRECTORY"]
+
+def test_tmy3_archive():
+    csv_dir = tempfile.mkdtemp()
+    lines = ["722880,header", "Date,Time,..."]
+    for i in range(365 * 24):
+        dt = datetime(1987, 1, 1) + timedelta(hours=i)
+        row = ["0"] * 32
+        row[0] = dt.strftime("%m/%d/%Y")
+        row[1] = "{:02d}:00".format(dt.hour + 1)
+        row[31] = "{:.1f}".format(i % 240 / 10.)
+        lines.append(",".join(row))
+    with open(os.path.join(csv_dir, "722880TYA.CSV"), 'w') as f:
+        f.write("\n".join(lines))
+
+    archive_filename = os.path.join(tempfile.mkdtemp(), "tmy3.npy")
+    client = TMY3Client(transport=LocalTransport(csv_dir), archive=False)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        archive = TMY3Archive.build(archive_filename, ["722880", "725300"], client)
+    assert len(archive) == 1
+    assert "722880" in archive
+    assert "725300" not in archive
+    assert archive.temperatures.dtype == np.float32
+    assert_allclose(archive.get("722880")[:3], [0, 0.1, 0.2], rtol=1e-6)
+    assert archive.get("725300") is None
+
+    os.environ["EEMETER_TMY3_ARCHIVE"] = archive_filename
+    try:
+        client = TMY3Client(transport=LocalTransport(tempfile.mkdtemp()))
+        assert_allclose(client.get_tmy3_array("722880"), archive.get("722880"))
+    finally:
+        del os.environ["EEMETER_TMY3_ARCHIVE"]
+
+class FailingTransport(TransportBase):
+    # Fails like a dropped connection, every time.
+
+    def __init__(self):
+        self.attempts = 0
+
+    def url(self, path):
+        return path
+
+    def retrieve(self, path, callback):
+        self.attempts += 1
+        raise IOError("connection reset")
+
+def test_tmy3_retrieval_failures():
+    cache_dir = tempfile.mkdtemp()
+    transport = FailingTransport()
+    client = TMY3Client(transport=transport, archive=False, n_tries=2, backoff=0)
+
+    # transient failures are retried, then raised rather than reported as
+    # the station not being found
+    with pytest.raises(IOError):
+        client.get_tmy3_array("722880")
+    assert transport.attempts == 2
+
+    class FailingTMY3WeatherSource(TMY3WeatherSource):
+        pass
+
+    os.environ["EEMETER_WEATHER_CACHE_DIRECTORY"] = cache_dir
+    try:
+        FailingTMY3WeatherSource.client = client
+        with pytest.raises(IOError):
+            FailingTMY3WeatherSource("722880")
+        assert os.listdir(cache_dir) == []
+
+        # stations which are not found are not cached either
+        FailingTMY3WeatherSource.client = TMY3Client(
+                transport=LocalTransport(tempfile.mkdtemp()), archive=False)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            ws = FailingTMY3WeatherSource("722880")
+        assert np.all(np.isnan(ws.tempC.values))
+        assert np.isnan(ws.annual_hdd("degF", 65))
+        assert not [f for f in os.listdir(cache_dir) if not f.endswith(".lock")]
+    finally:
+        del os.environ["EEMETER_WEATHER_CACHE_DIRECTORY"]
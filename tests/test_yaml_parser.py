@@ -8,6 +8,7 @@ from eemeter.config.yaml_parser import Setting
 
 from eemeter.meter import BPI_2400_S_2012_ModelCalibrationUtilityBillCriteria
 from eemeter.meter import DefaultResidentialMeter
+from eemeter.models import AverageDailyTemperatureSensitivityModel
 
 import pytest
 
@@ -44,11 +45,49 @@ def test_setting():
     with pytest.raises(KeyError):
         loaded = load("a: !setting heating_config")
 
+def parse_dump(text):
+    # The dumped specification as plain data, with the type of each !obj:
+    # mapping under "__type__".
+    class Loader(yaml.Loader):
+        pass
+    def construct_obj(loader, tag_suffix, node):
+        mapping = loader.construct_mapping(node, deep=True)
+        mapping["__type__"] = tag_suffix
+        return mapping
+    Loader.add_multi_constructor("!obj:", construct_obj)
+    return yaml.load(text, Loader=Loader)
+
+def expected_dump(filename):
+    path = os.path.join(os.path.dirname(__file__), "fixtures", "resources",
+            filename)
+    with open(path, 'r') as f:
+        return f.read()
+
 def test_dump_meter():
 
-    # just make sure nothing has changed unexpectedly
+    # just make sure nothing has changed unexpectedly; when the dumped
+    # specification changes on purpose, update the expected dump with it
     meter = BPI_2400_S_2012_ModelCalibrationUtilityBillCriteria("degF")
-    assert len(dump(meter.meter)) == 11913
+    assert parse_dump(dump(meter.meter)) == \
+            parse_dump(expected_dump("bpi_2400_meter.yaml"))
 
     meter = DefaultResidentialMeter("degF")
-    assert len(dump(meter.meter)) == 21659
+    assert parse_dump(dump(meter.meter)) == \
+            parse_dump(expected_dump("default_residential_meter.yaml"))
+
+def test_dump_model():
+    model = AverageDailyTemperatureSensitivityModel(cooling=False, heating=True,
+            initial_params={"base_daily_consumption": 0, "heating_slope": 0,
+                "heating_balance_temperature": 55},
+            param_bounds={"base_daily_consumption": [0, 100],
+                "heating_slope": [0, 100], "heating_balance_temperature": [50, 60]},
+            fit_method="multistart", grid_step=0.5, n_starts=4, n_workers=2,
+            max_cpu_time=10., random_state=3)
+    dumped = dump(model)
+    loaded = load(dumped)
+    assert parse_dump(dump(loaded)) == parse_dump(dumped)
+    for name in ["heating", "cooling", "fit_method", "grid_step", "n_starts",
+            "n_workers", "max_cpu_time", "random_state"]:
+        assert getattr(loaded, name) == getattr(model, name)
+    assert loaded.initial_params.to_dict() == model.initial_params.to_dict()
+    assert loaded.param_bounds.to_dict() == model.param_bounds.to_dict()